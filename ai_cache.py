@@ -0,0 +1,129 @@
+# ai_cache.py - кэш ответов ИИ по нормализованному вопросу
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from config import (
+    logger, AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL, AI_CACHE_VOLATILE_TTL, AI_CACHE_MAX_PROMPT_CHARS, AI_CACHE_PERSIST
+)
+
+# Вопросы о том, что меняется со временем, живут в кэше недолго
+_VOLATILE_PATTERN = re.compile(
+    r'курс|ставк|ruonia|руониа|инфляц|цен[аыуе]|стоимост|сколько стоит|биткоин|bitcoin|btc|эфир|крипт|'
+    r'акци|бирж|котировк|погод|сегодня|сейчас|завтра|вчера|прогноз|новост|текущ|последн|202\d'
+)
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.…]+$')
+
+# 🔄 LRU В ПАМЯТИ: ключ -> {'prompt', 'answer', 'tokens', 'expires_at'}
+_entries = OrderedDict()
+_metrics = {
+    'hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stored': 0,
+    'evicted': 0,
+    'tokens_saved': 0,
+}
+
+def normalize_prompt(prompt: str) -> str:
+    """Регистр, 'ё', пробелы и знаки в конце не меняют смысл вопроса.
+
+    Знаки внутри текста оставляем: '2+2' и '2-2' - разные вопросы.
+    """
+    text = ' '.join(prompt.lower().replace('ё', 'е').split())
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+def cache_key(normalized: str, version: str) -> str:
+    """Хэш вопроса вместе с версией системного промпта: смена промпта сбрасывает кэш"""
+    return hashlib.sha256(f"{version}\x00{normalized}".encode('utf-8')).hexdigest()
+
+def ttl_for(normalized: str) -> int:
+    return AI_CACHE_VOLATILE_TTL if _VOLATILE_PATTERN.search(normalized) else AI_CACHE_TTL
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка, если API не вернул usage (~3 символа на токен для русского текста)"""
+    return max(1, len(text) // 3)
+
+def _cacheable(normalized: str) -> bool:
+    return 0 < len(normalized) <= AI_CACHE_MAX_PROMPT_CHARS
+
+def _remember(key: str, entry: dict):
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > AI_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+        _metrics['evicted'] += 1
+
+async def get_cached_answer(prompt: str, version: str):
+    """Ответ из кэша (память, затем PostgreSQL) или None"""
+    normalized = normalize_prompt(prompt)
+    if not _cacheable(normalized):
+        return None
+    key = cache_key(normalized, version)
+    now = time.time()
+
+    entry = _entries.get(key)
+    if entry is not None:
+        if entry['expires_at'] > now:
+            _entries.move_to_end(key)
+            _metrics['hits'] += 1
+            _metrics['tokens_saved'] += entry['tokens']
+            return entry['answer']
+        del _entries[key]
+
+    if AI_CACHE_PERSIST:
+        from db import get_ai_cache_entry
+
+        row = await get_ai_cache_entry(key)
+        if row:
+            answer, tokens, expires_at = row
+            _remember(key, {
+                'prompt': normalized, 'answer': answer, 'tokens': tokens,
+                'expires_at': (expires_at - datetime(1970, 1, 1)).total_seconds(),
+            })
+            _metrics['hits'] += 1
+            _metrics['db_hits'] += 1
+            _metrics['tokens_saved'] += tokens
+            return answer
+
+    _metrics['misses'] += 1
+    return None
+
+async def store_answer(prompt: str, version: str, answer: str, tokens: int = None, finish_reason: str = None):
+    """Запоминает успешный ответ; ошибки API сюда не попадают.
+
+    Кэшируется только ответ, завершенный моделью (finish_reason == 'stop'):
+    обрезанный по max_tokens ('length') иначе повторялся бы неделю.
+    """
+    if finish_reason != 'stop':
+        logger.debug(f"🤖 Ответ ИИ не кэшируется: finish_reason={finish_reason}")
+        return
+    normalized = normalize_prompt(prompt)
+    if not _cacheable(normalized) or not answer.strip():
+        return
+    key = cache_key(normalized, version)
+    tokens = tokens or estimate_tokens(prompt + answer)
+    expires_at = time.time() + ttl_for(normalized)
+
+    _remember(key, {'prompt': normalized, 'answer': answer, 'tokens': tokens, 'expires_at': expires_at})
+    _metrics['stored'] += 1
+    logger.debug(f"🤖 Ответ ИИ закэширован на {int(expires_at - time.time())} сек.: {normalized[:60]}")
+
+    if AI_CACHE_PERSIST:
+        from db import save_ai_cache_entry
+
+        # expires_at в таблице - TIMESTAMP без пояса, значения в UTC
+        expires_utc = datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+        await save_ai_cache_entry(key, normalized, answer, tokens, expires_utc)
+
+def get_ai_cache_stats() -> dict:
+    """Для /status"""
+    lookups = _metrics['hits'] + _metrics['misses']
+    return {
+        **_metrics,
+        'entries': len(_entries),
+        'max_entries': AI_CACHE_MAX_ENTRIES,
+        'hit_rate': _metrics['hits'] / lookups * 100 if lookups else 0.0,
+        'persist': AI_CACHE_PERSIST,
+    }
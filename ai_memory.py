@@ -0,0 +1,103 @@
+# ai_memory.py - память диалога с ИИ в пределах бюджета токенов
+import re
+import time
+from collections import deque
+from config import AI_CONTEXT_TOKEN_LIMIT, AI_SUMMARY_TOKEN_LIMIT, AI_MEMORY_IDLE_SECONDS
+from ai_cache import estimate_tokens
+from api_ai import SYSTEM_MESSAGE
+
+SUMMARY_HEADER = "Кратко о начале разговора с пользователем:\n"
+_SYSTEM_TOKENS = estimate_tokens(SYSTEM_MESSAGE)
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s')
+
+def _clip(text: str, limit: int) -> str:
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + '…'
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(' '.join(text.split()), 1)[0]
+
+class ConversationMemory:
+    """Последние реплики целиком и сводка вытесненных - в context.user_data.
+
+    Счетчики токенов ведутся при добавлении и вытеснении, а собранный список
+    сообщений переиспользуется между репликами: новая реплика дописывается в
+    конец, пересборка - только при вытеснении. Неизменный префикс запроса
+    заодно попадает в кэш контекста на стороне DeepSeek.
+    """
+
+    def __init__(self):
+        self._turns = deque()          # (вопрос, ответ, токены)
+        self._summary = deque()        # (строка сводки, токены)
+        self._turn_tokens = 0
+        self._summary_tokens = 0
+        self._messages = None          # собранная история для запроса
+        self.updated = time.time()
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def tokens(self) -> int:
+        return self._turn_tokens + self._summary_tokens
+
+    def clear(self):
+        self.__init__()
+
+    def history_for(self, prompt: str) -> list:
+        """История для запроса: системный промпт, история и вопрос укладываются в AI_CONTEXT_TOKEN_LIMIT"""
+        if time.time() - self.updated > AI_MEMORY_IDLE_SECONDS:
+            self.clear()
+        self._trim(AI_CONTEXT_TOKEN_LIMIT - _SYSTEM_TOKENS - estimate_tokens(prompt))
+        return self._build()
+
+    def add_turn(self, prompt: str, answer: str):
+        """Запоминает завершенный обмен репликами"""
+        tokens = estimate_tokens(prompt) + estimate_tokens(answer)
+        self._turns.append((prompt, answer, tokens))
+        self._turn_tokens += tokens
+        if self._messages is not None:
+            self._messages.extend(({'role': 'user', 'content': prompt}, {'role': 'assistant', 'content': answer}))
+        self.updated = time.time()
+        self._trim(AI_CONTEXT_TOKEN_LIMIT - _SYSTEM_TOKENS)
+
+    def _build(self) -> list:
+        if self._messages is None:
+            messages = []
+            if self._summary:
+                messages.append({
+                    'role': 'system',
+                    'content': SUMMARY_HEADER + '\n'.join(line for line, _ in self._summary),
+                })
+            for prompt, answer, _ in self._turns:
+                messages.append({'role': 'user', 'content': prompt})
+                messages.append({'role': 'assistant', 'content': answer})
+            self._messages = messages
+        return self._messages
+
+    def _trim(self, budget: int):
+        """Вытесняет старые реплики в сводку, пока история не уложится в budget"""
+        changed = False
+        while self._turns and self.tokens > budget:
+            prompt, answer, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            line = f"- Вопрос: {_clip(prompt, 150)} → ответ: {_clip(_first_sentence(answer), 200)}"
+            line_tokens = estimate_tokens(line)
+            self._summary.append((line, line_tokens))
+            self._summary_tokens += line_tokens
+            changed = True
+
+        summary_budget = min(AI_SUMMARY_TOKEN_LIMIT, max(budget - self._turn_tokens, 0))
+        while self._summary and self._summary_tokens > summary_budget:
+            _, line_tokens = self._summary.popleft()
+            self._summary_tokens -= line_tokens
+            changed = True
+
+        if changed:
+            self._messages = None
+
+def get_memory(user_data: dict) -> ConversationMemory:
+    memory = user_data.get('ai_memory')
+    if memory is None:
+        memory = user_data['ai_memory'] = ConversationMemory()
+    return memory
@@ -0,0 +1,168 @@
+# ai_scheduler.py - очередь запросов к ИИ: общий лимит, один запрос на пользователя, отмена
+import asyncio
+import time
+from collections import deque
+from config import logger, AI_MAX_CONCURRENT, AI_USER_PENDING_LIMIT
+
+# Состояния заявки после submit
+STATE_STARTED = 'started'      # выполняется сразу
+STATE_QUEUED = 'queued'        # ждет свободного места в общей очереди
+STATE_WAITING = 'waiting'      # ждет завершения предыдущего вопроса того же пользователя
+
+class AIRequest:
+    """Заявка: runner - корутинная функция без аргументов, выполняющая запрос и ответ;
+    on_queued(position) - уведомление, если ожидавший вопрос попал в общую очередь;
+    on_dropped() - вопрос снят, не начавшись (вытеснен новым или отменен)
+    """
+
+    __slots__ = ('user_id', 'runner', 'on_queued', 'on_dropped', 'created', 'task')
+
+    def __init__(self, user_id: int, runner, on_queued=None, on_dropped=None):
+        self.user_id = user_id
+        self.runner = runner
+        self.on_queued = on_queued
+        self.on_dropped = on_dropped
+        self.created = time.monotonic()
+        self.task = None
+
+# 🔄 СОСТОЯНИЕ ПЛАНИРОВЩИКА
+# Заявка пользователя либо выполняется (_running), либо стоит в общей очереди
+# (_ready), либо ждет своего предыдущего вопроса (_pending) - у пользователя
+# не бывает двух заявок одновременно в _running/_ready
+_running = {}          # user_id -> AIRequest
+_ready = deque()       # AIRequest, ждущие свободного места
+_pending = {}          # user_id -> deque(AIRequest)
+_notices = set()       # задачи уведомлений: без ссылки event loop может собрать их до завершения
+_metrics = {
+    'started': 0,
+    'completed': 0,
+    'failed': 0,
+    'cancelled': 0,
+    'superseded': 0,
+    'queued_total': 0,
+    'wait_total': 0.0,
+    'max_queue': 0,
+}
+
+def _has_active(user_id: int) -> bool:
+    return user_id in _running or any(request.user_id == user_id for request in _ready)
+
+def submit(user_id: int, runner, on_queued=None, on_dropped=None) -> dict:
+    """Ставит вопрос в очередь: {'state', 'position', 'superseded'}.
+
+    Пока выполняется предыдущий вопрос пользователя, новый ждет за ним;
+    сверх AI_USER_PENDING_LIMIT новые вопросы вытесняют самые старые ожидающие.
+    """
+    request = AIRequest(user_id, runner, on_queued, on_dropped)
+
+    if _has_active(user_id):
+        pending = _pending.setdefault(user_id, deque())
+        superseded = 0
+        while len(pending) >= max(AI_USER_PENDING_LIMIT, 1):
+            _notify(pending.popleft(), 'on_dropped')
+            superseded += 1
+        _metrics['superseded'] += superseded
+        pending.append(request)
+        return {'state': STATE_WAITING, 'position': len(pending), 'superseded': superseded}
+
+    return {**_enqueue(request), 'superseded': 0}
+
+def _enqueue(request: AIRequest) -> dict:
+    if len(_running) < AI_MAX_CONCURRENT and not _ready:
+        _start(request)
+        return {'state': STATE_STARTED, 'position': 0}
+    _ready.append(request)
+    _metrics['queued_total'] += 1
+    _metrics['max_queue'] = max(_metrics['max_queue'], len(_ready))
+    return {'state': STATE_QUEUED, 'position': len(_ready)}
+
+def _start(request: AIRequest):
+    _running[request.user_id] = request
+    _metrics['started'] += 1
+    _metrics['wait_total'] += time.monotonic() - request.created
+    request.task = asyncio.create_task(_run(request))
+
+async def _run(request: AIRequest):
+    try:
+        await request.runner()
+        _metrics['completed'] += 1
+    except asyncio.CancelledError:
+        _metrics['cancelled'] += 1
+    except Exception as e:
+        _metrics['failed'] += 1
+        logger.error(f"❌ Ошибка запроса к ИИ пользователя {request.user_id}: {e}")
+    finally:
+        if _running.get(request.user_id) is request:
+            del _running[request.user_id]
+        # Следующий вопрос пользователя встает в конец общей очереди - остальные не ждут его дольше
+        pending = _pending.get(request.user_id)
+        promoted = None
+        if pending:
+            promoted = pending.popleft()
+            _ready.append(promoted)
+            if not pending:
+                del _pending[request.user_id]
+        _drain()
+        # Бот занят и вопрос остался в очереди - сообщаем пользователю его место
+        if promoted is not None:
+            position = queue_position(promoted.user_id)
+            if position is not None:
+                _notify(promoted, 'on_queued', position)
+
+def _drain():
+    while _ready and len(_running) < AI_MAX_CONCURRENT:
+        _start(_ready.popleft())
+
+def _notify(request: AIRequest, callback_name: str, *args):
+    """Вызывает уведомление заявки фоновой задачей - планировщик его не ждет"""
+    callback = getattr(request, callback_name)
+    if callback is None:
+        return
+    task = asyncio.create_task(_run_notice(request, callback, *args))
+    _notices.add(task)
+    task.add_done_callback(_notices.discard)
+
+async def _run_notice(request: AIRequest, callback, *args):
+    try:
+        await callback(*args)
+    except Exception as e:
+        logger.debug(f"Не удалось обновить уведомление о вопросе пользователя {request.user_id}: {e}")
+
+def queue_position(user_id: int):
+    """Место вопроса пользователя в общей очереди (1 - следующий) или None"""
+    for index, request in enumerate(_ready, 1):
+        if request.user_id == user_id:
+            return index
+    return None
+
+def cancel_user_requests(user_id: int) -> int:
+    """Отменяет выполняющийся и все ожидающие вопросы пользователя (выход из режима ИИ)"""
+    waiting = list(_pending.pop(user_id, ()))
+    queued = [request for request in _ready if request.user_id == user_id]
+    for request in queued:
+        _ready.remove(request)
+    waiting += queued
+    for request in waiting:
+        _notify(request, 'on_dropped')
+    cancelled = len(waiting)
+    _metrics['cancelled'] += cancelled
+
+    running = _running.get(user_id)
+    if running is not None and running.task is not None and not running.task.done():
+        running.task.cancel()
+        cancelled += 1
+    if cancelled:
+        logger.info(f"⏹ Отменено запросов к ИИ пользователя {user_id}: {cancelled}")
+    return cancelled
+
+def get_scheduler_stats() -> dict:
+    """Для /status"""
+    started = _metrics['started']
+    return {
+        'running': len(_running),
+        'max_concurrent': AI_MAX_CONCURRENT,
+        'queued': len(_ready),
+        'pending': sum(len(pending) for pending in _pending.values()),
+        'avg_wait_ms': int(_metrics['wait_total'] / started * 1000) if started else 0,
+        **{key: value for key, value in _metrics.items() if key != 'wait_total'},
+    }
@@ -0,0 +1,96 @@
+# alert_index.py - индекс порогов уведомлений: проверка по бинарному поиску вместо перебора
+from bisect import bisect_left, bisect_right
+
+# Уведомления об изменении за окно: threshold - проценты, window_seconds - длина окна
+CHANGE_DIRECTIONS = ('rise', 'drop', 'move')
+
+def alert_pair(alert) -> str:
+    """Пара уведомления: 'USD/RUB' для валют ЦБ РФ, 'bitcoin/USD' для криптовалют"""
+    return f"{alert['from_currency']}/{alert['to_currency']}"
+
+def alert_key(alert) -> str:
+    """Ключ значения, с которым сравнивается порог.
+
+    Для порога по цене - сама пара, для изменения - процент по окну
+    ('bitcoin/USD:drop:3600'), который считает rolling.window_values.
+    """
+    if alert['direction'] in CHANGE_DIRECTIONS:
+        return f"{alert_pair(alert)}:{alert['direction']}:{alert['window_seconds']}"
+    return alert_pair(alert)
+
+class ThresholdIndex:
+    """Пороги уведомлений по парам, отсортированные для каждого направления.
+
+    'above' срабатывает при цене >= порога - это префикс возрастающего списка,
+    'below' при цене <= порога - суффикс. На тик по паре - два bisect,
+    сколько бы уведомлений на нее ни было. Изменения за окно (rise/drop/move)
+    индексируются как 'above' по проценту изменения.
+    """
+
+    def __init__(self, alerts=()):
+        self._above = {}          # ключ -> ([пороги по возрастанию], [уведомления])
+        self._below = {}
+        self._ids = set()
+        self.windows = set()      # (пара, секунды) для уведомлений об изменении
+        groups = {}
+        for alert in alerts:
+            direction = alert['direction']
+            if direction in CHANGE_DIRECTIONS:
+                if not alert.get('window_seconds'):
+                    continue
+                self.windows.add((alert_pair(alert), alert['window_seconds']))
+                direction = 'above'
+            elif direction not in ('above', 'below'):
+                continue
+            groups.setdefault((alert_key(alert), direction), []).append(alert)
+            self._ids.add(alert['id'])
+        for (key, direction), items in groups.items():
+            items.sort(key=lambda item: float(item['threshold']))
+            target = self._above if direction == 'above' else self._below
+            target[key] = ([float(item['threshold']) for item in items], items)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def pairs(self) -> set:
+        """Пары, цены которых нужны для проверки (в том числе для окон)"""
+        return {key.split(':')[0] for key in self._above} | set(self._below)
+
+    def match(self, prices: dict) -> list:
+        """Сработавшие уведомления: [(alert, цена)]; prices - {пара: цена}"""
+        triggered = []
+        for key, price in prices.items():
+            above = self._above.get(key)
+            if above:
+                triggered.extend((alert, price) for alert in above[1][:bisect_right(above[0], price)])
+            below = self._below.get(key)
+            if below:
+                triggered.extend((alert, price) for alert in below[1][bisect_left(below[0], price):])
+        return triggered
+
+    def discard(self, alert_ids):
+        """Убирает сработавшие уведомления, не перестраивая индекс целиком.
+
+        Окна остаются до следующей перестройки индекса - лишнее окно стоит O(1) на точку.
+        """
+        alert_ids = set(alert_ids) & self._ids
+        if not alert_ids:
+            return
+        self._ids -= alert_ids
+        for target in (self._above, self._below):
+            for key in list(target):
+                thresholds, items = target[key]
+                kept = [index for index, item in enumerate(items) if item['id'] not in alert_ids]
+                if len(kept) == len(items):
+                    continue
+                if kept:
+                    target[key] = ([thresholds[index] for index in kept], [items[index] for index in kept])
+                else:
+                    del target[key]
+
+def match_alerts(alerts: list, prices: dict) -> list:
+    """Сработавшие уведомления: [(alert, цена)].
+
+    Чистая функция над словарями - на больших наборах выполняется в пуле процессов.
+    """
+    return ThresholdIndex(alerts).match(prices)
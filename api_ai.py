@@ -1,33 +1,22 @@
+import asyncio
+import hashlib
+import json
 import requests
 import logging
+import aiohttp
+from functools import partial
 from telegram.ext import ContextTypes
-from config import DEEPSEEK_API_BASE, DEEPSEEK_API_KEY, logger
+from config import DEEPSEEK_API_BASE, DEEPSEEK_API_KEY, AI_STREAM_IDLE_TIMEOUT, logger
+from workers import run_ai
+from ai_cache import get_cached_answer, store_answer
 
-async def ask_deepseek(prompt: str, context: ContextTypes.DEFAULT_TYPE = None, fast_check: bool = False) -> str:
-    """Отправляет запрос к API DeepSeek и возвращает ответ"""
-    if not DEEPSEEK_API_KEY:
-        return "❌ Функционал ИИ временно недоступен. Отсутствует API ключ."
-    
-    # Быстрая проверка доступности API
-    if fast_check:
-        try:
-            url = f"{DEEPSEEK_API_BASE}models"
-            headers = {'Authorization': f'Bearer {DEEPSEEK_API_KEY}'}
-            response = requests.get(url, headers=headers, timeout=5)
-            return "✅" if response.status_code == 200 else "❌"
-        except:
-            return "❌"
-    
-    try:
-        url = f"{DEEPSEEK_API_BASE}chat/completions"
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {DEEPSEEK_API_KEY}'
-        }
-        
-        # УНИВЕРСАЛЬНЫЙ ПРОМПТ ДЛЯ ЛЮБЫХ ВОПРОСОВ
-        system_message = """Ты - универсальный ИИ помощник в телеграм боте. Ты помогаешь пользователям с любыми вопросами, включая:
+NO_KEY_MESSAGE = "❌ Функционал ИИ временно недоступен. Отсутствует API ключ."
+TIMEOUT_MESSAGE = "⏰ ИИ не успел обработать запрос. Попробуйте позже."
+NETWORK_ERROR_MESSAGE = "❌ Произошла сетевая ошибка. Проверьте подключение к интернету."
+UNEXPECTED_ERROR_MESSAGE = "❌ Произошла непредвиденная ошибка. Попробуйте позже."
+
+# УНИВЕРСАЛЬНЫЙ ПРОМПТ ДЛЯ ЛЮБЫХ ВОПРОСОВ
+SYSTEM_MESSAGE = """Ты - универсальный ИИ помощник в телеграм боте. Ты помогаешь пользователям с любыми вопросами, включая:
 
 - 💰 Финансы: курсы валют, инвестиции, криптовалюты
 - 📊 Технологии: программирование, IT, разработка
@@ -39,48 +28,190 @@ async def ask_deepseek(prompt: str, context: ContextTypes.DEFAULT_TYPE = None, f
 - 💬 Общение: поддержка, мотивация
 
 Отвечай подробно, информативно и помогающе. Будь дружелюбным и поддерживающим собеседником.Можешь шутить. Иногда напоминать про создателя бота Санька"""
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000,
-            "stream": False
-        }
+
+AI_MODEL = "deepseek-chat"
+AI_TEMPERATURE = 0.7
+AI_MAX_TOKENS = 2000
+
+# Версия промпта для ключей кэша ответов: меняется вместе с системным сообщением и параметрами модели
+PROMPT_VERSION = hashlib.sha256(
+    f"{AI_MODEL}|{AI_TEMPERATURE}|{AI_MAX_TOKENS}|{SYSTEM_MESSAGE}".encode('utf-8')
+).hexdigest()[:12]
+
+def _build_request(prompt: str, stream: bool, history: list = None):
+    """URL, заголовки и тело запроса chat/completions; history - предыдущие реплики диалога"""
+    url = f"{DEEPSEEK_API_BASE}chat/completions"
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {DEEPSEEK_API_KEY}'
+    }
+    data = {
+        "model": AI_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            *(history or ()),
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": AI_TEMPERATURE,
+        "max_tokens": AI_MAX_TOKENS,
+        "stream": stream
+    }
+    if stream:
+        # Последний фрагмент потока принесет usage - для учета сэкономленных токенов
+        data["stream_options"] = {"include_usage": True}
+    return url, headers, data
+
+def _log_usage(usage: dict):
+    """Токены запроса; prompt_cache_hit_tokens - сколько префикса DeepSeek взял из своего кэша контекста"""
+    if usage:
+        logger.info(
+            f"🤖 Токены DeepSeek: запрос {usage.get('prompt_tokens', 0)} "
+            f"(из кэша контекста {usage.get('prompt_cache_hit_tokens', 0)}), ответ {usage.get('completion_tokens', 0)}"
+        )
+
+def _error_message(status_code: int, text: str) -> str:
+    """Текст для пользователя по коду ошибки API"""
+    if status_code == 402:
+        logger.error("Недостаточно средств на счету DeepSeek API")
+        return "❌ Функционал ИИ временно недоступен. Недостаточно средств на API аккаунте. Обратитесь к администратору."
+    elif status_code == 401:
+        logger.error("Неверный API ключ DeepSeek")
+        return "❌ Ошибка аутентификации API. Проверьте API ключ."
+    elif status_code == 429:
+        logger.error("Превышен лимит запросов к DeepSeek API")
+        return "⏰ Превышен лимит запросов. Попробуйте позже."
+    logger.error(f"Ошибка API DeepSeek: {status_code} - {text}")
+    return "❌ Временная ошибка сервиса ИИ. Попробуйте позже."
+
+async def ask_deepseek(prompt: str, context: ContextTypes.DEFAULT_TYPE = None,
+                       history: list = None, outcome: dict = None) -> str:
+    """Отправляет запрос к API DeepSeek и возвращает ответ целиком.
+
+    history - предыдущие реплики диалога; в outcome['answer'] попадает только
+    полный ответ (finish_reason 'stop', не текст ошибки и не обрезанный по длине) -
+    его можно запомнить в истории.
+    """
+    if not DEEPSEEK_API_KEY:
+        return NO_KEY_MESSAGE
+    
+    # 🔄 ПОВТОРНЫЙ ВОПРОС - ОТВЕТ ИЗ КЭША БЕЗ ЗАПРОСА К API
+    # Ответ на вопрос с историей зависит от нее - кэшируем только первые вопросы разговора
+    cached = None if history else await get_cached_answer(prompt, PROMPT_VERSION)
+    if cached:
+        logger.info(f"🤖 Ответ ИИ из кэша: {prompt[:100]}...")
+        if outcome is not None:
+            outcome['answer'] = cached
+        return cached
+    
+    try:
+        url, headers, data = _build_request(prompt, stream=False, history=history)
         
         logger.info(f"Отправка запроса к DeepSeek API: {prompt[:100]}...")
         
-        # Увеличиваем таймаут до 60 секунд
-        response = requests.post(url, headers=headers, json=data, timeout=60)
+        # Увеличиваем таймаут до 60 секунд; запрос - в отдельном пуле ИИ, чтобы не держать
+        # ни event loop, ни потоки загрузки курсов
+        response = await run_ai(partial(requests.post, url, headers=headers, json=data, timeout=60),
+                                stage="deepseek")
         
         if response.status_code == 200:
             result = response.json()
             answer = result['choices'][0]['message']['content']
+            finish_reason = result['choices'][0].get('finish_reason')
             logger.info("Успешно получен ответ от DeepSeek API")
+            usage = result.get('usage') or {}
+            _log_usage(usage)
+            if not history:
+                await store_answer(prompt, PROMPT_VERSION, answer, usage.get('total_tokens'), finish_reason)
+            # Обрезанный ответ в историю не кладем - следующий вопрос опирался бы на половину мысли
+            if outcome is not None and finish_reason == 'stop':
+                outcome['answer'] = answer
             return answer
-        elif response.status_code == 402:
-            logger.error("Недостаточно средств на счету DeepSeek API")
-            return "❌ Функционал ИИ временно недоступен. Недостаточно средств на API аккаунте. Обратитесь к администратору."
-        elif response.status_code == 401:
-            logger.error("Неверный API ключ DeepSeek")
-            return "❌ Ошибка аутентификации API. Проверьте API ключ."
-        elif response.status_code == 429:
-            logger.error("Превышен лимит запросов к DeepSeek API")
-            return "⏰ Превышен лимит запросов. Попробуйте позже."
-        else:
-            error_msg = f"Ошибка API DeepSeek: {response.status_code} - {response.text}"
-            logger.error(error_msg)
-            return f"❌ Временная ошибка сервиса ИИ. Попробуйте позже."
+        return _error_message(response.status_code, response.text)
             
     except requests.exceptions.Timeout:
         logger.error("Таймаут при запросе к DeepSeek API")
-        return "⏰ ИИ не успел обработать запрос. Попробуйте позже."
+        return TIMEOUT_MESSAGE
     except requests.exceptions.RequestException as e:
         logger.error(f"Сетевая ошибка при запросе к DeepSeek API: {e}")
-        return "❌ Произошла сетевая ошибка. Проверьте подключение к интернету."
+        return NETWORK_ERROR_MESSAGE
     except Exception as e:
         logger.error(f"Неожиданная ошибка при работе с DeepSeek API: {e}")
-        return "❌ Произошла непредвиденная ошибка. Попробуйте позже."
+        return UNEXPECTED_ERROR_MESSAGE
+
+async def stream_deepseek(prompt: str, history: list = None, outcome: dict = None):
+    """Потоковый ответ DeepSeek (SSE): асинхронный генератор фрагментов текста.
+
+    Первый фрагмент приходит примерно через секунду, а не после генерации всего
+    ответа. Ошибки отдаются фрагментом с текстом для пользователя, как в ask_deepseek;
+    outcome['answer'] заполняется, только если ответ дошел до конца (finish_reason 'stop').
+    """
+    if not DEEPSEEK_API_KEY:
+        yield NO_KEY_MESSAGE
+        return
+
+    cached = None if history else await get_cached_answer(prompt, PROMPT_VERSION)
+    if cached:
+        logger.info(f"🤖 Ответ ИИ из кэша: {prompt[:100]}...")
+        if outcome is not None:
+            outcome['answer'] = cached
+        yield cached
+        return
+
+    url, headers, data = _build_request(prompt, stream=True, history=history)
+    # Общего таймаута нет - длинный ответ идет долго; ограничиваем паузу между фрагментами
+    timeout = aiohttp.ClientTimeout(total=None, connect=10, sock_read=AI_STREAM_IDLE_TIMEOUT)
+    received = []
+    usage = None
+    finish_reason = None
+    done = False
+    logger.info(f"Потоковый запрос к DeepSeek API: {prompt[:100]}...")
+
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.post(url, headers=headers, json=data) as response:
+                if response.status != 200:
+                    yield _error_message(response.status, await response.text())
+                    return
+
+                # SSE: строки "data: {...}", пустые строки между событиями, ": keep-alive"
+                async for raw_line in response.content:
+                    line = raw_line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == '[DONE]':
+                        done = True
+                        break
+                    chunk = json.loads(payload)
+                    usage = chunk.get('usage') or usage
+                    choices = chunk.get('choices') or [{}]
+                    finish_reason = choices[0].get('finish_reason') or finish_reason
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        received.append(delta)
+                        yield delta
+
+        # Соединение закрылось без [DONE] - ответ оборван, в кэш и историю его не пускаем
+        if not done:
+            logger.error("Потоковый ответ DeepSeek оборван до [DONE]")
+            yield ("\n\n" if received else "") + NETWORK_ERROR_MESSAGE
+            return
+
+        logger.info("Успешно получен потоковый ответ от DeepSeek API")
+        # В кэш и историю - только ответ, дошедший до конца без ошибок
+        answer = ''.join(received)
+        _log_usage(usage or {})
+        if not history:
+            await store_answer(prompt, PROMPT_VERSION, answer, (usage or {}).get('total_tokens'), finish_reason)
+        if outcome is not None and finish_reason == 'stop':
+            outcome['answer'] = answer
+
+    except asyncio.TimeoutError:
+        logger.error("Таймаут при потоковом запросе к DeepSeek API")
+        yield ("\n\n" if received else "") + TIMEOUT_MESSAGE
+    except aiohttp.ClientError as e:
+        logger.error(f"Сетевая ошибка при потоковом запросе к DeepSeek API: {e}")
+        yield ("\n\n" if received else "") + NETWORK_ERROR_MESSAGE
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при потоковом запросе к DeepSeek API: {e}")
+        yield ("\n\n" if received else "") + UNEXPECTED_ERROR_MESSAGE
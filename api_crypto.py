@@ -1,97 +1,134 @@
 # api_crypto.py - полностью обновляем для работы с кэшированием
 import requests
 import json
+import threading
+import time
+from collections import deque
 from datetime import datetime, timezone, timedelta
 import logging
 from config import logger, COINGECKO_API_BASE, COINGECKO_API_KEY
 
 # 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
-from cache import get_cache, set_cache
-
-def get_crypto_rates():
-    """Получает курсы криптовалют через CoinGecko API с использованием API ключа И КЭШИРОВАНИЯ"""
-    try:
-        # 🎯 ПРОВЕРЯЕМ КЭШ ПЕРВЫМ ДЕЛОМ
-        cache_key = "crypto_rates"
-        cached_data = get_cache(cache_key)
-
-        # ✅ ЕСЛИ ДАННЫЕ ЕСТЬ В КЭШЕ - ВОЗВРАЩАЕМ ИХ
-        if cached_data:
-            logger.info("💾 Используются кэшированные данные криптовалют")
-            return cached_data
-
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - ЗАПРАШИВАЕМ У API
-        logger.info("🌐 Запрашиваем свежие данные криптовалют у CoinGecko API")
-
-        # Основные криптовалюты для отслеживания
-        crypto_ids = [
-            'bitcoin', 'ethereum', 'binancecoin', 'ripple', 'cardano',
-            'solana', 'polkadot', 'dogecoin', 'tron', 'litecoin'
-        ]
-
-        url = f"{COINGECKO_API_BASE}/simple/price"
-        params = {
-            'ids': ','.join(crypto_ids),
-            'vs_currencies': 'rub,usd',
-            'include_24hr_change': 'true',
-            'include_last_updated_at': 'true',
-            'precision': 'full'
+from cache import cached
+from snapshots import get_stale_notice
+from timeseries import record, crypto_series
+from http_client import http_get, SOURCE_COINGECKO
+from crypto_universe import get_tracked_coins, make_batches, coin_info, DEFAULT_COINS
+
+# 📊 РАСХОД КВОТЫ COINGECKO: все запросы бота, для подстройки частоты опроса
+_quota = {'month': None, 'month_calls': 0, 'recent': deque(), 'throttled_at': 0.0, 'last_ok': 0.0}
+_quota_lock = threading.Lock()
+
+def note_quota_call(status_code: int):
+    """Учитывает запрос к CoinGecko (любой: цены, проверка доступности)"""
+    now = time.time()
+    month = time.strftime('%Y-%m', time.gmtime(now))
+    with _quota_lock:
+        if _quota['month'] != month:
+            _quota['month'] = month
+            _quota['month_calls'] = 0
+        _quota['month_calls'] += 1
+        _quota['recent'].append(now)
+        while _quota['recent'] and _quota['recent'][0] < now - 60:
+            _quota['recent'].popleft()
+        if status_code == 429:
+            _quota['throttled_at'] = now
+        elif status_code < 400:
+            _quota['last_ok'] = now
+
+def get_quota_usage() -> dict:
+    """Запросов за последнюю минуту и за месяц (UTC), время последнего 429 и последнего успеха"""
+    now = time.time()
+    month = time.strftime('%Y-%m', time.gmtime(now))
+    with _quota_lock:
+        return {
+            'minute_calls': sum(1 for moment in _quota['recent'] if moment >= now - 60),
+            'month_calls': _quota['month_calls'] if _quota['month'] == month else 0,
+            'throttled_at': _quota['throttled_at'],
+            'last_ok': _quota['last_ok'],
         }
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json'
-        }
+def _fetch_price_batch(coin_ids: list, vs_currencies: str = 'rub,usd', full: bool = True):
+    """Один запрос /simple/price: (данные, не изменился ли ответ) или None.
+
+    full=False - только цены и время обновления (для частого опроса уведомлений).
+    """
+    url = f"{COINGECKO_API_BASE}/simple/price"
+    params = {
+        'ids': ','.join(coin_ids),
+        'vs_currencies': vs_currencies,
+        'include_last_updated_at': 'true',
+        'precision': 'full'
+    }
+    if full:
+        params['include_24hr_change'] = 'true'
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': 'application/json'
+    }
+
+    # Добавляем API ключ если он есть
+    if COINGECKO_API_KEY:
+        headers['x-cg-demo-api-key'] = COINGECKO_API_KEY
+
+    logger.debug(f"Запрос к CoinGecko API: {url} ({len(coin_ids)} монет)")
+
+    response = http_get(SOURCE_COINGECKO, url, conditional=True, params=params, headers=headers, timeout=15)
+    note_quota_call(response.status_code)
+
+    if response.status_code == 429:
+        logger.warning("Превышен лимит запросов к CoinGecko API (429)")
+        return None
+    elif response.status_code == 401:
+        logger.error("Неверный API ключ CoinGecko (401)")
+        return None
+    elif response.status_code != 200:
+        logger.error(f"Ошибка CoinGecko API: {response.status_code}")
+        logger.error(f"Текст ответа: {response.text}")
+        return None
 
-        # Добавляем API ключ если он есть
-        if COINGECKO_API_KEY:
-            headers['x-cg-demo-api-key'] = COINGECKO_API_KEY
-            logger.info("Используется API ключ CoinGecko")
-        else:
-            logger.info("API ключ CoinGecko не найден, используем бесплатные запросы")
+    data = response.json()
 
-        logger.info(f"Запрос к CoinGecko API: {url}")
-        logger.info(f"Параметры: {params}")
+    # Проверяем структуру ответа
+    if not isinstance(data, dict):
+        logger.error(f"Неправильный формат ответа: ожидался dict, получен {type(data)}")
+        return None
 
-        response = requests.get(url, params=params, headers=headers, timeout=15)
+    return data, response.unchanged
 
-        if response.status_code == 429:
-            logger.warning("Превышен лимит запросов к CoinGecko API (429)")
-            return get_crypto_rates_fallback(rate_limit=True)
-        elif response.status_code == 401:
-            logger.error("Неверный API ключ CoinGecko (401)")
-            return get_crypto_rates_fallback(auth_error=True)
-        elif response.status_code != 200:
-            logger.error(f"Ошибка CoinGecko API: {response.status_code}")
-            logger.error(f"Текст ответа: {response.text}")
-            return get_crypto_rates_fallback()
+@cached(key="crypto_rates", source=SOURCE_COINGECKO)
+def get_crypto_rates():
+    """Получает курсы криптовалют через CoinGecko API с использованием API ключа И КЭШИРОВАНИЯ.
 
-        data = response.json()
-        logger.info(f"Успешно получены данные от CoinGecko: {len(data)} криптовалют")
+    Запрашиваются монеты по умолчанию и объединение списков всех пользователей -
+    минимальным числом пакетов /simple/price. Каждый пользователь видит свою
+    выборку из этого общего результата.
+    """
+    try:
+        tracked = get_tracked_coins()
+        batches = make_batches(tracked)
+        logger.info(f"🌐 Запрашиваем свежие данные криптовалют у CoinGecko API: "
+                    f"{len(tracked)} монет, запросов: {len(batches)}")
+        logger.debug("Используется API ключ CoinGecko" if COINGECKO_API_KEY else "API ключ CoinGecko не найден, используем бесплатные запросы")
+
+        data = {}
+        unchanged = True
+        for batch in batches:
+            fetched = _fetch_price_batch(batch)
+            if fetched is None:
+                return None
+            batch_data, batch_unchanged = fetched
+            data.update(batch_data)
+            unchanged = unchanged and batch_unchanged
 
-        # Проверяем структуру ответа
-        if not isinstance(data, dict):
-            logger.error(f"Неправильный формат ответа: ожидался dict, получен {type(data)}")
-            return get_crypto_rates_fallback()
-
-        # Маппинг названий криптовалют
-        crypto_names = {
-            'bitcoin': {'name': 'Bitcoin', 'symbol': 'BTC'},
-            'ethereum': {'name': 'Ethereum', 'symbol': 'ETH'},
-            'binancecoin': {'name': 'Binance Coin', 'symbol': 'BNB'},
-            'ripple': {'name': 'XRP', 'symbol': 'XRP'},
-            'cardano': {'name': 'Cardano', 'symbol': 'ADA'},
-            'solana': {'name': 'Solana', 'symbol': 'SOL'},
-            'polkadot': {'name': 'Polkadot', 'symbol': 'DOT'},
-            'dogecoin': {'name': 'Dogecoin', 'symbol': 'DOGE'},
-            'tron': {'name': 'TRON', 'symbol': 'TRX'},
-            'litecoin': {'name': 'Litecoin', 'symbol': 'LTC'}
-        }
+        logger.info(f"Успешно получены данные от CoinGecko: {len(data)} криптовалют")
 
         crypto_rates = {}
         valid_count = 0
 
-        for crypto_id, info in crypto_names.items():
+        for crypto_id in tracked:
+            info = coin_info(crypto_id)
             if crypto_id in data:
                 crypto_data = data[crypto_id]
 
@@ -132,163 +169,101 @@ def get_crypto_rates():
 
         logger.info(f"Успешно обработано {valid_count} криптовалют")
 
+        # 📈 ЗАПИСЫВАЕМ ЦЕНЫ ВО ВРЕМЕННЫЕ РЯДЫ (тот же ответ повторно не пишем)
+        for crypto_id, info in ({} if unchanged else crypto_rates).items():
+            moment = info['last_updated'] or None
+            record(crypto_series(crypto_id, 'rub'), info['price_rub'], moment)
+            record(crypto_series(crypto_id, 'usd'), info['price_usd'], moment)
+
         if crypto_rates:
             # Исправляем время на московское (UTC+3)
             moscow_tz = timezone(timedelta(hours=3))
-            crypto_rates['update_time'] = datetime.now(moscow_tz).strftime('%d.%m.%Y %H:%M')
+            # Время обновления - по данным CoinGecko, чтобы повторный ответ давал равный результат
+            last_updated = max((info['last_updated'] for info in crypto_rates.values()), default=0)
+            update_time = datetime.fromtimestamp(last_updated, moscow_tz) if last_updated else datetime.now(moscow_tz)
+            crypto_rates['update_time'] = update_time.strftime('%d.%m.%Y %H:%M')
             crypto_rates['source'] = 'coingecko'
             crypto_rates['rate_limit'] = False
             crypto_rates['auth_error'] = False
             crypto_rates['api_key_used'] = bool(COINGECKO_API_KEY)
 
-            # 💾 СОХРАНЯЕМ РЕЗУЛЬТАТ В КЭШ
-            set_cache(cache_key, crypto_rates)
-            logger.info("💾 Данные криптовалют сохранены в кэш на 30 минут")
-
             return crypto_rates
         else:
             logger.error("Не найдено валидных данных по криптовалютам в ответе API")
-            return get_crypto_rates_fallback()
+            return None
 
     except requests.exceptions.Timeout:
         logger.error("Таймаут при запросе к CoinGecko API")
-        return get_crypto_rates_fallback()
+        return None
     except requests.exceptions.RequestException as e:
         logger.error(f"Сетевая ошибка при получении курсов криптовалют: {e}")
-        return get_crypto_rates_fallback()
+        return None
     except json.JSONDecodeError as e:
         logger.error(f"Ошибка парсинга JSON от CoinGecko: {e}")
-        return get_crypto_rates_fallback()
+        return None
     except Exception as e:
         logger.error(f"Неожиданная ошибка при получении курсов криптовалют: {e}")
-        return get_crypto_rates_fallback()
-
-def get_crypto_rates_fallback(rate_limit=False, auth_error=False):
-    """Резервная функция для получения курсов криптовалют (демо-данные) С КЭШИРОВАНИЕМ"""
-    try:
-        # 🎯 ПРОВЕРЯЕМ КЭШ ДЛЯ FALLBACK ДАННЫХ
-        cache_key = "crypto_rates_fallback"
-        cached_data = get_cache(cache_key)
-
-        if cached_data:
-            logger.info("💾 Используются кэшированные демо-данные криптовалют")
-            return cached_data
-
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - СОЗДАЕМ ДЕМО-ДАННЫЕ
-        logger.info("🔄 Используем демо-данные криптовалют")
-
-        # Демо-данные на случай недоступности API
-        crypto_rates = {
-            'bitcoin': {
-                'name': 'Bitcoin',
-                'symbol': 'BTC',
-                'price_rub': 4500000.0,
-                'price_usd': 50000.0,
-                'change_24h': 2.5,
-                'last_updated': datetime.now().timestamp()
-            },
-            'ethereum': {
-                'name': 'Ethereum',
-                'symbol': 'ETH',
-                'price_rub': 300000.0,
-                'price_usd': 3300.0,
-                'change_24h': 1.2,
-                'last_updated': datetime.now().timestamp()
-            },
-            'binancecoin': {
-                'name': 'Binance Coin',
-                'symbol': 'BNB',
-                'price_rub': 35000.0,
-                'price_usd': 380.0,
-                'change_24h': -0.5,
-                'last_updated': datetime.now().timestamp()
-            },
-            'ripple': {
-                'name': 'XRP',
-                'symbol': 'XRP',
-                'price_rub': 60.0,
-                'price_usd': 0.65,
-                'change_24h': 0.8,
-                'last_updated': datetime.now().timestamp()
-            },
-            'cardano': {
-                'name': 'Cardano',
-                'symbol': 'ADA',
-                'price_rub': 45.0,
-                'price_usd': 0.48,
-                'change_24h': -1.2,
-                'last_updated': datetime.now().timestamp()
-            },
-            'solana': {
-                'name': 'Solana',
-                'symbol': 'SOL',
-                'price_rub': 15000.0,
-                'price_usd': 160.0,
-                'change_24h': 3.2,
-                'last_updated': datetime.now().timestamp()
-            },
-            'polkadot': {
-                'name': 'Polkadot',
-                'symbol': 'DOT',
-                'price_rub': 800.0,
-                'price_usd': 8.5,
-                'change_24h': 1.5,
-                'last_updated': datetime.now().timestamp()
-            },
-            'dogecoin': {
-                'name': 'Dogecoin',
-                'symbol': 'DOGE',
-                'price_rub': 30.0,
-                'price_usd': 0.32,
-                'change_24h': -2.1,
-                'last_updated': datetime.now().timestamp()
-            }
-        }
-
-        moscow_tz = timezone(timedelta(hours=3))
-        crypto_rates['update_time'] = datetime.now(moscow_tz).strftime('%d.%m.%Y %H:%M')
-        crypto_rates['source'] = 'demo_fallback'
-        crypto_rates['rate_limit'] = rate_limit
-        crypto_rates['auth_error'] = auth_error
-        crypto_rates['api_key_used'] = False
+        return None
 
-        # 💾 СОХРАНЯЕМ FALLBACK ДАННЫЕ В КЭШ
-        set_cache(cache_key, crypto_rates)
-        logger.info("💾 Демо-данные криптовалют сохранены в кэш на 30 минут")
+def fetch_alert_prices(pairs: set):
+    """Цены для уведомлений: {'bitcoin/USD': цена} по парам (монета, валюта).
 
-        return crypto_rates
+    Только монеты с активными уведомлениями, без изменения за 24ч - минимальный ответ.
+    Возвращает (цены, время обновления по монетам) или None при ошибке.
+    """
+    coin_ids = sorted({coin_id for coin_id, _ in pairs})
+    quotes = ','.join(sorted({quote.lower() for _, quote in pairs}))
+    prices, updated = {}, {}
+    try:
+        for batch in make_batches(coin_ids):
+            fetched = _fetch_price_batch(batch, vs_currencies=quotes, full=False)
+            if fetched is None:
+                return None
+            data, _ = fetched
+            for coin_id, values in data.items():
+                if not isinstance(values, dict):
+                    continue
+                updated[coin_id] = values.get('last_updated_at') or 0
+                for quote, price in values.items():
+                    if quote == 'last_updated_at' or price is None:
+                        continue
+                    prices[f"{coin_id}/{quote.upper()}"] = float(price)
+        return prices, updated
 
-    except Exception as e:
-        logger.error(f"Ошибка в fallback функции криптовалют: {e}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Сетевая ошибка при опросе цен для уведомлений: {e}")
         return None
+    except (TypeError, ValueError) as e:
+        logger.error(f"Ошибка разбора цен для уведомлений: {e}")
+        return None
+
+def format_crypto_rates_message(crypto_rates: dict, watchlist: frozenset = None) -> str:
+    """Форматирует сообщение с курсами криптовалют.
 
-def format_crypto_rates_message(crypto_rates: dict) -> str:
-    """Форматирует сообщение с курсами криптовалют"""
+    watchlist - монеты пользователя: показываются только они и все подробно;
+    без него - монеты по умолчанию (первые 5 подробно).
+    """
     if not crypto_rates:
         return "❌ Не удалось получить курсы криптовалют от CoinGecko API."
 
-    message = f"₿ <b>КУРСЫ КРИПТОВАЛЮТ</b>\n\n"
+    if watchlist:
+        message = f"⭐ <b>МОИ КРИПТОВАЛЮТЫ</b>\n\n"
+    else:
+        message = f"₿ <b>КУРСЫ КРИПТОВАЛЮТ</b>\n\n"
 
-    # Добавляем информацию о статусе API
-    if crypto_rates.get('source') == 'demo_fallback':
-        if crypto_rates.get('auth_error'):
-            message += "🔐 <b>ВНИМАНИЕ:</b> Ошибка аутентификации CoinGecko API\n"
-            message += "💡 <i>Используются демонстрационные данные</i>\n\n"
-        elif crypto_rates.get('rate_limit'):
-            message += "⚠️ <b>ВНИМАНИЕ:</b> Превышен лимит запросов к CoinGecko API\n"
-            message += "💡 <i>Используются демонстрационные данные</i>\n\n"
-        else:
-            message += "⚠️ <b>ВНИМАНИЕ:</b> CoinGecko API временно недоступен\n"
-            message += "💡 <i>Используются демонстрационные данные</i>\n\n"
+    # Показываем статус API ключа
+    if crypto_rates.get('api_key_used'):
+        message += "🔐 <b>Статус:</b> Используется API ключ CoinGecko\n\n"
     else:
-        # Показываем статус API ключа при успешном запросе
-        if crypto_rates.get('api_key_used'):
-            message += "🔐 <b>Статус:</b> Используется API ключ CoinGecko\n\n"
-        else:
-            message += "🆓 <b>Статус:</b> Бесплатный тариф CoinGecko\n\n"
+        message += "🆓 <b>Статус:</b> Бесплатный тариф CoinGecko\n\n"
 
-    # Основные криптовалюты (первые 5)
-    main_cryptos = ['bitcoin', 'ethereum', 'binancecoin', 'ripple', 'cardano']
+    # Общий результат содержит и монеты из чужих списков - выбираем нужные
+    if watchlist:
+        shown = [crypto_id for crypto_id in crypto_rates if crypto_id in watchlist]
+        main_cryptos = shown
+    else:
+        shown = [crypto_id for crypto_id in DEFAULT_COINS if crypto_id in crypto_rates]
+        main_cryptos = shown[:5]
 
     for crypto_id in main_cryptos:
         if crypto_id in crypto_rates:
@@ -319,8 +294,7 @@ def format_crypto_rates_message(crypto_rates: dict) -> str:
             )
 
     # Остальные криптовалюты
-    other_cryptos = [crypto_id for crypto_id in crypto_rates.keys()
-                    if crypto_id not in main_cryptos and crypto_id not in ['update_time', 'source', 'rate_limit', 'auth_error', 'api_key_used']]
+    other_cryptos = [crypto_id for crypto_id in shown if crypto_id not in main_cryptos]
 
     if other_cryptos:
         message += "🔹 <b>Другие криптовалюты:</b>\n"
@@ -343,6 +317,11 @@ def format_crypto_rates_message(crypto_rates: dict) -> str:
                 f"   <b>{symbol}</b>: {price_rub:,.0f} руб. {change_icon}\n"
             )
 
+    if watchlist and len(shown) < len(watchlist):
+        message += "⏳ <i>Часть монет из списка появится после ближайшего обновления</i>\n"
+    if not watchlist:
+        message += "\n💡 <i>Свой список монет: /watch BTC TON</i>\n"
+
     message += f"\n<i>Обновлено: {crypto_rates.get('update_time', 'неизвестно')} (МСК)</i>\n\n"
 
     if crypto_rates.get('source') == 'coingecko':
@@ -350,11 +329,10 @@ def format_crypto_rates_message(crypto_rates: dict) -> str:
             message += "💡 <i>Данные предоставлены CoinGecko API (премиум)</i>"
         else:
             message += "💡 <i>Данные предоставлены CoinGecko API (бесплатный тариф)</i>"
-    else:
-        message += "💡 <i>Данные обновятся при восстановлении доступа к CoinGecko API</i>"
 
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
     message += f"\n\n💾 <i>Данные обновляются каждые 30 минут</i>"
+    message += get_stale_notice("crypto_rates")
 
     return message
 
@@ -366,7 +344,6 @@ def refresh_crypto_cache():
 
         # Очищаем кэш для криптовалют
         force_refresh_cache("crypto_rates")
-        force_refresh_cache("crypto_rates_fallback")
 
         logger.info("🔄 Кэш криптовалют принудительно обновлен")
         return True
@@ -1,90 +1,70 @@
 # api_currency.py
-import requests
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import logging
-from config import CBR_API_BASE, logger
+from config import logger, CBR_PUBLICATION_WINDOW
 
 # 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
-from cache import get_cache, set_cache
+from cache import cached, register_deadline_provider
+from snapshots import get_stale_notice
+from http_client import SOURCE_CBR
+from currency_store import ensure_dates, get_document_date, get_rates, get_rates_on, today_msk, is_tomorrow_published
+from cbr_calendar import next_rates_check, MOSCOW_TZ
+from currency_catalog import get_table, convert
 
 def get_currency_rates_for_date(date_req):
-    """Получает курсы валют на определенную дату"""
+    """Получает курсы валют на определенную дату (из локального хранилища или у ЦБ РФ)"""
     try:
-        url = f"{CBR_API_BASE}scripts/XML_daily.asp"
-        params = {'date_req': date_req}
-        
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code != 200:
+        day = datetime.strptime(date_req, '%d/%m/%Y').date()
+        rates, doc_date = get_rates_on(day)
+        if not rates:
             return None, None
-        
-        root = ET.fromstring(response.content)
-        cbr_date = root.get('Date', '')
-        
-        rates = {}
-        currency_codes = {
-            'R01235': 'USD',  'R01239': 'EUR',  'R01035': 'GBP',  'R01820': 'JPY',
-            'R01375': 'CNY',  'R01775': 'CHF',  'R01350': 'CAD',  'R01010': 'AUD',
-            'R01700': 'TRY',  'R01335': 'KZT', 'R01230': 'AED',
-        }
-        
-        for valute in root.findall('Valute'):
-            valute_id = valute.get('ID')
-            if valute_id in currency_codes:
-                currency_code = currency_codes[valute_id]
-                name = valute.find('Name').text
-                value = float(valute.find('Value').text.replace(',', '.'))
-                nominal = int(valute.find('Nominal').text)
-                
-                if nominal > 1:
-                    value = value / nominal
-                
-                rates[currency_code] = {
-                    'value': value,
-                    'name': name,
-                    'nominal': nominal
-                }
-        
-        return rates, cbr_date
-        
+        return rates, doc_date.strftime('%d.%m.%Y')
+
     except Exception as e:
         logger.error(f"Ошибка при получении курсов на дату {date_req}: {e}")
         return None, None
 
+def _next_currency_refresh(timestamp: float):
+    """Дедлайн кэша курсов по календарю публикаций ЦБ РФ"""
+    day = datetime.fromtimestamp(timestamp, MOSCOW_TZ).date()
+    return next_rates_check(timestamp, is_tomorrow_published(day))
+
+# 📅 КУРСЫ ОБНОВЛЯЮТСЯ ПО КАЛЕНДАРЮ ПУБЛИКАЦИЙ, А НЕ ПО ФИКСИРОВАННОМУ TTL
+register_deadline_provider("currency_rates", _next_currency_refresh)
+
+# Результат при недоступности ЦБ РФ - в кэш не попадает
+EMPTY_HISTORY_RESULT = ({}, 'неизвестная дата', None, None, None, None)
+EMPTY_TOMORROW_RESULT = ({}, 'неизвестная дата', None, {})
+
+@cached(key="currency_rates_with_history", schedule="currency_rates",
+        validate=lambda result: bool(result[0]), default=EMPTY_HISTORY_RESULT, source=SOURCE_CBR)
 def get_currency_rates_with_history():
     """Получает курсы валют на сегодня, вчера и завтра (если доступно) С КЭШИРОВАНИЕМ"""
     try:
-        # 🎯 КЛЮЧЕВОЕ ИЗМЕНЕНИЕ: ПРОВЕРЯЕМ КЭШ ПЕРВЫМ ДЕЛОМ
-        cache_key = "currency_rates_with_history"
-        cached_data = get_cache(cache_key)
-        
-        # ✅ ЕСЛИ ДАННЫЕ ЕСТЬ В КЭШЕ - ВОЗВРАЩАЕМ ИХ
-        if cached_data:
-            logger.info("💾 Используются кэшированные данные курсов валют")
-            return cached_data
-        
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - ЗАПРАШИВАЕМ У API
         logger.info("🌐 Запрашиваем свежие данные курсов валют у ЦБ РФ")
         
-        today = datetime.now()
-        yesterday = today - timedelta(days=1)
+        today = today_msk()
         tomorrow = today + timedelta(days=1)
-        
-        # Форматируем даты для запроса
-        date_today = today.strftime('%d/%m/%Y')
-        date_yesterday = yesterday.strftime('%d/%m/%Y')
-        date_tomorrow = tomorrow.strftime('%d/%m/%Y')
-        
-        # Получаем курсы на сегодня
-        rates_today, date_today_str = get_currency_rates_for_date(date_today)
+
+        # 📥 Догружаем только недостающие документы, параллельно.
+        # Вчерашний и сегодняшний уже не меняются, так что обычно это один запрос на завтра
+        ensure_dates([today - timedelta(days=1), today, tomorrow])
+
+        today_doc = get_document_date(today)
+        rates_today = get_rates(today_doc)
         if not rates_today:
-            return {}, 'неизвестная дата', None, None, None, None
-        
-        # Получаем курсы на вчера
-        rates_yesterday, date_yesterday_str = get_currency_rates_for_date(date_yesterday)
-        
-        # Пытаемся получить курсы на завтра
-        rates_tomorrow, date_tomorrow_str = get_currency_rates_for_date(date_tomorrow)
+            return EMPTY_HISTORY_RESULT
+        date_today_str = today_doc.strftime('%d.%m.%Y')
+
+        # Предыдущий документ - действующий накануне даты сегодняшнего (учитывает выходные)
+        previous_day = today_doc - timedelta(days=1)
+        ensure_dates([previous_day])
+        rates_yesterday = get_rates(get_document_date(previous_day)) or None
+
+        # Курсы на завтра - только если ЦБ РФ уже опубликовал новый документ,
+        # иначе на завтрашнюю дату возвращается тот же сегодняшний
+        tomorrow_doc = get_document_date(tomorrow)
+        rates_tomorrow = get_rates(tomorrow_doc) if tomorrow_doc and tomorrow_doc > today_doc else None
         
         # Рассчитываем изменения по сравнению со вчера
         changes_yesterday = {}
@@ -119,7 +99,7 @@ def get_currency_rates_with_history():
                     }
         
         # 📦 ФОРМИРУЕМ РЕЗУЛЬТАТ
-        result = (
+        return (
             rates_today, 
             date_today_str, 
             rates_yesterday, 
@@ -128,28 +108,16 @@ def get_currency_rates_with_history():
             changes_tomorrow
         )
         
-        # 💾 СОХРАНЯЕМ РЕЗУЛЬТАТ В КЭШ
-        set_cache(cache_key, result)
-        logger.info("💾 Данные курсов валют сохранены в кэш на 1 час")
-        
-        return result
-        
     except Exception as e:
         logger.error(f"Ошибка при получении курсов с историей: {e}")
-        return {}, 'неизвестная дата', None, None, None, None
+        return EMPTY_HISTORY_RESULT
 
 # 🔄 ОБНОВЛЯЕМ ФУНКЦИЮ ДЛЯ ОБРАТНОЙ СОВМЕСТИМОСТИ
+@cached(key="currency_rates_tomorrow", schedule="currency_rates",
+        validate=lambda result: bool(result[0]), default=EMPTY_TOMORROW_RESULT, source=SOURCE_CBR)
 def get_currency_rates_with_tomorrow():
     """Совместимая функция для старых вызовов С КЭШИРОВАНИЕМ"""
     try:
-        # 🎯 ТАКЖЕ ИСПОЛЬЗУЕМ КЭШИРОВАНИЕ
-        cache_key = "currency_rates_tomorrow"
-        cached_data = get_cache(cache_key)
-        
-        if cached_data:
-            logger.info("💾 Используются кэшированные данные курсов (совместимость)")
-            return cached_data
-        
         # Получаем данные через основную функцию (которая уже кэшируется)
         rates_today, date_today, _, _, rates_tomorrow, changes_tomorrow = get_currency_rates_with_history()
         
@@ -162,16 +130,11 @@ def get_currency_rates_with_tomorrow():
                     'change_percent': change_info['change_percent']
                 }
         
-        result = (rates_today, date_today, rates_tomorrow, changes)
-        
-        # Сохраняем в кэш
-        set_cache(cache_key, result)
-        
-        return result
+        return (rates_today, date_today, rates_tomorrow, changes)
         
     except Exception as e:
         logger.error(f"Ошибка в совместимой функции: {e}")
-        return {}, 'неизвестная дата', None, {}
+        return EMPTY_TOMORROW_RESULT
 
 # 🔧 ДОБАВЛЯЕМ ФУНКЦИЮ ПРИНУДИТЕЛЬНОГО ОБНОВЛЕНИЯ
 def refresh_currency_cache():
@@ -270,6 +233,57 @@ def format_currency_rates_message(rates_today: dict, date_today: str,
         message += f"\n💡 <i>Курсы на завтра будут опубликованы ЦБ РФ позже</i>"
     
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
-    message += f"\n\n💾 <i>Данные обновляются каждые 60 минут</i>"
+    message += f"\n\n💾 <i>Данные обновляются по календарю публикаций ЦБ РФ: в рабочие дни {CBR_PUBLICATION_WINDOW} МСК</i>"
+    message += get_stale_notice("currency_rates_with_history")
     
     return message
+
+# 🧮 КОНВЕРТЕР ПО МАТРИЦЕ КРОСС-КУРСОВ
+def get_conversion_table(load_missing: bool = True):
+    """Таблица кросс-курсов документа, действующего сегодня.
+
+    Обычно документ уже загружен обновлением кэша - тогда запроса к ЦБ РФ нет.
+    load_missing=False - только из памяти (для вызова прямо из event loop).
+    """
+    try:
+        today = today_msk()
+        if load_missing and get_table(get_document_date(today)) is None:
+            ensure_dates([today])
+        return get_table(get_document_date(today))
+
+    except Exception as e:
+        logger.error(f"Ошибка при получении таблицы кросс-курсов: {e}")
+        return None
+
+def parse_conversion_args(args: list):
+    """Аргументы /convert: (сумма, из, в) или None. Принимает '100 USD EUR' и '100,5 usd eur'"""
+    if len(args) != 3:
+        return None
+    try:
+        amount = float(args[0].replace(',', '.').replace(' ', ''))
+    except ValueError:
+        return None
+    if amount <= 0 or amount != amount or amount == float('inf'):
+        return None
+    return amount, args[1].upper(), args[2].upper()
+
+def _format_amount(value: float) -> str:
+    digits = 2 if abs(value) >= 1 else 6
+    return f"{value:,.{digits}f}".replace(',', ' ')
+
+def format_conversion_message(table, amount: float, from_code: str, to_code: str) -> str:
+    """Форматирует результат конвертации"""
+    unknown = [code for code in (from_code, to_code) if code not in table.index]
+    if unknown:
+        return (f"❌ Валюта {', '.join(unknown)} не найдена в справочнике ЦБ РФ.\n\n"
+                f"Доступные коды: {', '.join(table.codes)}")
+
+    result, rate = convert(table, amount, from_code, to_code)
+    message = f"💱 <b>КОНВЕРТАЦИЯ ПО КУРСУ ЦБ РФ</b>\n"
+    message += f"📅 <i>на {table.doc_date.strftime('%d.%m.%Y')}</i>\n\n"
+    message += f"<b>{_format_amount(amount)} {from_code} = {_format_amount(result)} {to_code}</b>\n\n"
+    message += f"   1 {from_code} = {_format_amount(rate)} {to_code}\n"
+    message += f"   1 {to_code} = {_format_amount(1 / rate)} {from_code}\n\n"
+    message += f"<i>{table.name(from_code)} → {table.name(to_code)}</i>"
+    message += get_stale_notice("currency_rates_with_history")
+    return message
@@ -1,155 +1,108 @@
 # api_keyrate.py - обновляем функции с кэшированием
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
+import threading
+from datetime import datetime, date, timedelta
 import logging
 from config import logger
 
 # 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
-from cache import get_cache, set_cache
+from cache import cached
+from snapshots import get_stale_notice
+from http_client import SOURCE_CBR
+from cbr_tables import fetch_table_rows
+from timeseries import record_many, range_query, ts_to_date, SERIES_KEY_RATE
+from currency_store import today_msk
+
+# Ключевая ставка введена Банком России 13.09.2013 - с этой даты загружаем историю
+KEY_RATE_HISTORY_START = date(2013, 9, 13)
+
+# 🔄 ИСТОРИЯ РЕШЕНИЙ: только даты изменения ставки [(дата, ставка)], от старых к новым
+_decisions = []
+_checked_through = None   # последняя дата, по которую страница ЦБ РФ уже разобрана
+_history_lock = threading.Lock()
+
+def _restore_decisions():
+    """Восстанавливает историю решений из ряда timeseries (загружен из БД при старте)"""
+    global _checked_through
+    for ts, rate in range_query(SERIES_KEY_RATE, 0):
+        day = ts_to_date(ts)
+        if not _decisions or _decisions[-1][1] != rate:
+            _decisions.append((day, rate))
+        _checked_through = day
+
+def ingest_key_rate():
+    """Догружает таблицу ключевой ставки только за даты после последней разобранной.
+
+    Первый запуск загружает историю с KEY_RATE_HISTORY_START, дальше запрос
+    идет за диапазон [последняя дата + 1, сегодня]. В историю попадают только
+    дни, когда ставка изменилась. Возвращает число новых решений или None при ошибке.
+    """
+    global _checked_through
+    with _history_lock:
+        if not _decisions:
+            _restore_decisions()
+
+        today = today_msk()
+        date_from = _checked_through + timedelta(days=1) if _checked_through else KEY_RATE_HISTORY_START
+        if date_from > today:
+            return 0
+
+        # Проверяем что дата не в будущем
+        rows = fetch_table_rows("hd_base/KeyRate/", date_from, today, "ключевая ставка", until=today)
+        if rows is None:
+            return None
 
-def get_key_rate():
-    """Получает ключевую ставку ЦБ РФ с использованием нескольких методов И КЭШИРОВАНИЯ"""
-    try:
-        # 🎯 ПРОВЕРЯЕМ КЭШ ПЕРВЫМ ДЕЛОМ
-        cache_key = "key_rate"
-        cached_data = get_cache(cache_key)
-        
-        # ✅ ЕСЛИ ДАННЫЕ ЕСТЬ В КЭШЕ - ВОЗВРАЩАЕМ ИХ
-        if cached_data:
-            logger.info("💾 Используются кэшированные данные ключевой ставки")
-            return cached_data
-        
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - ЗАПРАШИВАЕМ У API
-        logger.info("🌐 Запрашиваем свежие данные ключевой ставки у ЦБ РФ")
+        changes = []
+        for day, rate in rows:
+            if _checked_through and day <= _checked_through:
+                continue
+            if not _decisions or _decisions[-1][1] != rate:
+                _decisions.append((day, rate))
+                changes.append((day, rate))
+            _checked_through = day
 
-        # Сначала пробуем парсинг HTML с правильными заголовками
-        key_rate_data = get_key_rate_html()
-        if key_rate_data:
-            # 💾 СОХРАНЯЕМ В КЭШ ПРИ УСПЕШНОМ ПОЛУЧЕНИИ
-            set_cache(cache_key, key_rate_data)
-            logger.info("💾 Данные ключевой ставки сохранены в кэш на 24 часа")
-            return key_rate_data
-
-        # Если не получилось, пробуем API
-        logger.info("Парсинг HTML не удался, пробуем API...")
-        key_rate_data = get_key_rate_api()
-        if key_rate_data:
-            # 💾 СОХРАНЯЕМ В КЭШ ПРИ УСПЕШНОМ ПОЛУЧЕНИИ
-            set_cache(cache_key, key_rate_data)
-            logger.info("💾 Данные ключевой ставки сохранены в кэш на 24 часа")
-            return key_rate_data
-
-        # Если оба метода не сработали, возвращаем None вместо демо-данных
-        logger.error("Не удалось получить актуальную ключевую ставку")
-        return None
+        record_many(SERIES_KEY_RATE, changes)
+        logger.info(f"📥 Ключевая ставка: разобрано с {date_from.strftime('%d.%m.%Y')}, новых решений: {len(changes)}")
+        return len(changes)
 
-    except Exception as e:
-        logger.error(f"Ошибка при получении ключевой ставки: {e}")
-        return None
-
-def get_key_rate_html():
-    """Парсинг ключевой ставки с сайта ЦБ РФ"""
+@cached(key="key_rate", source=SOURCE_CBR)
+def get_key_rate():
+    """Получает ключевую ставку ЦБ РФ из локальной истории решений С КЭШИРОВАНИЕМ"""
     try:
-        url = "https://cbr.ru/hd_base/KeyRate/"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Referer': 'https://www.cbr.ru/',
-            'Connection': 'keep-alive',
-        }
-
-        # Добавляем задержку чтобы не выглядеть как бот
-        import time
-        time.sleep(1)
-
-        response = requests.get(url, headers=headers, timeout=15)
+        logger.info("🌐 Запрашиваем свежие данные ключевой ставки у ЦБ РФ")
 
-        if response.status_code == 403:
-            logger.error("Доступ запрещен (403) при парсинге HTML")
-            return None
-        elif response.status_code != 200:
-            logger.error(f"Ошибка HTTP {response.status_code} при парсинге HTML")
+        if ingest_key_rate() is None or not _decisions:
+            # Если загрузка не удалась, возвращаем None вместо демо-данных
+            logger.error("Не удалось получить актуальную ключевую ставку")
             return None
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Ищем таблицу с ключевыми ставками
-        table = soup.find('table', class_='data')
-        if table:
-            rows = table.find_all('tr')
-            for i in range(1, min(len(rows), 10)):  # Проверяем первые 10 строк
-                cells = rows[i].find_all('td')
-                if len(cells) >= 2:
-                    date_str = cells[0].get_text(strip=True)
-                    rate_str = cells[1].get_text(strip=True).replace(',', '.')
-
-                    try:
-                        date_obj = datetime.strptime(date_str, '%d.%m.%Y')
-                        # Проверяем что дата не в будущем
-                        if date_obj <= datetime.now():
-                            rate_value = float(rate_str)
-
-                            return {
-                                'rate': rate_value,
-                                'date': date_obj.strftime('%d.%m.%Y'),
-                                'is_current': True,
-                                'source': 'cbr_parsed'
-                            }
-                    except ValueError:
-                        continue
-
-        return None
-
-    except Exception as e:
-        logger.error(f"Ошибка при парсинге HTML ключевой ставки: {e}")
-        return None
-
-def get_key_rate_api():
-    """Получает ключевую ставку через API ЦБ РФ"""
-    try:
-        # Альтернативный URL для ключевой ставки
-        url = "https://www.cbr.ru/hd_base/KeyRate/?UniDbQuery.Posted=True&UniDbQuery.From=01.01.2020&UniDbQuery.To=31.12.2025"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        day, rate = _decisions[-1]
+        key_rate_data = {
+            'rate': rate,
+            'date': day.strftime('%d.%m.%Y'),
+            'is_current': True,
+            'source': 'cbr_parsed'
         }
-
-        response = requests.get(url, headers=headers, timeout=10)
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            table = soup.find('table', class_='data')
-
-            if table:
-                rows = table.find_all('tr')
-                for i in range(1, min(len(rows), 5)):  # Первые 5 строк
-                    cells = rows[i].find_all('td')
-                    if len(cells) >= 2:
-                        date_str = cells[0].get_text(strip=True)
-                        rate_str = cells[1].get_text(strip=True).replace(',', '.')
-
-                        try:
-                            date_obj = datetime.strptime(date_str, '%d.%m.%Y')
-                            if date_obj <= datetime.now():
-                                rate_value = float(rate_str)
-
-                                return {
-                                    'rate': rate_value,
-                                    'date': date_str,
-                                    'is_current': True,
-                                    'source': 'cbr_api'
-                                }
-                        except ValueError:
-                            continue
-        return None
+        if len(_decisions) > 1:
+            previous_day, previous_rate = _decisions[-2]
+            key_rate_data['previous_rate'] = previous_rate
+            key_rate_data['previous_date'] = previous_day.strftime('%d.%m.%Y')
+        key_rate_data['decisions_count'] = len(_decisions)
+        return key_rate_data
 
     except Exception as e:
-        logger.error(f"Ошибка при получении ключевой ставки через API: {e}")
+        logger.error(f"Ошибка при получении ключевой ставки: {e}")
         return None
 
+def _format_previous_change(key_rate_data: dict) -> str:
+    """Строка о предыдущем изменении ставки (пустая, если истории нет)"""
+    previous_rate = key_rate_data.get('previous_rate')
+    if previous_rate is None:
+        return ""
+    change = key_rate_data['rate'] - previous_rate
+    change_icon = "📈" if change > 0 else "📉"
+    return (f"<b>Предыдущее значение:</b> {previous_rate:.2f}% "
+            f"(до {key_rate_data['date']}, {change_icon} {change:+.2f} п.п.)\n")
+
 def format_key_rate_message(key_rate_data: dict) -> str:
     """Форматирует сообщение с ключевой ставкой"""
     if not key_rate_data:
@@ -160,7 +113,9 @@ def format_key_rate_message(key_rate_data: dict) -> str:
 
     message = f"💎 <b>КЛЮЧЕВАЯ СТАВКА ЦБ РФ</b>\n\n"
     message += f"<b>Текущее значение:</b> {rate:.2f}%\n"
-    message += f"\n<b>Дата установления:</b> {key_rate_data.get('date', 'неизвестно')}\n\n"
+    message += f"\n<b>Дата установления:</b> {key_rate_data.get('date', 'неизвестно')}\n"
+    message += _format_previous_change(key_rate_data)
+    message += "\n"
     message += "💡 <i>Ключевая ставка - это основная процентная ставка ЦБ РФ,"
     message += "которая влияет на кредиты, депозиты и экономику в целом</i>"
 
@@ -172,6 +127,7 @@ def format_key_rate_message(key_rate_data: dict) -> str:
     
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
     message += f"\n\n💾 <i>Данные обновляются каждые 24 часа</i>"
+    message += get_stale_notice("key_rate")
 
     return message
 
@@ -187,7 +143,9 @@ def format_combined_rates_message(key_rate_data: dict, ruonia_data: dict = None)
     # Ключевая ставка
     message += "📊 <b>Ключевая ставка:</b>\n"
     message += f"Текущее значение: <b>{key_rate:.2f}%</b>\n"
-    message += f"Дата: {key_rate_data.get('date', 'неизвестно')}\n\n"
+    message += f"Дата установления: {key_rate_data.get('date', 'неизвестно')}\n"
+    message += _format_previous_change(key_rate_data)
+    message += "\n"
 
     # Добавляем информацию о RUONIA если есть
     if ruonia_data:
@@ -241,6 +199,7 @@ def format_combined_rates_message(key_rate_data: dict, ruonia_data: dict = None)
     
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
     message += f"\n\n💾 <i>Данные обновляются каждые 24 часа</i>"
+    message += get_stale_notice("key_rate", "ruonia_rate")
 
     return message
 
@@ -1,189 +1,115 @@
 # api_ruonia.py
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import logging
 from config import logger
 
 # 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
-from cache import get_cache, set_cache
+from cache import cached
+from snapshots import get_stale_notice
+from http_client import SOURCE_CBR
+from cbr_tables import fetch_table_rows
+from timeseries import record_many, latest, last_n, ts_to_date, SERIES_RUONIA
+from currency_store import today_msk
+
+# Сколько дней истории загружаем при первом запуске
+RUONIA_BACKFILL_DAYS = 365
+
+_backfilled_days = 0
+
+def fetch_ruonia_rows(date_from, date_to):
+    """Строки таблицы RUONIA за диапазон [(дата, ставка)], подстраховываясь зеркалами"""
+    # Проверяем, что дата не в будущем и ставка разумная
+    return fetch_table_rows("hd_base/ruonia/dynamics/", date_from, date_to, "страница RUONIA",
+                            min_rate=1, max_rate=30, until=today_msk())
+
+def ingest_ruonia(backfill_days: int = None):
+    """Догружает в ряд RUONIA только даты новее последней сохраненной.
+
+    Страница запрашивается за диапазон [последняя дата + 1, сегодня], поэтому
+    обычно это одна-две строки. backfill_days - явная догрузка истории назад.
+    Возвращает число добавленных точек или None при ошибке загрузки.
+    """
+    today = today_msk()
+    latest_point = latest(SERIES_RUONIA)
+    high_water = ts_to_date(latest_point[0]) if latest_point else None
+
+    if backfill_days:
+        date_from = today - timedelta(days=backfill_days)
+    elif high_water:
+        date_from = high_water + timedelta(days=1)
+    else:
+        date_from = today - timedelta(days=RUONIA_BACKFILL_DAYS)
+
+    if date_from > today:
+        return 0
+
+    rows = fetch_ruonia_rows(date_from, today)
+    if rows is None:
+        return None
+
+    if not backfill_days and high_water:
+        rows = [(day, rate) for day, rate in rows if day > high_water]
 
+    record_many(SERIES_RUONIA, rows)
+    logger.info(f"📥 RUONIA: добавлено {len(rows)} значений (с {date_from.strftime('%d.%m.%Y')})")
+    return len(rows)
+
+@cached(key="ruonia_rate", source=SOURCE_CBR)
 def get_ruonia_rate():
-    """Получает ставку RUONIA с сайта ЦБ РФ (страница dynamics) С КЭШИРОВАНИЕМ"""
+    """Получает ставку RUONIA с сайта ЦБ РФ (страница dynamics) С КЭШИРОВАНИЕМ.
+
+    Одна загрузка страницы обновляет общий ряд, из которого читают и ставка, и история.
+    """
     try:
-        # 🎯 ПРОВЕРЯЕМ КЭШ ПЕРВЫМ ДЕЛОМ
-        cache_key = "ruonia_rate"
-        cached_data = get_cache(cache_key)
-        
-        # ✅ ЕСЛИ ДАННЫЕ ЕСТЬ В КЭШЕ - ВОЗВРАЩАЕМ ИХ
-        if cached_data:
-            logger.info("💾 Используются кэшированные данные RUONIA")
-            return cached_data
-        
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - ЗАПРАШИВАЕМ У API
         logger.info("🌐 Запрашиваем свежие данные RUONIA у ЦБ РФ")
-        
-        url = "https://cbr.ru/hd_base/ruonia/dynamics/"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-        }
-
-        logger.info(f"Запрос к URL: {url}")
-        response = requests.get(url, headers=headers, timeout=15)
 
-        if response.status_code != 200:
-            logger.error(f"Ошибка HTTP {response.status_code} при парсинге RUONIA")
+        if ingest_ruonia() is None:
             return None
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        logger.info("HTML получен успешно")
-
-        # Ищем таблицу со ставками RUONIA
-        table = soup.find('table', class_='data')
-
-        if not table:
-            # Пробуем найти любую таблицу
-            table = soup.find('table')
-            logger.info("Таблица найдена без класса")
-
-        if table:
-            logger.info("Таблица найдена, начинаем парсинг строк")
-            rows = table.find_all('tr')
-            logger.info(f"Найдено строк в таблице: {len(rows)}")
-
-            # Собираем все доступные данные
-            rates_data = []
-
-            for i, row in enumerate(rows[1:], 1):  # Пропускаем заголовок
-                cells = row.find_all(['td', 'th'])
-
-                if len(cells) >= 2:
-                    try:
-                        # Первая ячейка - дата
-                        date_text = cells[0].get_text(strip=True)
-                        # Вторая ячейка - ставка
-                        rate_text = cells[1].get_text(strip=True)
-
-                        # Парсим дату
-                        date_obj = datetime.strptime(date_text, '%d.%m.%Y')
-
-                        # Парсим ставку (заменяем запятую на точку)
-                        rate_value = float(rate_text.replace(',', '.'))
-
-                        # Проверяем, что дата не в будущем и ставка разумная
-                        if date_obj <= datetime.now() and 1 <= rate_value <= 30:
-                            rates_data.append({
-                                'date': date_obj,
-                                'rate': rate_value,
-                                'date_str': date_text
-                            })
-                            logger.info(f"Найдена ставка: {date_text} - {rate_value}%")
-
-                    except (ValueError, IndexError) as e:
-                        logger.warning(f"Ошибка парсинга строки {i}: {e}")
-                        continue
-
-            # Сортируем по дате (от новых к старым) и берем самую свежую
-            if rates_data:
-                rates_data.sort(key=lambda x: x['date'], reverse=True)
-                latest_rate = rates_data[0]
-
-                logger.info(f"Самая свежая ставка: {latest_rate['date_str']} - {latest_rate['rate']}%")
-
-                result = {
-                    'rate': latest_rate['rate'],
-                    'date': latest_rate['date_str'],
-                    'is_current': True,
-                    'source': 'cbr_parsed'
-                }
-                
-                # 💾 СОХРАНЯЕМ РЕЗУЛЬТАТ В КЭШ
-                set_cache(cache_key, result)
-                logger.info("💾 Данные RUONIA сохранены в кэш на 24 часа")
-                
-                return result
-            else:
-                logger.error("Не найдено валидных данных в таблице")
-        else:
-            logger.error("Таблица не найдена на странице")
+        latest_point = latest(SERIES_RUONIA)
+        if not latest_point:
+            logger.error("Не найдено валидных данных RUONIA")
+            return None
 
-        return None
+        ts, rate = latest_point
+        return {
+            'rate': rate,
+            'date': ts_to_date(ts).strftime('%d.%m.%Y'),
+            'is_current': True,
+            'source': 'cbr_parsed'
+        }
 
     except Exception as e:
         logger.error(f"Ошибка при получении ставки RUONIA: {e}")
         return None
 
 def get_ruonia_historical(days=30):
-    """Получает исторические данные RUONIA за указанное количество дней С КЭШИРОВАНИЕМ"""
+    """Получает исторические данные RUONIA за указанное количество дней (из локального ряда)"""
+    global _backfilled_days
     try:
-        # 🎯 ПРОВЕРЯЕМ КЭШ ДЛЯ ИСТОРИЧЕСКИХ ДАННЫХ
-        cache_key = f"ruonia_historical_{days}"
-        cached_data = get_cache(cache_key)
-        
-        if cached_data:
-            logger.info(f"💾 Используются кэшированные исторические данные RUONIA за {days} дней")
-            return cached_data
-        
-        # 🔄 ЕСЛИ ДАННЫХ НЕТ В КЭШЕ - ЗАПРАШИВАЕМ У API
-        logger.info(f"🌐 Запрашиваем свежие исторические данные RUONIA за {days} дней")
-
-        url = "https://cbr.ru/hd_base/ruonia/dynamics/"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-        }
-
-        response = requests.get(url, headers=headers, timeout=15)
-
-        if response.status_code != 200:
+        # Актуализируем ряд не чаще, чем позволяет кэш ставки
+        get_ruonia_rate()
+
+        # Ряд короче запрошенного - один раз догружаем историю назад
+        if len(last_n(SERIES_RUONIA, days)) < days and _backfilled_days < days:
+            # Публикации только по рабочим дням - берем календарный запас
+            backfill = days * 7 // 5 + 14
+            if ingest_ruonia(backfill_days=backfill) is not None:
+                _backfilled_days = days
+
+        points = last_n(SERIES_RUONIA, days)
+        if not points:
             return None
 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        table = soup.find('table', class_='data')
-
-        if not table:
-            table = soup.find('table')
-
-        if table:
-            rates_data = []
-            rows = table.find_all('tr')
-
-            for row in rows[1:]:  # Пропускаем заголовок
-                cells = row.find_all(['td', 'th'])
-
-                if len(cells) >= 2:
-                    try:
-                        date_text = cells[0].get_text(strip=True)
-                        rate_text = cells[1].get_text(strip=True)
-
-                        date_obj = datetime.strptime(date_text, '%d.%m.%Y')
-                        rate_value = float(rate_text.replace(',', '.'))
-
-                        if date_obj <= datetime.now() and 1 <= rate_value <= 30:
-                            rates_data.append({
-                                'date': date_obj,
-                                'rate': rate_value,
-                                'date_str': date_text
-                            })
-
-                    except (ValueError, IndexError):
-                        continue
-
-            # Сортируем по дате и ограничиваем количеством дней
-            rates_data.sort(key=lambda x: x['date'], reverse=True)
-            result = rates_data[:days]
-            
-            # 💾 СОХРАНЯЕМ РЕЗУЛЬТАТ В КЭШ
-            set_cache(cache_key, result)
-            logger.info(f"💾 Исторические данные RUONIA сохранены в кэш на 24 часа")
-            
-            return result
-
-        return None
+        result = []
+        for ts, rate in reversed(points):
+            day = ts_to_date(ts)
+            result.append({
+                'date': datetime(day.year, day.month, day.day),
+                'rate': rate,
+                'date_str': day.strftime('%d.%m.%Y')
+            })
+        return result
 
     except Exception as e:
         logger.error(f"Ошибка при получении исторических данных RUONIA: {e}")
@@ -208,6 +134,7 @@ def format_ruonia_message(ruonia_data: dict) -> str:
     
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
     message += f"\n\n💾 <i>Данные обновляются каждые 24 часа</i>"
+    message += get_stale_notice("ruonia_rate")
 
     return message
 
@@ -250,6 +177,7 @@ def format_ruonia_historical_message(historical_data: list) -> str:
     
     # 🔄 ДОБАВЛЯЕМ ИНФОРМАЦИЮ О КЭШИРОВАНИИ
     message += f"\n\n💾 <i>Данные обновляются каждые 24 часа</i>"
+    message += get_stale_notice("ruonia_rate")
 
     return message
 
@@ -261,7 +189,6 @@ def refresh_ruonia_cache():
         
         # Очищаем кэш для RUONIA
         force_refresh_cache("ruonia_rate")
-        force_refresh_cache("ruonia_historical_30")  # Очищаем кэш для 30 дней
         
         logger.info("🔄 Кэш RUONIA принудительно обновлен")
         return True
@@ -1,32 +1,36 @@
 import requests
-import random
 from datetime import datetime, timezone, timedelta
 import logging
 from config import OPENWEATHER_API_BASE, WEATHER_API_KEY, logger
 
+# 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
+from cache import cached
+from snapshots import get_stale_notice
+from http_client import http_get, SOURCE_OPENWEATHER
+
+@cached(key="weather", source=SOURCE_OPENWEATHER)
 def get_weather_moscow():
-    """Получает текущую погоду в Москве через OpenWeatherMap API"""
+    """Получает текущую погоду в Москве через OpenWeatherMap API С КЭШИРОВАНИЕМ"""
     try:
-        # Если API ключ не установлен, используем демо-данные
         if not WEATHER_API_KEY or WEATHER_API_KEY == 'demo_key_12345':
-            logger.warning("API ключ погоды не настроен, используем демо-данные")
-            return get_weather_demo()
-        
+            logger.warning("API ключ погоды не настроен")
+            return None
+
         CITY = "Moscow"
         URL = f"http://api.openweathermap.org/data/2.5/weather?q={CITY}&appid={WEATHER_API_KEY}&units=metric&lang=ru"
         
         logger.info(f"Запрос погоды для города: {CITY}")
-        response = requests.get(URL, timeout=10)
+        response = http_get(SOURCE_OPENWEATHER, URL, conditional=True, timeout=10)
         
         if response.status_code == 401:
             logger.error("Невалидный API ключ OpenWeatherMap")
-            return get_weather_demo()
+            return None
         elif response.status_code == 429:
             logger.error("Превышен лимит запросов к API погоды")
-            return get_weather_demo()
+            return None
         elif response.status_code != 200:
             logger.error(f"Ошибка API погоды: {response.status_code} - {response.text}")
-            return get_weather_demo()
+            return None
             
         data = response.json()
         
@@ -47,48 +51,13 @@ def get_weather_moscow():
         
     except requests.exceptions.Timeout:
         logger.error("Таймаут при запросе погоды")
-        return get_weather_demo()
+        return None
     except requests.exceptions.RequestException as e:
         logger.error(f"Сетевая ошибка при получении погоды: {e}")
-        return get_weather_demo()
+        return None
     except Exception as e:
         logger.error(f"Неожиданная ошибка при получении погоды: {e}")
-        return get_weather_demo()
-
-def get_weather_demo():
-    """Демо-данные погоды на случай недоступности API"""
-    # Сезонные температуры для реалистичности
-    current_month = datetime.now().month
-    if current_month in [12, 1, 2]:  # Зима
-        temp_range = (-15, -2)
-    elif current_month in [3, 4, 5]:  # Весна
-        temp_range = (0, 15)
-    elif current_month in [6, 7, 8]:  # Лето
-        temp_range = (15, 30)
-    else:  # Осень
-        temp_range = (5, 18)
-    
-    descriptions = [
-        "ясно", "переменная облачность", "облачно с прояснениями", 
-        "небольшой дождь", "пасмурно", "снег", "небольшая облачность"
-    ]
-    
-    weather_data = {
-        'city': 'Москва',
-        'temperature': random.randint(temp_range[0], temp_range[1]),
-        'feels_like': 0,
-        'description': random.choice(descriptions),
-        'humidity': random.randint(40, 90),
-        'pressure': random.randint(740, 780),
-        'wind_speed': round(random.uniform(1, 8), 1),
-        'icon': '02d',
-        'source': 'demo'
-    }
-    
-    # Делаем "ощущается как" реалистичным
-    weather_data['feels_like'] = weather_data['temperature'] + random.randint(-3, 2)
-    
-    return weather_data
+        return None
 
 def format_weather_message(weather_data):
     """Форматирует сообщение с погодой"""
@@ -138,14 +107,11 @@ def format_weather_message(weather_data):
     
     message += f"👗 <b>Рекомендация:</b> {recommendation}\n\n"
     
-    if weather_data['source'] == 'demo':
-        message += "⚠️ <i>Используются демонстрационные данные (API ключ не настроен или недоступен)</i>\n"
-        message += "💡 <i>Для реальных данных настройте API ключ OpenWeatherMap</i>\n"
-    else:
-        message += "✅ <i>Актуальные данные от OpenWeatherMap</i>\n"
+    message += "✅ <i>Данные от OpenWeatherMap</i>\n"
     
     # Исправляем время на московское (UTC+3)
     moscow_tz = timezone(timedelta(hours=3))
     message += f"🕒 <i>Обновлено: {datetime.now(moscow_tz).strftime('%d.%m.%Y %H:%M')} (МСК)</i>"
+    message += get_stale_notice("weather")
     
     return message
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк пропускной способности get_cache: до и после движка дедлайнов
+
+Запуск: python bench_cache.py [--iterations N]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+# Бенчмарку не нужны реальные токены - только модуль кэша
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'bench')
+
+import pytz
+import cache
+
+KEYS = ['currency_rates_with_history', 'key_rate', 'ruonia_rate', 'crypto_rates', 'weather']
+
+def legacy_get_cache(key: str):
+    """Прежний алгоритм: проверка расписания строками '%H:%M' на каждое чтение"""
+    if key not in cache._cache_data:
+        return None
+    if key in cache._cache_ttl:
+        ttl = cache._cache_ttl[key]
+        timestamp = cache._cache_timestamps.get(key, 0)
+
+        schedule_times = cache._cache_schedule.get(key)
+        if schedule_times:
+            moscow_tz = pytz.timezone('Europe/Moscow')
+            current_time_str = datetime.now(moscow_tz).strftime('%H:%M')
+            last_update_str = datetime.fromtimestamp(timestamp, moscow_tz).strftime('%H:%M')
+            for schedule_time in schedule_times:
+                if current_time_str >= schedule_time and last_update_str < schedule_time:
+                    return None
+
+        if time.time() - timestamp > ttl:
+            return None
+    return cache._cache_data[key]
+
+def measure(func, iterations: int) -> float:
+    """Возвращает число чтений в секунду"""
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(KEYS[i % len(KEYS)])
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк get_cache")
+    parser.add_argument('--iterations', type=int, default=200_000)
+    args = parser.parse_args()
+
+    cache.init_cache()
+    for key in KEYS:
+        cache.set_cache(key, {'payload': key})
+
+    before = measure(legacy_get_cache, args.iterations)
+    after = measure(cache.get_cache, args.iterations)
+
+    print(f"get_cache (до, расписание на каждое чтение): {before:,.0f} чтений/с")
+    print(f"get_cache (после, дедлайн-epoch):            {after:,.0f} чтений/с")
+    print(f"Ускорение: x{after / before:.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк парсеров ЦБ РФ на сохраненных страницах: мс/страница и пиковые аллокации
+
+Страницы берутся из каталога bench_fixtures/ (обновить с сайта ЦБ РФ: --record).
+Для сравнения рядом меряется прежний разбор (BeautifulSoup html.parser / ElementTree)
+на той же работе: для XML_daily.asp - весь справочник с названиями.
+
+Запуск: python bench_parsers.py [--repeat N] [--fixtures DIR] [--record]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+
+import parsers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures')
+
+# Страницы для записи: имя файла -> URL
+RECORD_URLS = {
+    'keyrate.html': 'https://www.cbr.ru/hd_base/KeyRate/?UniDbQuery.Posted=True&UniDbQuery.From=13.09.2013&UniDbQuery.To={today}',
+    'ruonia.html': 'https://www.cbr.ru/hd_base/ruonia/dynamics/?UniDbQuery.Posted=True&UniDbQuery.From={year_ago}&UniDbQuery.To={today}',
+    'daily.xml': 'https://www.cbr.ru/scripts/XML_daily.asp',
+}
+
+def record_fixtures(directory: str):
+    """Сохраняет реальные страницы ЦБ РФ как фикстуры"""
+    import requests
+
+    today = date.today()
+    year_ago = today - timedelta(days=365)
+    fields = {'today': today.strftime('%d.%m.%Y'), 'year_ago': year_ago.strftime('%d.%m.%Y')}
+    os.makedirs(directory, exist_ok=True)
+    for name, url in RECORD_URLS.items():
+        response = requests.get(url.format(**fields), headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(response.content)
+        print(f"Записано {name}: {len(response.content) // 1024} КБ")
+
+def load_fixtures(directory: str) -> dict:
+    fixtures = {}
+    for name in RECORD_URLS:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+# 🐢 ПРЕЖНИЙ РАЗБОР - для сравнения
+def legacy_rate_table(content: bytes) -> list:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    result = []
+    table = soup.find('table', class_='data')
+    for row in table.find_all('tr')[1:] if table else []:
+        cells = row.find_all('td')
+        if len(cells) >= 2:
+            try:
+                result.append((datetime.strptime(cells[0].get_text(strip=True), '%d.%m.%Y').date(),
+                               float(cells[1].get_text(strip=True).replace(',', '.'))))
+            except ValueError:
+                continue
+    return result
+
+def legacy_daily_xml(content: bytes):
+    root = ET.fromstring(content)
+    rates = {}
+    for valute in root.findall('Valute'):
+        nominal = int(valute.find('Nominal').text)
+        rates[valute.find('CharCode').text] = {
+            'value': float(valute.find('Value').text.replace(',', '.')) / nominal,
+            'nominal': nominal,
+            'name': valute.find('Name').text,
+        }
+    return datetime.strptime(root.get('Date'), '%d.%m.%Y').date(), rates
+
+CASES = [
+    ('keyrate.html', 'parse_rate_table', parsers.parse_rate_table, legacy_rate_table),
+    ('ruonia.html', 'parse_rate_table', parsers.parse_rate_table, legacy_rate_table),
+    ('daily.xml', 'parse_daily_xml', parsers.parse_daily_xml, legacy_daily_xml),
+]
+
+def measure(func, content: bytes, repeat: int):
+    """(мс на страницу, пиковые аллокации КБ)"""
+    func(content)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(content)
+    elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed_ms, peak / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсеров ЦБ РФ")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--record', action='store_true', help="записать реальные страницы ЦБ РФ в каталог фикстур")
+    parser.add_argument('--no-legacy', action='store_true', help="не мерить прежний разбор")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.fixtures)
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"Нет страниц в {args.fixtures} - запишите их: --record")
+        return 1
+    print(f"{'страница':<14} {'парсер':<20} {'КБ':>7} {'мс/стр':>9} {'пик КБ':>9}")
+    for name, label, func, legacy in CASES:
+        content = fixtures.get(name)
+        if content is None:
+            continue
+        size_kb = len(content) / 1024
+        elapsed, peak = measure(func, content, args.repeat)
+        print(f"{name:<14} {label:<20} {size_kb:>7.0f} {elapsed:>9.2f} {peak:>9.0f}")
+        if not args.no_legacy:
+            elapsed, peak = measure(legacy, content, args.repeat)
+            print(f"{'':<14} {'прежний':<20} {'':>7} {elapsed:>9.2f} {peak:>9.0f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки запросов к временным рядам: 10 лет дневных данных
+
+Запуск: python bench_timeseries.py [--repeat N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+# Бенчмарку не нужны реальные токены - только модуль рядов
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'bench')
+
+import timeseries
+
+SERIES = timeseries.fx_series('USD')
+DAY = 86400
+
+def fill(years: int = 10) -> int:
+    """Заполняет ряд случайным блужданием за years лет"""
+    start = date.today() - timedelta(days=365 * years)
+    value = 60.0
+    points = []
+    for offset in range(365 * years + years // 4):
+        value = max(1.0, value + random.uniform(-0.8, 0.8))
+        points.append((start + timedelta(days=offset), value))
+    timeseries.record_many(SERIES, points)
+    return len(points)
+
+def measure(name: str, func, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<38} {elapsed * 1e6:>10.1f} мкс   ({len(result)} точек)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк timeseries")
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    started = time.perf_counter()
+    total = fill()
+    print(f"Загрузка {total} точек: {(time.perf_counter() - started) * 1000:.1f} мс\n")
+
+    now = time.time()
+    measure("last_n(30)", lambda: timeseries.last_n(SERIES, 30), args.repeat)
+    measure("range: последний месяц", lambda: timeseries.range_query(SERIES, now - 31 * DAY), args.repeat)
+    measure("range: последний год", lambda: timeseries.range_query(SERIES, now - 365 * DAY), args.repeat)
+    measure("range: 10 лет", lambda: timeseries.range_query(SERIES, 0), args.repeat)
+    measure("downsample: 10 лет по неделям (last)",
+            lambda: timeseries.downsample(SERIES, 0, now, 7 * DAY), args.repeat // 10)
+    measure("downsample: 10 лет по месяцам (mean)",
+            lambda: timeseries.downsample(SERIES, 0, now, 30 * DAY, agg='mean'), args.repeat // 10)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
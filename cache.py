@@ -1,9 +1,20 @@
 # cache.py
 import logging
+import asyncio
+import functools
+import heapq
+import inspect
+import math
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import pytz
-from config import logger
+from config import logger, NEGATIVE_CACHE_TTL
+from snapshots import save_snapshot, serve_snapshot, confirm_snapshot, get_snapshot, get_stale_keys
+
+# Часовой пояс расписания - создаем один раз, а не на каждое чтение
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 
 # Глобальные переменные для кэша
 _cache_data = {}
@@ -11,10 +22,33 @@ _cache_timestamps = {}
 _cache_ttl = {}
 _cache_schedule = {}
 
+# 🔄 ДЕДЛАЙНЫ: epoch, после которого запись считается устаревшей
+# Вычисляются один раз при записи: min(истечение TTL, ближайший слот расписания)
+_cache_deadlines = {}
+_cache_deadline_reasons = {}   # key -> 'ttl' | 'schedule'
+_parsed_schedule = {}          # policy -> отсортированный список (час, минута)
+_policy_keys = {}              # key -> имя политики TTL/расписания (мемоизация)
+
+# Куча (deadline, key) для проактивного обновления по таймеру
+_expiry_heap = []
+_refreshers = {}
+_deadline_providers = {}       # политика -> func(timestamp) -> (epoch, причина)
+
+# 🔄 СОСТОЯНИЕ ДЕКОРАТОРА @cached
+_MISSING = object()
+_explicit_policies = {}        # key -> имя политики, заданное через schedule=
+_negative_until = {}           # key -> epoch, до которого не повторяем неудачный запрос
+_inflight_locks = {}           # key -> threading.Lock (single-flight для sync)
+_inflight_tasks = {}           # key -> asyncio.Task (single-flight для async)
+_inflight_guard = threading.Lock()
+_cache_metrics = {}
+
+DEFAULT_NEGATIVE_TTL = NEGATIVE_CACHE_TTL
+
 def init_cache():
     """Инициализация кэша с настраиваемым расписанием"""
     global _cache_data, _cache_timestamps, _cache_ttl, _cache_schedule
-    
+
     # TTL для разных типов данных (в секундах)
     _cache_ttl = {
         'currency_rates': 3600,      # 1 час
@@ -23,27 +57,116 @@ def init_cache():
         'crypto_rates': 1800,        # 30 минут
         'weather': 1800,             # 30 минут
     }
-    
+
     # 🔄 РАСПИСАНИЕ ОБНОВЛЕНИЯ ПО МОСКОВСКОМУ ВРЕМЕНИ
+    # Курсы валют обновляются по календарю публикаций ЦБ РФ (cbr_calendar.py);
+    # слоты, заданные через /set_schedule, добавляются к нему
     _cache_schedule = {
-        'currency_rates': ['07:00', '10:00', '13:00', '16:00', '19:00'],  # Курсы валют
         'key_rate': ['08:00'],                                            # Ключевая ставка
         'ruonia_rate': ['08:00'],                                         # RUONIA
         'crypto_rates': ['09:00', '12:00', '15:00', '18:00', '21:00'],    # Криптовалюты
         'weather': ['06:00', '12:00', '18:00']                           # Погода
     }
-    
+
     _cache_data = {}
     _cache_timestamps = {}
+    _cache_deadlines.clear()
+    _cache_deadline_reasons.clear()
+    _expiry_heap.clear()
+    _negative_until.clear()
+    _policy_keys.clear()
+    _parsed_schedule.clear()
+    for key, times in _cache_schedule.items():
+        _parsed_schedule[key] = _parse_schedule(times)
+
     logger.info("✅ Кэш инициализирован с настраиваемым расписанием")
 
+def _parse_schedule(times: list) -> list:
+    """Преобразует ['ЧЧ:ММ', ...] в отсортированный список (час, минута)"""
+    slots = []
+    for time_str in times:
+        hours, minutes = time_str.split(':')
+        slots.append((int(hours), int(minutes)))
+    return sorted(set(slots))
+
+def _resolve_policy_key(key: str) -> str:
+    """Находит политику TTL/расписания для ключа.
+
+    Ключи вида 'currency_rates_with_history' наследуют политику 'currency_rates'
+    по самому длинному совпадающему префиксу.
+    """
+    policy = _policy_keys.get(key)
+    if policy is not None:
+        return policy
+
+    if key in _explicit_policies:
+        policy = _explicit_policies[key]
+    elif key in _cache_ttl or key in _cache_schedule:
+        policy = key
+    else:
+        policy = ''
+        for candidate in set(_cache_ttl) | set(_cache_schedule):
+            if key.startswith(candidate) and len(candidate) > len(policy):
+                policy = candidate
+
+    _policy_keys[key] = policy
+    return policy
+
+def _next_schedule_epoch(slots: list, after_ts: float) -> float:
+    """Возвращает epoch первого слота расписания строго после after_ts (МСК)"""
+    local_now = datetime.fromtimestamp(after_ts, MOSCOW_TZ)
+    for day_offset in (0, 1):
+        day = local_now.date() + timedelta(days=day_offset)
+        for hours, minutes in slots:
+            slot = MOSCOW_TZ.localize(datetime(day.year, day.month, day.day, hours, minutes))
+            slot_ts = slot.timestamp()
+            if slot_ts > after_ts:
+                return slot_ts
+    return math.inf
+
+def _compute_deadline(key: str, timestamp: float):
+    """Вычисляет жесткий дедлайн записи и его причину"""
+    policy = _resolve_policy_key(key)
+    deadline, reason = math.inf, None
+
+    provider = _deadline_providers.get(policy)
+    if provider:
+        # Политика со своим календарем заменяет TTL
+        try:
+            deadline, reason = provider(timestamp)
+        except Exception as e:
+            logger.error(f"❌ Ошибка календаря обновления {policy}: {e}")
+            provider = None
+
+    ttl = _cache_ttl.get(key) or _cache_ttl.get(policy)
+    if ttl and not provider:
+        deadline, reason = timestamp + ttl, 'ttl'
+
+    slots = _parsed_schedule.get(policy)
+    if slots:
+        slot_ts = _next_schedule_epoch(slots, timestamp)
+        if slot_ts < deadline:
+            deadline, reason = slot_ts, 'schedule'
+
+    return deadline, reason
+
+def _arm_deadline(key: str, timestamp: float):
+    """Сохраняет дедлайн записи и ставит его в кучу таймеров"""
+    deadline, reason = _compute_deadline(key, timestamp)
+    _cache_deadlines[key] = deadline
+    _cache_deadline_reasons[key] = reason
+    if deadline != math.inf:
+        heapq.heappush(_expiry_heap, (deadline, key))
+
 def set_cache(key: str, data, ttl: int = None):
     """Установка данных в кэш"""
     try:
+        now = time.time()
         _cache_data[key] = data
-        _cache_timestamps[key] = time.time()
+        _cache_timestamps[key] = now
         if ttl:
             _cache_ttl[key] = ttl
+        _arm_deadline(key, now)
         logger.debug(f"✅ Данные добавлены в кэш: {key}")
         return True
     except Exception as e:
@@ -51,65 +174,25 @@ def set_cache(key: str, data, ttl: int = None):
         return False
 
 def get_cache(key: str):
-    """Получение данных из кэша с проверкой расписания"""
+    """Получение данных из кэша: одно сравнение с заранее вычисленным дедлайном"""
+    value = _lookup(key)
+    return None if value is _MISSING else value
+
+def _lookup(key: str):
+    """Как get_cache, но отличает промах (_MISSING) от закэшированного пустого значения"""
     try:
-        if key not in _cache_data:
-            return None
-            
-        # Проверяем TTL
-        if key in _cache_ttl:
-            ttl = _cache_ttl[key]
-            timestamp = _cache_timestamps.get(key, 0)
-            
-            # 🔄 ПРОВЕРЯЕМ РАСПИСАНИЕ ОБНОВЛЕНИЯ
-            if should_refresh_by_schedule(key):
-                logger.info(f"🕒 По расписанию: кэш {key} требует обновления")
-                return None
-                
-            if time.time() - timestamp > ttl:
-                logger.debug(f"🕒 Кэш устарел: {key}")
-                return None
-                
-        logger.debug(f"✅ Данные получены из кэша: {key}")
+        deadline = _cache_deadlines.get(key)
+        if deadline is None:
+            return _MISSING
+
+        if time.time() >= deadline:
+            logger.debug(f"🕒 Кэш устарел: {key}")
+            return _MISSING
+
         return _cache_data[key]
     except Exception as e:
         logger.error(f"❌ Ошибка получения кэша {key}: {e}")
-        return None
-
-def should_refresh_by_schedule(key: str) -> bool:
-    """Проверяет, нужно ли обновить кэш по расписанию"""
-    try:
-        if key not in _cache_schedule:
-            return False
-            
-        schedule_times = _cache_schedule[key]
-        if not schedule_times:
-            return False
-            
-        # Получаем текущее московское время
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        current_time_moscow = datetime.now(moscow_tz)
-        current_time_str = current_time_moscow.strftime('%H:%M')
-        
-        # Получаем время последнего обновления
-        last_update_timestamp = _cache_timestamps.get(key, 0)
-        if last_update_timestamp == 0:
-            return True
-            
-        last_update_moscow = datetime.fromtimestamp(last_update_timestamp, moscow_tz)
-        last_update_str = last_update_moscow.strftime('%H:%M')
-        
-        # Проверяем, наступило ли время обновления по расписанию
-        for schedule_time in schedule_times:
-            if current_time_str >= schedule_time and last_update_str < schedule_time:
-                logger.info(f"⏰ Сработало расписание: {key} в {schedule_time} МСК")
-                return True
-                
-        return False
-        
-    except Exception as e:
-        logger.error(f"❌ Ошибка проверки расписания для {key}: {e}")
-        return False
+        return _MISSING
 
 def clear_cache(key: str = None):
     """Очистка кэша"""
@@ -117,10 +200,17 @@ def clear_cache(key: str = None):
         if key:
             _cache_data.pop(key, None)
             _cache_timestamps.pop(key, None)
+            _cache_deadlines.pop(key, None)
+            _cache_deadline_reasons.pop(key, None)
+            _negative_until.pop(key, None)
             logger.info(f"🧹 Кэш очищен: {key}")
         else:
             _cache_data.clear()
             _cache_timestamps.clear()
+            _cache_deadlines.clear()
+            _cache_deadline_reasons.clear()
+            _negative_until.clear()
+            _expiry_heap.clear()
             logger.info("🧹 Весь кэш очищен")
         return True
     except Exception as e:
@@ -129,60 +219,67 @@ def clear_cache(key: str = None):
 
 def get_cache_stats():
     """Получение статистики кэша с информацией о расписании"""
+    now = time.time()
     stats = {
         'total_entries': len(_cache_data),
         'entries': {},
         'schedule': _cache_schedule.copy()
     }
-    
+
     for key in _cache_data:
         if key in _cache_timestamps:
-            age = time.time() - _cache_timestamps[key]
-            ttl = _cache_ttl.get(key, 0)
-            remaining_ttl = max(0, ttl - age)
-            is_expired = age > ttl if ttl > 0 else False
-            
-            # Информация о следующем обновлении по расписанию
-            next_schedule_time = get_next_schedule_time(key)
-            needs_schedule_refresh = should_refresh_by_schedule(key)
-            
+            age = now - _cache_timestamps[key]
+            ttl = _cache_ttl.get(key) or _cache_ttl.get(_resolve_policy_key(key), 0)
+            deadline = _cache_deadlines.get(key, math.inf)
+            remaining = deadline - now
+            is_expired = remaining <= 0
+
             stats['entries'][key] = {
                 'age_seconds': int(age),
                 'age_human': str(timedelta(seconds=int(age))),
                 'ttl_seconds': ttl,
-                'remaining_ttl': int(remaining_ttl),
+                'remaining_ttl': int(max(0, remaining)) if remaining != math.inf else 0,
                 'is_expired': is_expired,
                 'data_size': len(str(_cache_data[key])),
-                'needs_schedule_refresh': needs_schedule_refresh,
-                'next_schedule_time': next_schedule_time,
-                'schedule_times': _cache_schedule.get(key, [])
+                'needs_schedule_refresh': is_expired and _cache_deadline_reasons.get(key) == 'schedule',
+                'next_schedule_time': get_next_schedule_time(key),
+                'schedule_times': _cache_schedule.get(_resolve_policy_key(key), []),
+                'deadline_reason': _cache_deadline_reasons.get(key)
             }
-    
+
+    stats['metrics'] = get_cache_metrics()
     return stats
 
+def register_deadline_provider(policy: str, provider):
+    """Задает для политики функцию дедлайна вместо TTL (например, календарь ЦБ РФ)"""
+    _deadline_providers[policy] = provider
+    _policy_keys.clear()
+    for cached_key, timestamp in list(_cache_timestamps.items()):
+        if _resolve_policy_key(cached_key) == policy:
+            _arm_deadline(cached_key, timestamp)
+
+def has_deadline_provider(policy: str) -> bool:
+    return policy in _deadline_providers
+
 def get_next_schedule_time(key: str) -> str:
     """Получает следующее время обновления по расписанию"""
     try:
-        if key not in _cache_schedule:
+        policy = _resolve_policy_key(key)
+        slots = _parsed_schedule.get(policy)
+        now = time.time()
+        if policy in _deadline_providers:
+            slot_ts, _ = _compute_deadline(key, now)
+        elif not slots:
             return "не настроено"
-            
-        schedule_times = _cache_schedule[key]
-        if not schedule_times:
-            return "не настроено"
-            
-        # Получаем текущее московское время
-        moscow_tz = pytz.timezone('Europe/Moscow')
-        current_time_moscow = datetime.now(moscow_tz)
-        current_time_str = current_time_moscow.strftime('%H:%M')
-        
-        # Ищем следующее время в расписании
-        for schedule_time in sorted(schedule_times):
-            if schedule_time > current_time_str:
-                return f"{schedule_time} МСК"
-                
-        # Если все времена прошли, берем первое на завтра
-        return f"{sorted(schedule_times)[0]} МСК (завтра)"
-        
+        else:
+            slot_ts = _next_schedule_epoch(slots, now)
+        slot_local = datetime.fromtimestamp(slot_ts, MOSCOW_TZ)
+        today_local = datetime.fromtimestamp(now, MOSCOW_TZ).date()
+
+        if slot_local.date() == today_local:
+            return f"{slot_local.strftime('%H:%M')} МСК"
+        return f"{slot_local.strftime('%H:%M')} МСК (завтра)"
+
     except Exception as e:
         logger.error(f"❌ Ошибка получения следующего времени для {key}: {e}")
         return "ошибка"
@@ -190,7 +287,15 @@ def get_next_schedule_time(key: str) -> str:
 def update_cache_schedule(key: str, times: list):
     """Обновляет расписание обновления для конкретного типа данных"""
     try:
+        _parsed_schedule[key] = _parse_schedule(times)
         _cache_schedule[key] = times
+        _policy_keys.clear()
+
+        # Пересчитываем дедлайны записей, попадающих под эту политику
+        for cached_key, timestamp in list(_cache_timestamps.items()):
+            if _resolve_policy_key(cached_key) == key:
+                _arm_deadline(cached_key, timestamp)
+
         logger.info(f"✅ Расписание обновлено для {key}: {times}")
         return True
     except Exception as e:
@@ -214,3 +319,264 @@ def force_refresh_cache(key: str = None):
     except Exception as e:
         logger.error(f"❌ Ошибка принудительного обновления кэша: {e}")
         return False
+
+# 🔄 ПРОАКТИВНОЕ ОБНОВЛЕНИЕ ПО КУЧЕ ДЕДЛАЙНОВ
+def register_refresher(key: str, func):
+    """Регистрирует функцию, которая заново заполняет ключ кэша после истечения"""
+    _refreshers[key] = func
+
+def get_refresher(key: str):
+    """Возвращает функцию обновления для ключа (или None)"""
+    return _refreshers.get(key)
+
+def _is_live_heap_entry(deadline: float, key: str) -> bool:
+    """Запись кучи актуальна, только если дедлайн ключа не менялся с момента push"""
+    return _cache_deadlines.get(key) == deadline
+
+def get_next_deadline():
+    """Возвращает ближайший актуальный дедлайн (epoch) или None"""
+    while _expiry_heap:
+        deadline, key = _expiry_heap[0]
+        if _is_live_heap_entry(deadline, key):
+            return deadline
+        heapq.heappop(_expiry_heap)
+    return None
+
+def pop_due_keys(now: float = None) -> list:
+    """Извлекает из кучи все ключи, дедлайн которых уже наступил"""
+    now = time.time() if now is None else now
+    due = []
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        deadline, key = heapq.heappop(_expiry_heap)
+        if _is_live_heap_entry(deadline, key) and key not in due:
+            due.append(key)
+    return due
+
+# 🔄 ДЕКОРАТОР КЭШИРОВАНИЯ ДЛЯ ВСЕХ ФЕТЧЕРОВ
+def _metrics_for(key: str) -> dict:
+    metrics = _cache_metrics.get(key)
+    if metrics is None:
+        metrics = _cache_metrics[key] = {
+            'hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'stale_served': 0,
+            'unchanged': 0,
+            'loads': 0,
+            'failures': 0,
+            'load_time_total': 0.0,
+            'last_load_ms': 0.0
+        }
+    return metrics
+
+def get_cache_metrics() -> dict:
+    """Возвращает метрики @cached по ключам (копия)"""
+    result = {}
+    for key, metrics in _cache_metrics.items():
+        item = dict(metrics)
+        item['avg_load_ms'] = (metrics['load_time_total'] / metrics['loads'] * 1000) if metrics['loads'] else 0.0
+        requests_total = metrics['hits'] + metrics['misses'] + metrics['negative_hits']
+        item['hit_rate'] = (metrics['hits'] / requests_total * 100) if requests_total else 0.0
+        result[key] = item
+    return result
+
+def _is_negative(key: str) -> bool:
+    until = _negative_until.get(key)
+    return until is not None and time.time() < until
+
+def _fallback_value(key: str, default, metrics):
+    """При неудаче отдаем последний хороший снимок, если он есть"""
+    snapshot = serve_snapshot(key)
+    if snapshot is None:
+        return default
+    metrics['stale_served'] += 1
+    logger.info(f"♻️ Источник недоступен, отдаем последний снимок {key}")
+    return snapshot
+
+def _previous_value(key: str):
+    """Последнее успешное значение ключа: из кэша (даже истекшего) или из снимка"""
+    value = _cache_data.get(key, _MISSING)
+    if value is _MISSING:
+        snapshot = get_snapshot(key)
+        if snapshot is not None:
+            value = snapshot['data']
+    return value
+
+def _store_result(key, result, ttl, negative_ttl, validate, source, metrics):
+    """Сохраняет успешный результат или ставит негативную запись.
+
+    Возвращает (успех, значение). Если данные не изменились, только продлеваем
+    свежесть и отдаем прежний объект: без записи снимка и без новых объектов,
+    чтобы потребители могли сравнивать результат по идентичности.
+    """
+    if result is not None and (validate is None or validate(result)):
+        _negative_until.pop(key, None)
+        previous = _previous_value(key)
+        if previous is not _MISSING and previous == result:
+            metrics['unchanged'] += 1
+            set_cache(key, previous, ttl)
+            confirm_snapshot(key)
+            logger.debug(f"🟰 Данные {key} не изменились - продлеваем свежесть")
+            return True, previous
+        set_cache(key, result, ttl)
+        save_snapshot(key, result, source)
+        return True, result
+
+    metrics['failures'] += 1
+    if negative_ttl:
+        _negative_until[key] = time.time() + negative_ttl
+    return False, None
+
+# 🖼️ ПОВТОРНАЯ ОТРИСОВКА ТОЛЬКО ПРИ СМЕНЕ ДАННЫХ
+# Ограничен LRU: имена с параметрами (списки отслеживания) не копятся бесконечно
+RENDER_MEMO_SIZE = 256
+_render_memo = OrderedDict()   # name -> (аргументы, устаревшие ключи, сообщение)
+_render_lock = threading.Lock()
+
+def render_cached(name: str, render, *args):
+    """Вызывает render(*args), только если данные изменились.
+
+    @cached отдает прежний объект, когда источник ответил теми же данными,
+    поэтому достаточно сравнить аргументы по идентичности. Смена пометки
+    устаревания (снимки) тоже требует перерисовки.
+    """
+    stale_keys = get_stale_keys()
+    with _render_lock:
+        memo = _render_memo.get(name)
+        if (memo and memo[1] == stale_keys and len(memo[0]) == len(args)
+                and all(old is new for old, new in zip(memo[0], args))):
+            _render_memo.move_to_end(name)
+            return memo[2]
+    message = render(*args)
+    # Отрисовка идет в пуле потоков - вытеснение под замком
+    with _render_lock:
+        _render_memo[name] = (args, stale_keys, message)
+        _render_memo.move_to_end(name)
+        while len(_render_memo) > RENDER_MEMO_SIZE:
+            _render_memo.popitem(last=False)
+    return message
+
+def cached(key, ttl: int = None, schedule: str = None, negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+           validate=None, default=None, source: str = None):
+    """Декоратор кэширования для sync и async фетчеров.
+
+    key          - строка ключа; может содержать поля аргументов: "ruonia_historical_{days}"
+    ttl          - TTL записи в секундах (по умолчанию берется из политики)
+    schedule     - имя политики TTL/расписания из init_cache (например 'currency_rates')
+    negative_ttl - сколько секунд не повторять неудачный запрос
+    validate     - функция, решающая, считать ли результат успешным (по умолчанию: не None)
+    default      - что вернуть при неудаче, если снимка нет
+    source       - источник данных (http_client.SOURCE_*) для пометки снимка
+
+    Каждый успешный результат сохраняется как снимок (snapshots.py); результат,
+    равный прежнему, только продлевает свежесть и возвращается прежним объектом. При неудаче
+    или негативном попадании отдается снимок с пометкой устаревания, иначе default.
+    Одновременные промахи по одному ключу выполняют один запрос (single-flight).
+    Исключения фетчера логируются и считаются неудачей.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        is_template = '{' in key
+
+        def resolve_key(args, kwargs) -> str:
+            if not is_template:
+                return key
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return key.format(**bound.arguments)
+
+        def register_policy(cache_key: str):
+            if schedule and cache_key not in _explicit_policies:
+                _explicit_policies[cache_key] = schedule
+                _policy_keys.pop(cache_key, None)
+
+        def cached_value(cache_key, metrics):
+            value = _lookup(cache_key)
+            if value is not _MISSING:
+                metrics['hits'] += 1
+                return value
+            if _is_negative(cache_key):
+                metrics['negative_hits'] += 1
+                return _fallback_value(cache_key, default, metrics)
+            return _MISSING
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key = resolve_key(args, kwargs)
+                register_policy(cache_key)
+                metrics = _metrics_for(cache_key)
+
+                value = cached_value(cache_key, metrics)
+                if value is not _MISSING:
+                    return value
+
+                task = _inflight_tasks.get(cache_key)
+                if task is None:
+                    metrics['misses'] += 1
+                    task = asyncio.ensure_future(_load_async(cache_key, args, kwargs, metrics))
+                    _inflight_tasks[cache_key] = task
+                    task.add_done_callback(lambda _: _inflight_tasks.pop(cache_key, None))
+                return await asyncio.shield(task)
+
+            async def _load_async(cache_key, args, kwargs, metrics):
+                started = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка загрузки {cache_key}: {e}")
+                    result = None
+                finally:
+                    _record_load(metrics, started)
+                ok, value = _store_result(cache_key, result, ttl, negative_ttl, validate, source, metrics)
+                return value if ok else _fallback_value(cache_key, default, metrics)
+
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                cache_key = resolve_key(args, kwargs)
+                register_policy(cache_key)
+                metrics = _metrics_for(cache_key)
+
+                value = cached_value(cache_key, metrics)
+                if value is not _MISSING:
+                    return value
+
+                with _inflight_guard:
+                    lock = _inflight_locks.setdefault(cache_key, threading.Lock())
+
+                with lock:
+                    # Пока ждали блокировку, значение мог загрузить другой поток
+                    value = cached_value(cache_key, metrics)
+                    if value is not _MISSING:
+                        return value
+
+                    metrics['misses'] += 1
+                    started = time.perf_counter()
+                    try:
+                        result = func(*args, **kwargs)
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка загрузки {cache_key}: {e}")
+                        result = None
+                    finally:
+                        _record_load(metrics, started)
+                    ok, value = _store_result(cache_key, result, ttl, negative_ttl, validate, source, metrics)
+                    return value if ok else _fallback_value(cache_key, default, metrics)
+
+            wrapper = sync_wrapper
+
+        wrapper.cache_key = key
+        # Функции с постоянным ключом обновляются таймером дедлайнов автоматически
+        if not is_template:
+            register_policy(key)
+            register_refresher(key, wrapper)
+        return wrapper
+
+    return decorator
+
+def _record_load(metrics: dict, started: float):
+    elapsed = time.perf_counter() - started
+    metrics['loads'] += 1
+    metrics['load_time_total'] += elapsed
+    metrics['last_load_ms'] = elapsed * 1000
@@ -0,0 +1,121 @@
+# cbr_calendar.py - календарь публикаций курсов ЦБ РФ
+from datetime import datetime, date, timedelta
+import pytz
+from config import (
+    logger, CBR_PUBLICATION_WINDOW, CBR_PUBLICATION_POLL_SECONDS, CBR_LATE_POLL_SECONDS,
+    CBR_EXTRA_HOLIDAYS, CBR_EXTRA_WORKDAYS
+)
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Нерабочие праздничные дни (ст. 112 ТК РФ): (месяц, день)
+NEW_YEAR_HOLIDAYS = [(1, day) for day in range(1, 9)]
+HOLIDAYS = [(2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4)]
+# Переносы выходных по постановлениям Правительства; новые годы - сюда или в CBR_EXTRA_HOLIDAYS
+TRANSFERRED_HOLIDAYS = {date(2026, 1, 9), date(2026, 12, 31)}
+
+def _parse_dates(value: str) -> set:
+    dates = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            dates.add(datetime.strptime(item, '%d.%m.%Y').date())
+        except ValueError:
+            logger.error(f"Неверная дата в календаре ЦБ РФ: {item}")
+    return dates
+
+def _parse_window(value: str):
+    start, end = value.split('-')
+    start_h, start_m = start.strip().split(':')
+    end_h, end_m = end.strip().split(':')
+    return (int(start_h), int(start_m)), (int(end_h), int(end_m))
+
+_extra_holidays = TRANSFERRED_HOLIDAYS | _parse_dates(CBR_EXTRA_HOLIDAYS)
+_extra_workdays = _parse_dates(CBR_EXTRA_WORKDAYS)
+_window_start, _window_end = _parse_window(CBR_PUBLICATION_WINDOW)
+_holidays_by_year = {}    # год -> множество нерабочих праздничных дней
+
+def _year_holidays(year: int) -> set:
+    """Праздники года с переносом выпавших на выходной на следующий рабочий день.
+
+    Новогодние выходные переносятся постановлением Правительства - они
+    в TRANSFERRED_HOLIDAYS и CBR_EXTRA_HOLIDAYS / CBR_EXTRA_WORKDAYS.
+    """
+    holidays = _holidays_by_year.get(year)
+    if holidays is not None:
+        return holidays
+
+    holidays = {date(year, month, day) for month, day in NEW_YEAR_HOLIDAYS}
+    for month, day in HOLIDAYS:
+        holiday = date(year, month, day)
+        holidays.add(holiday)
+        if holiday.weekday() >= 5:
+            moved = holiday + timedelta(days=7 - holiday.weekday())
+            while moved in holidays:
+                moved += timedelta(days=1)
+            holidays.add(moved)
+
+    _holidays_by_year[year] = holidays
+    return holidays
+
+def is_publication_day(day: date) -> bool:
+    """Устанавливает ли ЦБ РФ курсы в этот день (рабочий день в РФ)"""
+    if day in _extra_workdays:
+        return True
+    if day in _extra_holidays or day.weekday() >= 5:
+        return False
+    return day not in _year_holidays(day.year)
+
+def next_publication_day(day: date) -> date:
+    """Ближайший день публикации строго после day"""
+    day += timedelta(days=1)
+    while not is_publication_day(day):
+        day += timedelta(days=1)
+    return day
+
+def _local_epoch(day: date, hours: int, minutes: int) -> float:
+    return MOSCOW_TZ.localize(datetime(day.year, day.month, day.day, hours, minutes)).timestamp()
+
+def publication_window(day: date):
+    """Окно ожидания публикации (начало, конец) в epoch"""
+    return _local_epoch(day, *_window_start), _local_epoch(day, *_window_end)
+
+def next_rates_check(timestamp: float, tomorrow_published: bool):
+    """Когда в следующий раз имеет смысл спрашивать ЦБ РФ о курсах: (epoch, причина).
+
+    - в полночь по Москве меняется «сегодня», так что раньше нее - всегда;
+    - в день публикации, пока курсов на завтра нет: до окна ждем его начала,
+      в окне опрашиваем каждые CBR_PUBLICATION_POLL_SECONDS, после окна - реже;
+    - курсы на завтра уже есть или день нерабочий - до полуночи не спрашиваем.
+      В нерабочий день одна контрольная проверка в конце окна - на случай
+      неучтенного переноса выходных.
+    """
+    now_local = datetime.fromtimestamp(timestamp, MOSCOW_TZ)
+    day = now_local.date()
+    midnight = _local_epoch(day + timedelta(days=1), 0, 0)
+    start, end = publication_window(day)
+
+    if tomorrow_published:
+        return midnight, 'calendar:published'
+
+    if not is_publication_day(day):
+        if timestamp < end:
+            return end, 'calendar:holiday_check'
+        return midnight, 'calendar:holiday'
+
+    if timestamp < start:
+        return start, 'calendar:window'
+    if timestamp < end:
+        return min(timestamp + CBR_PUBLICATION_POLL_SECONDS, midnight), 'calendar:poll'
+    return min(timestamp + CBR_LATE_POLL_SECONDS, midnight), 'calendar:late'
+
+def describe_today(now: float = None) -> str:
+    """Строка о сегодняшнем дне для админ-команд"""
+    now_local = datetime.fromtimestamp(now, MOSCOW_TZ) if now else datetime.now(MOSCOW_TZ)
+    day = now_local.date()
+    window = f"{_window_start[0]:02d}:{_window_start[1]:02d}-{_window_end[0]:02d}:{_window_end[1]:02d}"
+    if is_publication_day(day):
+        return f"день публикации, окно {window} МСК"
+    return f"нерабочий день, следующая публикация {next_publication_day(day).strftime('%d.%m.%Y')}"
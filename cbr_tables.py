@@ -0,0 +1,53 @@
+# cbr_tables.py - таблицы hd_base ЦБ РФ (ключевая ставка, RUONIA): загрузка с зеркал и разбор
+from functools import partial
+from config import logger, CBR_MIRRORS
+from http_client import http_get, mirror_breaker, SOURCE_CBR
+from hedging import hedged_call
+from parsers import parse_rate_table
+
+TABLE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Referer': 'https://www.cbr.ru/',
+}
+
+def _fetch_table_page_from(base_url: str, path: str, date_from: str, date_to: str):
+    """Загружает страницу таблицы за диапазон дат с одного зеркала ЦБ РФ"""
+    url = f"{base_url}{path}"
+    params = {
+        'UniDbQuery.Posted': 'True',
+        'UniDbQuery.From': date_from,
+        'UniDbQuery.To': date_to,
+    }
+
+    logger.info(f"Запрос к URL: {url} ({date_from} - {date_to})")
+    response = http_get(SOURCE_CBR, url, breaker_name=mirror_breaker(SOURCE_CBR, base_url), conditional=True,
+                        params=params, headers=TABLE_HEADERS, timeout=15)
+
+    if response.status_code == 403:
+        logger.error(f"Доступ запрещен (403) при загрузке {path} с {base_url}")
+        return None
+    elif response.status_code != 200:
+        logger.error(f"Ошибка HTTP {response.status_code} при загрузке {path} с {base_url}")
+        return None
+    return response.content
+
+def _fetch_table_rows_from(base_url: str, path: str, date_from: str, date_to: str, parse_options: dict):
+    """Загрузка и разбор в одном потоке пула: страница не разбирается в вызывающем потоке"""
+    content = _fetch_table_page_from(base_url, path, date_from, date_to)
+    if content is None:
+        return None
+    return parse_rate_table(content, **parse_options)
+
+def fetch_table_rows(path: str, date_from, date_to, name: str, **parse_options):
+    """Строки таблицы [(дата, ставка)] за диапазон дат, подстраховываясь зеркалами.
+
+    parse_options уходят в parse_rate_table (min_rate, max_rate, until).
+    """
+    date_from, date_to = date_from.strftime('%d.%m.%Y'), date_to.strftime('%d.%m.%Y')
+    attempts = [
+        (base_url, partial(_fetch_table_rows_from, base_url, path, date_from, date_to, parse_options))
+        for base_url in CBR_MIRRORS
+    ]
+    return hedged_call(attempts, name=name)
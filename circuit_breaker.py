@@ -0,0 +1,133 @@
+# circuit_breaker.py - размыкатели цепи для внешних источников данных
+import threading
+import time
+from collections import deque
+from config import (
+    logger, CIRCUIT_BREAKER_WINDOW, CIRCUIT_BREAKER_MIN_CALLS,
+    CIRCUIT_BREAKER_FAILURE_RATE, CIRCUIT_BREAKER_OPEN_SECONDS
+)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+STATE_LABELS = {
+    STATE_CLOSED: '🟢 замкнута',
+    STATE_OPEN: '🔴 разомкнута',
+    STATE_HALF_OPEN: '🟡 пробный запрос',
+}
+
+class CircuitBreaker:
+    """Размыкатель цепи для одного источника.
+
+    closed    - запросы идут, результаты пишутся в скользящее окно;
+    open      - доля ошибок превысила порог, запросы сразу отклоняются;
+    half_open - после паузы пропускаем один пробный запрос:
+                успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, name: str, window: int = CIRCUIT_BREAKER_WINDOW,
+                 min_calls: int = CIRCUIT_BREAKER_MIN_CALLS,
+                 failure_rate: float = CIRCUIT_BREAKER_FAILURE_RATE,
+                 open_seconds: int = CIRCUIT_BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._results = deque(maxlen=window)   # True - успех, False - ошибка
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == STATE_OPEN and time.time() - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"🟡 Источник {self.name}: пробуем пробный запрос")
+
+    def allow_request(self) -> bool:
+        """Можно ли сейчас обращаться к источнику"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.info(f"🟢 Источник {self.name} восстановлен, цепь замкнута")
+                self._results.clear()
+            self._state = STATE_CLOSED
+            self._probe_in_flight = False
+            self._results.append(True)
+
+    def record_failure(self, error: str = None):
+        with self._lock:
+            self._last_error = error
+            self._results.append(False)
+
+            if self._state == STATE_HALF_OPEN:
+                self._open()
+                return
+
+            if self._state == STATE_CLOSED and len(self._results) >= self.min_calls:
+                failures = self._results.count(False)
+                if failures / len(self._results) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.time()
+        self._probe_in_flight = False
+        logger.warning(
+            f"🔴 Источник {self.name} недоступен, цепь разомкнута на {self.open_seconds} сек. "
+            f"(последняя ошибка: {self._last_error})"
+        )
+
+    def get_status(self) -> dict:
+        """Снимок состояния для /status"""
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._results)
+            failures = self._results.count(False)
+            retry_in = 0
+            if self._state == STATE_OPEN:
+                retry_in = max(0, int(self._opened_at + self.open_seconds - time.time()))
+            return {
+                'state': self._state,
+                'failure_rate': (failures / total * 100) if total else 0.0,
+                'calls_in_window': total,
+                'rejected': self._rejected,
+                'retry_in': retry_in,
+                'last_error': self._last_error
+            }
+
+# Реестр размыкателей по источникам
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(source: str) -> CircuitBreaker:
+    """Возвращает (создает при необходимости) размыкатель источника"""
+    breaker = _breakers.get(source)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(source, CircuitBreaker(source))
+    return breaker
+
+def get_breakers_status() -> dict:
+    """Состояние всех размыкателей"""
+    return {source: breaker.get_status() for source, breaker in sorted(_breakers.items())}
@@ -3,14 +3,24 @@ import os
 import logging
 import sys
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
+from logging_setup import setup_logging
+
+# Настройка логирования: запись в stdout и файл - в отдельном потоке через очередь
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')                                  # text | json
+# Уровни по модулям бота и логгерам библиотек: 'api_crypto=WARNING,httpx=WARNING'
+LOG_LEVELS = os.getenv('LOG_LEVELS', 'httpx=WARNING,apscheduler=WARNING,aiohttp.access=WARNING')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))         # Ротация по размеру
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '3'))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '20'))                   # Записей с одной строки кода за окно; 0 - без сэмплирования
+LOG_SAMPLE_WINDOW = float(os.getenv('LOG_SAMPLE_WINDOW', '60'))
+LOG_SEARCH_MAX_BYTES = int(os.getenv('LOG_SEARCH_MAX_BYTES', str(64 * 1024 * 1024)))  # Предел просмотра для /logs с фильтрами
+
+setup_logging(
+    LOG_FILE, level=LOG_LEVEL, fmt=LOG_FORMAT, levels=LOG_LEVELS,
+    max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT,
+    sample_burst=LOG_SAMPLE_BURST, sample_window=LOG_SAMPLE_WINDOW
 )
 logger = logging.getLogger(__name__)
 
@@ -24,7 +34,7 @@ DEEPSEEK_API_KEY = os.getenv('TG_BOT_APIDEEPSEEK')
 # API ключ погоды
 WEATHER_API_KEY = os.getenv('API_weather')
 if not WEATHER_API_KEY:
-    logger.warning("API ключ погоды не найден, будут использоваться демо-данные")
+    logger.warning("API ключ погоды не найден, погода будет недоступна")
 
 # API ключ CoinGecko
 COINGECKO_API_KEY = os.getenv('Fin_bot_coingecko')
@@ -47,6 +57,9 @@ else:
 
 # API URLs
 CBR_API_BASE = "https://www.cbr.ru/"
+
+# Зеркала сайта ЦБ РФ для параллельных (hedged) запросов, первое - основное
+CBR_MIRRORS = [url.strip() for url in os.getenv('CBR_MIRRORS', 'https://www.cbr.ru/,https://cbr.ru/').split(',') if url.strip()]
 COINGECKO_API_BASE = "https://api.coingecko.com/api/v3"
 DEEPSEEK_API_BASE = "https://api.deepseek.com/v1/"
 OPENWEATHER_API_BASE = "http://api.openweathermap.org/data/2.5/"
@@ -60,4 +73,84 @@ WEATHER_CITY = "Moscow"
 # Настройки бота - ВЕРСИЯ И ОБНОВЛЕНИЯ
 BOT_VERSION = "1.1.0"
 BOT_LAST_UPDATE = "Ноябрь 2025"
-BOT_CREATION_DATE = "Октябрь 2025"
\ No newline at end of file
+BOT_CREATION_DATE = "Октябрь 2025"
+
+# Настройки защиты от недоступных источников (circuit breaker)
+CIRCUIT_BREAKER_WINDOW = 20              # Сколько последних запросов учитываем
+CIRCUIT_BREAKER_MIN_CALLS = 4            # Минимум запросов для оценки доли ошибок
+CIRCUIT_BREAKER_FAILURE_RATE = 0.5       # Доля ошибок, при которой размыкаем цепь
+CIRCUIT_BREAKER_OPEN_SECONDS = 60        # Сколько держим цепь разомкнутой до пробного запроса
+NEGATIVE_CACHE_TTL = 30                  # Сколько секунд не повторяем неудачный запрос
+
+# Через сколько секунд без ответа запускаем запасной запрос (hedging)
+HEDGE_DELAY_SECONDS = 1.5
+
+# Пулы исполнителей для загрузки, разбора и отрисовки вне event loop
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '4'))             # Потоки: сеть и lxml (отпускает GIL)
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '0'))         # Процессы для чистого Python; 0 - потоки
+WORKER_QUEUE_LIMIT = int(os.getenv('WORKER_QUEUE_LIMIT', '32'))    # Сколько задач может ждать свободного исполнителя
+WORKER_TIMEOUT_SECONDS = float(os.getenv('WORKER_TIMEOUT_SECONDS', '30'))
+
+# Календарь публикаций ЦБ РФ: окно, в котором ждем курсы на завтра (МСК)
+CBR_PUBLICATION_WINDOW = os.getenv('CBR_PUBLICATION_WINDOW', '11:00-16:30')
+CBR_PUBLICATION_POLL_SECONDS = int(os.getenv('CBR_PUBLICATION_POLL_SECONDS', '300'))  # Частота опроса в окне
+CBR_LATE_POLL_SECONDS = int(os.getenv('CBR_LATE_POLL_SECONDS', '1800'))               # Если публикация задержалась
+# Переносы выходных сверх известных cbr_calendar.TRANSFERRED_HOLIDAYS (дд.мм.гггг через запятую),
+# например CBR_EXTRA_HOLIDAYS=09.01.2027, пока перенос не добавлен в код
+CBR_EXTRA_HOLIDAYS = os.getenv('CBR_EXTRA_HOLIDAYS', '')
+CBR_EXTRA_WORKDAYS = os.getenv('CBR_EXTRA_WORKDAYS', '')
+
+# Криптовалюты: допустимые монеты (id CoinGecko через запятую) и показываемые по умолчанию
+CRYPTO_UNIVERSE = [coin.strip() for coin in os.getenv(
+    'CRYPTO_UNIVERSE',
+    'bitcoin,ethereum,binancecoin,ripple,cardano,solana,polkadot,dogecoin,tron,litecoin,'
+    'the-open-network,avalanche-2,chainlink,shiba-inu,stellar,monero,bitcoin-cash,near,uniswap,tether'
+).split(',') if coin.strip()]
+CRYPTO_DEFAULT_COINS = [coin.strip() for coin in os.getenv(
+    'CRYPTO_DEFAULT_COINS',
+    'bitcoin,ethereum,binancecoin,ripple,cardano,solana,polkadot,dogecoin,tron,litecoin'
+).split(',') if coin.strip()]
+CRYPTO_PRICE_BATCH_SIZE = int(os.getenv('CRYPTO_PRICE_BATCH_SIZE', '100'))   # id в одном запросе /simple/price
+CRYPTO_WATCHLIST_LIMIT = int(os.getenv('CRYPTO_WATCHLIST_LIMIT', '15'))      # Монет в списке одного пользователя
+
+# Частый опрос CoinGecko для уведомлений по криптовалютам
+CRYPTO_ALERT_POLL_SECONDS = int(os.getenv('CRYPTO_ALERT_POLL_SECONDS', '60'))          # Минимальный интервал
+CRYPTO_ALERT_POLL_MAX_SECONDS = int(os.getenv('CRYPTO_ALERT_POLL_MAX_SECONDS', '900'))  # Потолок при нехватке квоты
+CRYPTO_ALERT_INDEX_REFRESH_SECONDS = int(os.getenv('CRYPTO_ALERT_INDEX_REFRESH_SECONDS', '300'))
+# Квота CoinGecko: без ключа - публичный лимит в минуту, с Demo-ключом - еще и месячный (0 - без ограничения)
+COINGECKO_MINUTE_CALLS = int(os.getenv('COINGECKO_MINUTE_CALLS', '30' if COINGECKO_API_KEY else '5'))
+COINGECKO_MONTHLY_CALLS = int(os.getenv('COINGECKO_MONTHLY_CALLS', '10000' if COINGECKO_API_KEY else '0'))
+CRYPTO_ALERT_QUOTA_SHARE = float(os.getenv('CRYPTO_ALERT_QUOTA_SHARE', '0.8'))           # Доля квоты на опрос
+
+# Ответы ИИ: потоковая выдача с постепенным редактированием сообщения
+AI_STREAMING = os.getenv('AI_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+AI_STREAM_EDIT_INTERVAL = float(os.getenv('AI_STREAM_EDIT_INTERVAL', '1.0'))   # Не чаще одной правки в секунду
+AI_STREAM_IDLE_TIMEOUT = float(os.getenv('AI_STREAM_IDLE_TIMEOUT', '60'))      # Пауза между фрагментами ответа
+
+# Кэш ответов ИИ: одинаковые вопросы не отправляем в DeepSeek повторно
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '500'))           # Ответов в памяти (LRU)
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600)))              # Вопросы вне времени
+AI_CACHE_VOLATILE_TTL = int(os.getenv('AI_CACHE_VOLATILE_TTL', '3600'))        # Курсы, ставки, цены, новости
+AI_CACHE_MAX_PROMPT_CHARS = int(os.getenv('AI_CACHE_MAX_PROMPT_CHARS', '500'))  # Длинные вопросы не повторяются
+AI_CACHE_PERSIST = os.getenv('AI_CACHE_PERSIST', 'true').lower() in ('1', 'true', 'yes')  # Копия в PostgreSQL
+
+# Планировщик запросов к ИИ
+AI_MAX_CONCURRENT = int(os.getenv('AI_MAX_CONCURRENT', '4'))           # Одновременных запросов на весь бот
+AI_USER_PENDING_LIMIT = int(os.getenv('AI_USER_PENDING_LIMIT', '1'))   # Вопросов в ожидании у одного пользователя
+
+# Память диалога с ИИ
+AI_CONTEXT_TOKEN_LIMIT = int(os.getenv('AI_CONTEXT_TOKEN_LIMIT', '3000'))   # Потолок запроса: промпт, история, вопрос
+AI_SUMMARY_TOKEN_LIMIT = int(os.getenv('AI_SUMMARY_TOKEN_LIMIT', '300'))    # Сводка вытесненных реплик
+AI_MEMORY_IDLE_SECONDS = int(os.getenv('AI_MEMORY_IDLE_SECONDS', '3600'))   # Пауза, после которой разговор начинается заново
+
+# Фоновая проверка внешних сервисов (/start, /status и /health читают снимок)
+HEALTH_PROBE_SECONDS = int(os.getenv('HEALTH_PROBE_SECONDS', '120'))    # Интервал проверок
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '10'))   # Таймаут одной проверки
+HEALTH_HISTORY_SIZE = int(os.getenv('HEALTH_HISTORY_SIZE', '30'))       # Последних проверок в истории задержек
+
+# Ограничение частоты запросов пользователей: класс=запросов/секунд (емкость ведра и период пополнения)
+FLOOD_CONTROL = os.getenv('FLOOD_CONTROL', 'true').lower() in ('1', 'true', 'yes')
+FLOOD_USER_LIMITS = os.getenv('FLOOD_USER_LIMITS', 'menu=20/10,data=5/30,ai=3/60')   # На одного пользователя
+FLOOD_GLOBAL_LIMITS = os.getenv('FLOOD_GLOBAL_LIMITS', 'data=30/10,ai=10/10')        # На весь бот
+FLOOD_DUPLICATE_WINDOW = float(os.getenv('FLOOD_DUPLICATE_WINDOW', '2'))             # Повтор того же нажатия склеивается
+FLOOD_NOTICE_INTERVAL = float(os.getenv('FLOOD_NOTICE_INTERVAL', '10'))              # Не чаще одного предупреждения
@@ -0,0 +1,8 @@
+# conftest.py - окружение для тестов: config читает переменные при импорте
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'test')
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/test')
+# Лог тестов - не в bot.log рабочего каталога
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'fin_bot_tests.log'))
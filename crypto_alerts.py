@@ -0,0 +1,172 @@
+# crypto_alerts.py - частый опрос цен для уведомлений по криптовалютам
+import time
+from datetime import datetime, timezone
+from telegram.ext import ContextTypes
+from config import (
+    logger, CRYPTO_ALERT_POLL_SECONDS, CRYPTO_ALERT_POLL_MAX_SECONDS, CRYPTO_ALERT_INDEX_REFRESH_SECONDS,
+    COINGECKO_MINUTE_CALLS, COINGECKO_MONTHLY_CALLS, CRYPTO_ALERT_QUOTA_SHARE
+)
+from db import get_all_active_alerts
+from alert_index import ThresholdIndex
+from crypto_universe import is_coin, make_batches
+from api_crypto import fetch_alert_prices, get_quota_usage
+from notifications import deliver_triggered_alerts, alert_to_dict
+from rolling import window_values, sync_windows
+from timeseries import record, latest, crypto_series
+from workers import run_io
+
+# 🔄 ИНДЕКС ПОРОГОВ И СОСТОЯНИЕ ОПРОСА
+# Индекс перечитывается из БД при создании уведомления (dirty) и раз в
+# CRYPTO_ALERT_INDEX_REFRESH_SECONDS - между ними тик не ходит в БД
+_index = ThresholdIndex()
+_state = {
+    'dirty': True,
+    'loaded_at': 0.0,
+    'interval': CRYPTO_ALERT_POLL_SECONDS,
+    'reason': 'start',
+    'backoff': 0.0,
+    'polls': 0,
+    'skipped': 0,
+    'triggered': 0,
+    'last_poll': 0.0,
+    'prices': {},          # пара -> последняя цена опроса
+}
+
+def invalidate_crypto_alerts():
+    """Уведомления изменились - перечитать индекс на ближайшем тике"""
+    _state['dirty'] = True
+
+def get_alert_price(pair: str):
+    """Последняя цена пары из опроса (для показа в списке уведомлений)"""
+    return _state['prices'].get(pair)
+
+async def _refresh_index():
+    global _index
+    alerts = [alert_to_dict(alert) for alert in await get_all_active_alerts() if is_coin(alert['from_currency'])]
+    _index = ThresholdIndex(alerts)
+    sync_windows(_index.windows, crypto=True)
+    _state['dirty'] = False
+    _state['loaded_at'] = time.time()
+    logger.debug(f"🔔 Индекс уведомлений по криптовалютам: {len(_index)} уведомлений, пар: {len(_index.pairs())}")
+
+def _month_seconds_left(now: float) -> float:
+    moment = datetime.fromtimestamp(now, timezone.utc)
+    if moment.month == 12:
+        month_end = datetime(moment.year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        month_end = datetime(moment.year, moment.month + 1, 1, tzinfo=timezone.utc)
+    return month_end.timestamp() - now
+
+def next_poll_interval(now: float, calls_per_poll: int, usage: dict):
+    """Интервал до следующего опроса по квоте CoinGecko: (секунды, причина).
+
+    - не чаще CRYPTO_ALERT_POLL_SECONDS;
+    - минутный лимит: опросу достается CRYPTO_ALERT_QUOTA_SHARE от него;
+    - месячный лимит (Demo-ключ): остаток квоты растягивается до конца месяца;
+    - после 429 интервал удваивается и плавно возвращается к норме.
+    """
+    interval, reason = float(CRYPTO_ALERT_POLL_SECONDS), 'base'
+    calls_per_poll = max(calls_per_poll, 1)
+
+    if COINGECKO_MINUTE_CALLS:
+        minute_spacing = 60.0 * calls_per_poll / max(COINGECKO_MINUTE_CALLS * CRYPTO_ALERT_QUOTA_SHARE, 1)
+        if minute_spacing > interval:
+            interval, reason = minute_spacing, 'minute_quota'
+
+    if COINGECKO_MONTHLY_CALLS:
+        budget = COINGECKO_MONTHLY_CALLS * CRYPTO_ALERT_QUOTA_SHARE - usage['month_calls']
+        monthly_spacing = (_month_seconds_left(now) * calls_per_poll / budget) if budget > 0 else float('inf')
+        if monthly_spacing > interval:
+            interval, reason = monthly_spacing, 'monthly_quota'
+
+    if usage['throttled_at'] and usage['throttled_at'] >= _state['last_poll']:
+        _state['backoff'] = min(max(_state['backoff'] * 2, interval * 2), CRYPTO_ALERT_POLL_MAX_SECONDS)
+    else:
+        _state['backoff'] = _state['backoff'] / 2 if _state['backoff'] > interval else 0.0
+    if _state['backoff'] > interval:
+        interval, reason = _state['backoff'], 'backoff_429'
+
+    return min(interval, CRYPTO_ALERT_POLL_MAX_SECONDS), reason
+
+def _record_prices(prices: dict, updated: dict):
+    """Пишет цены в ряды, только если CoinGecko обновил монету после прошлой точки"""
+    for pair, price in prices.items():
+        coin_id, quote = pair.split('/')
+        moment = updated.get(coin_id)
+        if not moment or quote not in ('USD', 'RUB'):
+            continue
+        series = crypto_series(coin_id, quote.lower())
+        last = latest(series)
+        if last is None or moment > last[0]:
+            record(series, price, moment)
+
+async def poll_crypto_alerts(context: ContextTypes.DEFAULT_TYPE):
+    """Тик опроса: один пакетный запрос цен монет с активными уведомлениями"""
+    calls_per_poll = 0
+    try:
+        now = time.time()
+        if _state['dirty'] or now - _state['loaded_at'] >= CRYPTO_ALERT_INDEX_REFRESH_SECONDS:
+            await _refresh_index()
+
+        pairs = {tuple(pair.split('/')) for pair in _index.pairs()}
+        if not pairs:
+            _state['prices'] = {}
+            return
+
+        calls_per_poll = len(make_batches(sorted({coin_id for coin_id, _ in pairs})))
+        usage = get_quota_usage()
+        if COINGECKO_MINUTE_CALLS and usage['minute_calls'] + calls_per_poll > COINGECKO_MINUTE_CALLS:
+            # Квоту минуты уже выбрали другие запросы - пропускаем тик, а не ловим 429
+            _state['skipped'] += 1
+            return
+
+        _state['last_poll'] = now
+        result = await run_io(fetch_alert_prices, pairs, stage="crypto_alert_poll")
+        _state['polls'] += 1
+        if not result:
+            return
+
+        prices, updated = result
+        _state['prices'] = prices
+        # Новые точки попадают в скользящие окна через подписку на ряды
+        _record_prices(prices, updated)
+
+        values = dict(prices)
+        if _index.windows:
+            values.update(window_values(_index.windows))
+        triggered = _index.match(values)
+        if triggered:
+            delivered = await deliver_triggered_alerts(context, triggered)
+            _index.discard(delivered)
+            _state['triggered'] += len(delivered)
+            logger.info(f"🔔 Сработало уведомлений по криптовалютам: {len(delivered)}")
+
+    except Exception as e:
+        logger.error(f"Ошибка опроса цен для уведомлений по криптовалютам: {e}")
+    finally:
+        schedule_crypto_poller(context.job_queue, calls_per_poll)
+
+def schedule_crypto_poller(job_queue, calls_per_poll: int = 0):
+    """Ставит следующий тик опроса с интервалом по квоте"""
+    if calls_per_poll:
+        interval, reason = next_poll_interval(time.time(), calls_per_poll, get_quota_usage())
+    else:
+        # Уведомлений нет - запросов к CoinGecko тоже, только проверка индекса
+        interval, reason = CRYPTO_ALERT_POLL_SECONDS, 'idle'
+    _state['interval'], _state['reason'] = interval, reason
+    job_queue.run_once(poll_crypto_alerts, when=interval, name="crypto_alert_poller")
+
+def get_poller_stats() -> dict:
+    """Для админ-команд"""
+    usage = get_quota_usage()
+    return {
+        'alerts': len(_index),
+        'pairs': len(_index.pairs()),
+        'interval': _state['interval'],
+        'reason': _state['reason'],
+        'polls': _state['polls'],
+        'skipped': _state['skipped'],
+        'triggered': _state['triggered'],
+        'minute_calls': usage['minute_calls'],
+        'month_calls': usage['month_calls'],
+    }
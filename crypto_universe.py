@@ -0,0 +1,131 @@
+# crypto_universe.py - допустимые криптовалюты и списки отслеживания пользователей
+from config import logger, CRYPTO_UNIVERSE, CRYPTO_DEFAULT_COINS, CRYPTO_PRICE_BATCH_SIZE, CRYPTO_WATCHLIST_LIMIT
+
+# Названия и тикеры известных монет: id CoinGecko -> (тикер, название)
+COIN_INFO = {
+    'bitcoin': ('BTC', 'Bitcoin'),
+    'ethereum': ('ETH', 'Ethereum'),
+    'binancecoin': ('BNB', 'Binance Coin'),
+    'ripple': ('XRP', 'XRP'),
+    'cardano': ('ADA', 'Cardano'),
+    'solana': ('SOL', 'Solana'),
+    'polkadot': ('DOT', 'Polkadot'),
+    'dogecoin': ('DOGE', 'Dogecoin'),
+    'tron': ('TRX', 'TRON'),
+    'litecoin': ('LTC', 'Litecoin'),
+    'the-open-network': ('TON', 'Toncoin'),
+    'avalanche-2': ('AVAX', 'Avalanche'),
+    'chainlink': ('LINK', 'Chainlink'),
+    'shiba-inu': ('SHIB', 'Shiba Inu'),
+    'stellar': ('XLM', 'Stellar'),
+    'monero': ('XMR', 'Monero'),
+    'bitcoin-cash': ('BCH', 'Bitcoin Cash'),
+    'near': ('NEAR', 'NEAR Protocol'),
+    'uniswap': ('UNI', 'Uniswap'),
+    'tether': ('USDT', 'Tether'),
+}
+
+def coin_info(coin_id: str) -> dict:
+    """Тикер и название монеты; для монет вне справочника - по id"""
+    symbol, name = COIN_INFO.get(coin_id, (coin_id.split('-')[0][:5].upper(), coin_id.replace('-', ' ').title()))
+    return {'symbol': symbol, 'name': name}
+
+# Порядок вселенной сохраняем - в нем монеты показываются
+UNIVERSE = tuple(dict.fromkeys(CRYPTO_UNIVERSE + CRYPTO_DEFAULT_COINS))
+DEFAULT_COINS = tuple(coin for coin in CRYPTO_DEFAULT_COINS if coin in UNIVERSE)
+_by_symbol = {coin_info(coin_id)['symbol']: coin_id for coin_id in UNIVERSE}
+
+def is_coin(code: str) -> bool:
+    """Криптовалюта (id CoinGecko), а не код валюты ЦБ РФ"""
+    return code in UNIVERSE
+
+def resolve_coin(text: str):
+    """id CoinGecko по тикеру или id ('btc', 'BTC', 'bitcoin'); None - вне вселенной"""
+    text = text.strip()
+    if text.lower() in UNIVERSE:
+        return text.lower()
+    return _by_symbol.get(text.upper())
+
+# 🔄 СПИСКИ ОТСЛЕЖИВАНИЯ В ПАМЯТИ: user_id -> frozenset(coin_id)
+# frozenset заменяется целиком при изменении - по идентичности видно, что список тот же
+_watchlists = {}
+_watch_counts = {}        # coin_id -> сколько пользователей отслеживают
+
+def _set_watchlist(user_id: int, coins: frozenset):
+    old = _watchlists.get(user_id, frozenset())
+    for coin_id in old - coins:
+        _watch_counts[coin_id] -= 1
+        if not _watch_counts[coin_id]:
+            del _watch_counts[coin_id]
+    for coin_id in coins - old:
+        _watch_counts[coin_id] = _watch_counts.get(coin_id, 0) + 1
+    if coins:
+        _watchlists[user_id] = coins
+    else:
+        _watchlists.pop(user_id, None)
+
+async def load_watchlists():
+    """Поднимает списки отслеживания из БД при запуске"""
+    from db import get_all_watchlists
+
+    rows = await get_all_watchlists()
+    by_user = {}
+    for user_id, coin_id in rows:
+        if coin_id in UNIVERSE:
+            by_user.setdefault(user_id, set()).add(coin_id)
+    for user_id, coins in by_user.items():
+        _set_watchlist(user_id, frozenset(coins))
+    logger.info(f"₿ Загружено списков отслеживания: {len(by_user)}, уникальных монет: {len(_watch_counts)}")
+
+def get_watchlist(user_id: int) -> frozenset:
+    return _watchlists.get(user_id, frozenset())
+
+async def watch_coins(user_id: int, coin_ids: list):
+    """Добавляет монеты в список: (добавленные, список после). None - превышен лимит"""
+    from db import add_watchlist_coins
+
+    current = get_watchlist(user_id)
+    added = [coin_id for coin_id in dict.fromkeys(coin_ids) if coin_id not in current]
+    if len(current) + len(added) > CRYPTO_WATCHLIST_LIMIT:
+        return None
+    if added:
+        if not await add_watchlist_coins(user_id, added):
+            raise RuntimeError("не удалось сохранить список отслеживания")
+        _set_watchlist(user_id, current | frozenset(added))
+    return added, get_watchlist(user_id)
+
+async def unwatch_coins(user_id: int, coin_ids: list):
+    """Удаляет монеты из списка: (удаленные, список после)"""
+    from db import remove_watchlist_coins
+
+    current = get_watchlist(user_id)
+    removed = [coin_id for coin_id in dict.fromkeys(coin_ids) if coin_id in current]
+    if removed:
+        if not await remove_watchlist_coins(user_id, removed):
+            raise RuntimeError("не удалось сохранить список отслеживания")
+        _set_watchlist(user_id, current - frozenset(removed))
+    return removed, get_watchlist(user_id)
+
+def get_tracked_coins() -> list:
+    """Что запрашивать у CoinGecko: монеты по умолчанию и объединение всех списков.
+
+    Стоимость обновления зависит от числа уникальных монет, а не пользователей.
+    """
+    tracked = set(DEFAULT_COINS) | set(_watch_counts)
+    return [coin_id for coin_id in UNIVERSE if coin_id in tracked]
+
+def make_batches(coin_ids: list, batch_size: int = CRYPTO_PRICE_BATCH_SIZE) -> list:
+    """Делит монеты на минимальное число запросов /simple/price"""
+    batch_size = max(batch_size, 1)
+    return [coin_ids[i:i + batch_size] for i in range(0, len(coin_ids), batch_size)]
+
+def get_watch_stats() -> dict:
+    """Для админ-команд"""
+    tracked = get_tracked_coins()
+    return {
+        'users': len(_watchlists),
+        'watched_coins': len(_watch_counts),
+        'tracked_coins': len(tracked),
+        'batches': len(make_batches(tracked)),
+        'top': sorted(_watch_counts.items(), key=lambda item: -item[1])[:5],
+    }
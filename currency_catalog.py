@@ -0,0 +1,97 @@
+# currency_catalog.py - полный справочник валют ЦБ РФ и матрица кросс-курсов
+import threading
+from array import array
+from config import logger
+
+# NumPy необязателен: с ним матрица строится векторно, без него - на array('d')
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BASE_CURRENCY = 'RUB'
+BASE_CURRENCY_NAME = 'Российский рубль'
+
+# Сколько последних документов держим (сегодня, завтра и запас на переход через полночь)
+MAX_TABLES = 4
+
+class CurrencyTable:
+    """Все валюты одного документа ЦБ РФ в компактных массивах + матрица кросс-курсов.
+
+    Индекс 0 - рубль. values[i] - рублей за 1 единицу валюты i.
+    Матрица считается один раз при построении: cross(i, j) - единиц j за 1 единицу i.
+    """
+
+    def __init__(self, doc_date, rates: dict):
+        codes = [BASE_CURRENCY] + sorted(rates)
+        self.doc_date = doc_date
+        self.codes = tuple(codes)
+        self.index = {code: i for i, code in enumerate(codes)}
+        self.names = tuple([BASE_CURRENCY_NAME] + [rates[code]['name'] for code in codes[1:]])
+        self.nominals = array('i', [1] + [rates[code]['nominal'] for code in codes[1:]])
+        self.values = array('d', [1.0] + [rates[code]['value'] for code in codes[1:]])
+        self.size = len(codes)
+        self._build_matrix()
+
+    def _build_matrix(self):
+        if np is not None:
+            values = np.frombuffer(self.values, dtype=np.float64)
+            self._matrix = np.outer(values, 1.0 / values)
+            self.vectorized = True
+            return
+
+        # Плоский массив N×N: строка i - курсы валюты i ко всем остальным
+        size = self.size
+        inverse = [1.0 / value for value in self.values]
+        flat = array('d', bytes(8 * size * size))
+        for i, value in enumerate(self.values):
+            row = i * size
+            for j in range(size):
+                flat[row + j] = value * inverse[j]
+        self._matrix = flat
+        self.vectorized = False
+
+    def cross(self, from_code: str, to_code: str):
+        """Единиц to_code за 1 единицу from_code или None, если валюты нет"""
+        i = self.index.get(from_code)
+        j = self.index.get(to_code)
+        if i is None or j is None:
+            return None
+        if self.vectorized:
+            return float(self._matrix[i, j])
+        return self._matrix[i * self.size + j]
+
+    def name(self, code: str) -> str:
+        i = self.index.get(code)
+        return self.names[i] if i is not None else code
+
+# 🔄 ТАБЛИЦЫ ПО ДАТАМ ДОКУМЕНТОВ
+_tables = {}
+_lock = threading.Lock()
+
+def update_catalog(doc_date, rates: dict):
+    """Строит таблицу и матрицу кросс-курсов для документа (один раз на документ)"""
+    if not rates or doc_date in _tables:
+        return _tables.get(doc_date)
+
+    table = CurrencyTable(doc_date, rates)
+    with _lock:
+        _tables[doc_date] = table
+        for old_date in sorted(_tables)[:-MAX_TABLES]:
+            del _tables[old_date]
+
+    logger.info(
+        f"🧮 Матрица кросс-курсов на {doc_date.strftime('%d.%m.%Y')}: "
+        f"{table.size}×{table.size}{' (NumPy)' if table.vectorized else ''}"
+    )
+    return table
+
+def get_table(doc_date):
+    return _tables.get(doc_date)
+
+def convert(table: CurrencyTable, amount: float, from_code: str, to_code: str):
+    """Пересчет суммы по матрице: (результат, курс) или None, если валюты нет"""
+    rate = table.cross(from_code, to_code)
+    if rate is None:
+        return None
+    return amount * rate, rate
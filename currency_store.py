@@ -0,0 +1,155 @@
+# currency_store.py - локальное хранилище курсов ЦБ РФ по датам документов
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+import pytz
+from config import logger, CBR_MIRRORS
+from http_client import http_get, mirror_breaker, SOURCE_CBR
+from hedging import hedged_call
+from workers import fanout_executor
+from cbr_calendar import next_rates_check
+from parsers import parse_daily_xml
+from timeseries import record, fx_series
+from currency_catalog import update_catalog
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Отслеживаемые валюты: ID ЦБ РФ -> код
+CBR_CURRENCY_IDS = {
+    'R01235': 'USD',  'R01239': 'EUR',  'R01035': 'GBP',  'R01820': 'JPY',
+    'R01375': 'CNY',  'R01775': 'CHF',  'R01350': 'CAD',  'R01010': 'AUD',
+    'R01700': 'TRY',  'R01335': 'KZT', 'R01230': 'AED',
+}
+CBR_CURRENCY_CODES = {code: valute_id for valute_id, code in CBR_CURRENCY_IDS.items()}
+
+# 🔄 ВРЕМЕННЫЕ РЯДЫ ПО ВАЛЮТАМ: code -> {дата документа: курс за 1 единицу}
+_series = {}
+_names = {}               # code -> название
+_nominals = {}            # code -> номинал ЦБ РФ
+_documents = set()        # даты документов, загруженных целиком
+_requested = {}           # запрошенная дата -> (дата документа, когда проверяли)
+_lock = threading.Lock()
+
+# Отдельный пул (workers.fanout_executor): запросы на разные даты идут параллельно
+DAILY_FETCH_WORKERS = 3
+
+def today_msk():
+    """Текущая дата по Москве - курсы ЦБ РФ устанавливаются по московскому времени"""
+    return datetime.now(MOSCOW_TZ).date()
+
+def _fetch_daily_xml_from(base_url: str, date_req: str):
+    """Загружает XML_daily.asp на дату с одного зеркала ЦБ РФ"""
+    url = f"{base_url}scripts/XML_daily.asp"
+    params = {'date_req': date_req}
+
+    response = http_get(SOURCE_CBR, url, breaker_name=mirror_breaker(SOURCE_CBR, base_url), conditional=True,
+                        params=params, timeout=10)
+    if response.status_code != 200:
+        return None
+    return response
+
+def _fetch_daily_rates_from(base_url: str, date_req: str):
+    """Загрузка и разбор документа в одном потоке пула: (дата документа, все валюты, не изменился ли)"""
+    response = _fetch_daily_xml_from(base_url, date_req)
+    if response is None:
+        return None
+    doc_date, rates = parse_daily_xml(response.content)
+    return doc_date, rates, response.unchanged
+
+def _load_document(day):
+    """Загружает документ ЦБ РФ, действующий на дату day, и раскладывает по рядам"""
+    date_req = day.strftime('%d/%m/%Y')
+    attempts = [(base_url, partial(_fetch_daily_rates_from, base_url, date_req)) for base_url in CBR_MIRRORS]
+    parsed = hedged_call(attempts, name=f"курсы на {date_req}")
+    if not parsed:
+        return None
+
+    doc_date, catalog, unchanged = parsed
+    if unchanged and doc_date in _documents:
+        # ЦБ РФ ответил тем же документом (обычно - завтрашний еще не опубликован):
+        # только отмечаем время проверки, ряды не трогаем
+        _requested[day] = (doc_date, time.time())
+        return doc_date
+
+    # 🧮 ПОЛНЫЙ СПРАВОЧНИК - В МАТРИЦУ КРОСС-КУРСОВ, В РЯДЫ - ТОЛЬКО ОТСЛЕЖИВАЕМЫЕ ВАЛЮТЫ
+    update_catalog(doc_date, catalog)
+    loaded = {code: rate for code, rate in catalog.items() if code in CBR_CURRENCY_CODES}
+
+    with _lock:
+        for code, rate in loaded.items():
+            _series.setdefault(code, {})[doc_date] = rate['value']
+            _names[code] = rate['name']
+            _nominals[code] = rate['nominal']
+        _documents.add(doc_date)
+        _requested[day] = (doc_date, time.time())
+
+    for code, rate in loaded.items():
+        record(fx_series(code), rate['value'], doc_date)
+
+    logger.info(f"📥 Загружен документ ЦБ РФ от {doc_date.strftime('%d.%m.%Y')} (запрошен на {date_req})")
+    return doc_date
+
+def _needs_fetch(day) -> bool:
+    """Нужен ли запрос к ЦБ РФ для даты.
+
+    Документ на сегодня и прошедшие даты уже не изменится. Для будущей даты
+    ЦБ РФ возвращает предыдущий документ, пока новый не опубликован -
+    такую дату переспрашиваем по календарю публикаций (cbr_calendar).
+    """
+    entry = _requested.get(day)
+    if entry is None:
+        return True
+    doc_date, checked_at = entry
+    if doc_date == day or day <= today_msk():
+        return False
+    next_check, _ = next_rates_check(checked_at, tomorrow_published=False)
+    return time.time() >= next_check
+
+def ensure_dates(days) -> None:
+    """Догружает документы только для тех дат, которых нет в памяти (параллельно)"""
+    missing = [day for day in dict.fromkeys(days) if _needs_fetch(day)]
+    if not missing:
+        return
+    if len(missing) == 1:
+        _safe_load(missing[0])
+        return
+    list(fanout_executor('cbr-daily', DAILY_FETCH_WORKERS).map(_safe_load, missing))
+
+def _safe_load(day):
+    try:
+        return _load_document(day)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке курсов на {day}: {e}")
+        return None
+
+def get_document_date(day):
+    """Дата документа ЦБ РФ, действующего на day (None, если не загружен)"""
+    entry = _requested.get(day)
+    return entry[0] if entry else None
+
+def is_tomorrow_published(day=None) -> bool:
+    """Опубликован ли уже документ, который вступит в силу после day (по умолчанию - сегодня)"""
+    day = day or today_msk()
+    tomorrow_doc = get_document_date(day + timedelta(days=1))
+    today_doc = get_document_date(day)
+    return tomorrow_doc is not None and today_doc is not None and tomorrow_doc > today_doc
+
+def get_rates(doc_date) -> dict:
+    """Курсы всех валют из документа за дату doc_date в формате api_currency"""
+    if doc_date not in _documents:
+        return {}
+    rates = {}
+    for code, series in _series.items():
+        value = series.get(doc_date)
+        if value is not None:
+            rates[code] = {'value': value, 'name': _names[code], 'nominal': _nominals[code]}
+    return rates
+
+def get_rates_on(day):
+    """Курсы на дату: (rates, дата документа) с догрузкой при необходимости"""
+    ensure_dates([day])
+    doc_date = get_document_date(day)
+    if doc_date is None:
+        return None, None
+    return get_rates(doc_date), doc_date
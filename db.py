@@ -1,5 +1,6 @@
 import asyncpg
 import os
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 import logging
 from config import logger
@@ -32,7 +33,8 @@ async def init_db():
                 from_currency TEXT NOT NULL,
                 to_currency TEXT NOT NULL,
                 threshold DECIMAL NOT NULL,
-                direction TEXT NOT NULL CHECK (direction IN ('above', 'below')),
+                direction TEXT NOT NULL CHECK (direction IN ('above', 'below', 'rise', 'drop', 'move')),
+                window_seconds INTEGER,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 is_active BOOLEAN DEFAULT TRUE,
                 FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
@@ -286,14 +288,15 @@ async def update_user_info(user_id: int, first_name: str, username: str = None):
         print(f"Ошибка при обновлении информации о пользователе: {e}")
         raise
 
-async def add_alert(user_id: int, from_curr: str, to_curr: str, threshold: float, direction: str):
-    """Добавление уведомления"""
+async def add_alert(user_id: int, from_curr: str, to_curr: str, threshold: float, direction: str,
+                    window_seconds: int = None):
+    """Добавление уведомления (window_seconds - для изменения в процентах за окно)"""
     try:
         conn = await asyncpg.connect(DATABASE_URL)
         await conn.execute('''
-            INSERT INTO alerts (user_id, from_currency, to_currency, threshold, direction)
-            VALUES ($1, $2, $3, $4, $5)
-        ''', user_id, from_curr, to_curr, threshold, direction)
+            INSERT INTO alerts (user_id, from_currency, to_currency, threshold, direction, window_seconds)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        ''', user_id, from_curr, to_curr, threshold, direction, window_seconds)
         await conn.close()
     except Exception as e:
         print(f"Ошибка при добавлении уведомления: {e}")
@@ -439,6 +442,70 @@ async def init_db():
             );
         ''')
 
+        # Последние успешно полученные данные внешних источников
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_snapshots (
+                key TEXT PRIMARY KEY,
+                payload BYTEA NOT NULL,
+                source TEXT,
+                fetched_at TIMESTAMP NOT NULL
+            );
+        ''')
+
+        # Временные ряды: справочник рядов и append-only точки (ts в UTC)
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS ts_series (
+                id SERIAL PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL
+            );
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS ts_points (
+                series_id INTEGER NOT NULL REFERENCES ts_series(id),
+                ts TIMESTAMP NOT NULL,
+                value DOUBLE PRECISION NOT NULL,
+                UNIQUE (series_id, ts)
+            );
+        ''')
+        # BRIN: точки пишутся по возрастанию времени, индекс занимает считанные страницы
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS ts_points_ts_brin ON ts_points USING BRIN (ts);
+        ''')
+
+        # Уведомления об изменении в процентах за окно: новые направления и длина окна
+        try:
+            await conn.execute('ALTER TABLE alerts ADD COLUMN IF NOT EXISTS window_seconds INTEGER')
+            await conn.execute('ALTER TABLE alerts DROP CONSTRAINT IF EXISTS alerts_direction_check')
+            await conn.execute('''
+                ALTER TABLE alerts ADD CONSTRAINT alerts_direction_check
+                CHECK (direction IN ('above', 'below', 'rise', 'drop', 'move'))
+            ''')
+        except Exception as e:
+            print(f"Ошибка при миграции таблицы alerts: {e}")
+
+        # Списки отслеживаемых криптовалют пользователей (id CoinGecko)
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS crypto_watchlists (
+                user_id BIGINT NOT NULL,
+                coin_id TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, coin_id),
+                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+            );
+        ''')
+
+        # Кэш ответов ИИ: ключ - хэш нормализованного вопроса и версии системного промпта
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_response_cache (
+                key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL
+            );
+        ''')
+
         await conn.close()
         print("Таблицы созданы успешно")
     except Exception as e:
@@ -520,4 +587,165 @@ async def get_users_with_weather_notifications():
         return [user['user_id'] for user in users]
     except Exception as e:
         print(f"Ошибка при получении пользователей с уведомлениями о погоде: {e}")
-        return []
\ No newline at end of file
+        return []
+
+# 💾 СНИМКИ ДАННЫХ (LAST-KNOWN-GOOD)
+async def save_data_snapshots(rows: list):
+    """Сохраняет снимки: список (key, payload, source, fetched_at)"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        await conn.executemany('''
+            INSERT INTO data_snapshots (key, payload, source, fetched_at)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (key)
+            DO UPDATE SET
+                payload = EXCLUDED.payload,
+                source = EXCLUDED.source,
+                fetched_at = EXCLUDED.fetched_at
+        ''', rows)
+        await conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении снимков данных: {e}")
+        return False
+
+async def get_data_snapshots():
+    """Загружает все снимки данных"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        rows = await conn.fetch('SELECT key, payload, source, fetched_at FROM data_snapshots')
+        await conn.close()
+        return rows
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке снимков данных: {e}")
+        return []
+
+# 📈 ВРЕМЕННЫЕ РЯДЫ
+async def save_ts_points(batch: dict):
+    """Сохраняет точки: {имя ряда: [(epoch, value)]}; дубликаты по (ряд, время) пропускаются.
+
+    ts_points.ts - TIMESTAMP без пояса: пишем naive datetime в UTC.
+    """
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        for name, points in batch.items():
+            series_id = await conn.fetchval('''
+                INSERT INTO ts_series (name) VALUES ($1)
+                ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id
+            ''', name)
+            await conn.executemany('''
+                INSERT INTO ts_points (series_id, ts, value)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (series_id, ts) DO NOTHING
+            ''', [(series_id, datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None), value)
+                  for ts, value in points])
+        await conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении временных рядов: {e}")
+        return False
+
+async def get_ts_series():
+    """Список рядов: [(id, name)]"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        rows = await conn.fetch('SELECT id, name FROM ts_series')
+        await conn.close()
+        return [(row['id'], row['name']) for row in rows]
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке списка временных рядов: {e}")
+        return []
+
+async def get_ts_points(series_id: int, limit: int):
+    """Последние limit точек ряда (от новых к старым)"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        rows = await conn.fetch('''
+            SELECT ts, value FROM ts_points
+            WHERE series_id = $1
+            ORDER BY ts DESC
+            LIMIT $2
+        ''', series_id, limit)
+        await conn.close()
+        return rows
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке точек временного ряда: {e}")
+        return []
+
+# ₿ СПИСКИ ОТСЛЕЖИВАЕМЫХ КРИПТОВАЛЮТ
+async def add_watchlist_coins(user_id: int, coin_ids: list):
+    """Добавляет монеты в список пользователя (повторы пропускаются)"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        await conn.executemany('''
+            INSERT INTO crypto_watchlists (user_id, coin_id)
+            VALUES ($1, $2)
+            ON CONFLICT (user_id, coin_id) DO NOTHING
+        ''', [(user_id, coin_id) for coin_id in coin_ids])
+        await conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении монет в список пользователя {user_id}: {e}")
+        return False
+
+async def remove_watchlist_coins(user_id: int, coin_ids: list):
+    """Удаляет монеты из списка пользователя"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        await conn.execute(
+            'DELETE FROM crypto_watchlists WHERE user_id = $1 AND coin_id = ANY($2::text[])',
+            user_id, coin_ids
+        )
+        await conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при удалении монет из списка пользователя {user_id}: {e}")
+        return False
+
+async def get_all_watchlists():
+    """Все списки отслеживания: [(user_id, coin_id)]"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        rows = await conn.fetch('SELECT user_id, coin_id FROM crypto_watchlists ORDER BY created_at')
+        await conn.close()
+        return [(row['user_id'], row['coin_id']) for row in rows]
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке списков отслеживания криптовалют: {e}")
+        return []
+
+# 🤖 КЭШ ОТВЕТОВ ИИ
+async def get_ai_cache_entry(key: str):
+    """Неистекший ответ ИИ по ключу: (answer, tokens, expires_at) или None"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        row = await conn.fetchrow('''
+            SELECT answer, tokens, expires_at FROM ai_response_cache
+            WHERE key = $1 AND expires_at > NOW() AT TIME ZONE 'UTC'
+        ''', key)
+        await conn.close()
+        return (row['answer'], row['tokens'], row['expires_at']) if row else None
+    except Exception as e:
+        logger.error(f"Ошибка при чтении кэша ответов ИИ: {e}")
+        return None
+
+async def save_ai_cache_entry(key: str, prompt: str, answer: str, tokens: int, expires_at):
+    """Сохраняет ответ ИИ (expires_at - naive datetime в UTC) и удаляет истекшие"""
+    try:
+        conn = await asyncpg.connect(DATABASE_URL)
+        await conn.execute('''
+            INSERT INTO ai_response_cache (key, prompt, answer, tokens, expires_at)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (key)
+            DO UPDATE SET
+                answer = EXCLUDED.answer,
+                tokens = EXCLUDED.tokens,
+                created_at = CURRENT_TIMESTAMP,
+                expires_at = EXCLUDED.expires_at
+        ''', key, prompt, answer, tokens, expires_at)
+        await conn.execute("DELETE FROM ai_response_cache WHERE expires_at <= NOW() AT TIME ZONE 'UTC'")
+        await conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении кэша ответов ИИ: {e}")
+        return False
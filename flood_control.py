@@ -0,0 +1,193 @@
+# flood_control.py - ограничение частоты запросов пользователей до обработчиков
+import time
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from config import (
+    logger, ADMIN_IDS, FLOOD_CONTROL, FLOOD_USER_LIMITS, FLOOD_GLOBAL_LIMITS,
+    FLOOD_DUPLICATE_WINDOW, FLOOD_NOTICE_INTERVAL
+)
+
+# Классы обработчиков по цене одного нажатия
+CLASS_MENU = 'menu'    # навигация: только ответ из памяти
+CLASS_DATA = 'data'    # курсы, ставки, погода: при промахе кэша - внешний API
+CLASS_AI = 'ai'        # вопрос к ИИ: самый дорогой запрос
+
+CLASS_LABELS = {
+    CLASS_MENU: 'Меню',
+    CLASS_DATA: 'Данные',
+    CLASS_AI: 'ИИ',
+}
+
+# /watch может сбросить общий кэш CoinGecko, /myalerts читает текущие курсы
+DATA_COMMANDS = {'rates', 'currency', 'keyrate', 'crypto', 'weather', 'ruonia', 'ruonia_history', 'convert',
+                 'watch', 'myalerts'}
+DATA_CALLBACKS = {'currency_rates', 'crypto_rates', 'key_rate', 'weather', 'my_alerts'}
+DATA_BUTTONS = {"💱 Курсы валют", "₿ Криптовалюты", "🏛️ Ставки ЦБ РФ", "🌤️ Погода", "📋 Мои уведомления"}
+
+def parse_limits(spec: str) -> dict:
+    """'menu=20/10,data=5/30' -> {'menu': (20, 2.0), 'data': (5, 0.1667)}: емкость и пополнение в секунду"""
+    limits = {}
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        burst, _, period = value.partition('/')
+        try:
+            burst, period = int(burst), float(period)
+        except ValueError:
+            continue
+        if name.strip() and burst > 0 and period > 0:
+            limits[name.strip()] = (burst, burst / period)
+    return limits
+
+USER_LIMITS = parse_limits(FLOOD_USER_LIMITS)
+GLOBAL_LIMITS = parse_limits(FLOOD_GLOBAL_LIMITS)
+
+# 🔄 СОСТОЯНИЕ
+# Ведро - [токены, время последнего пополнения]. Для пользователя храним
+# только последнее принятое действие: повтор того же нажатия в пределах
+# FLOOD_DUPLICATE_WINDOW склеивается с ним
+_users = {}            # user_id -> {'buckets': {класс: ведро}, 'last': (действие, время), 'notice': время, 'seen': время}
+_global_buckets = {}   # класс -> ведро
+_metrics = {
+    'allowed': 0,
+    'coalesced': 0,
+    'throttled': {CLASS_MENU: 0, CLASS_DATA: 0, CLASS_AI: 0},
+    'global_throttled': 0,
+}
+PRUNE_EVERY = 1000
+IDLE_USER_SECONDS = 3600
+_checks = 0
+
+def classify(update: Update, user_data: dict):
+    """(класс, действие) для входящего обновления; действие - ключ склейки повторов"""
+    if update.callback_query:
+        data = update.callback_query.data or ''
+        return (CLASS_DATA if data in DATA_CALLBACKS else CLASS_MENU), f"cb:{data}"
+
+    text = update.message.text if update.message and update.message.text else ''
+    if text.startswith('/'):
+        command = text[1:].split(maxsplit=1)[0].split('@')[0].lower() if len(text) > 1 else ''
+        return (CLASS_DATA if command in DATA_COMMANDS else CLASS_MENU), f"cmd:{text}"
+    if text in DATA_BUTTONS:
+        return CLASS_DATA, f"text:{text}"
+    if user_data and user_data.get('ai_mode') and text:
+        from utils import menu_button_labels
+        if text not in menu_button_labels():
+            return CLASS_AI, f"text:{text}"
+    return CLASS_MENU, f"text:{text}"
+
+def _refill(bucket: list, limit: tuple, now: float) -> list:
+    burst, rate = limit
+    bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    return bucket
+
+def check(user_id: int, klass: str, action: str, now: float = None) -> str:
+    """'ok', 'duplicate', 'throttled' (лимит пользователя) или 'busy' (общий лимит)"""
+    global _checks
+    now = time.monotonic() if now is None else now
+    state = _users.get(user_id)
+    if state is None:
+        state = _users[user_id] = {'buckets': {}, 'last': None, 'notice': 0.0, 'seen': now}
+    state['seen'] = now
+
+    _checks += 1
+    if _checks % PRUNE_EVERY == 0:
+        _prune(now)
+
+    last = state['last']
+    if last and last[0] == action and now - last[1] < FLOOD_DUPLICATE_WINDOW:
+        _metrics['coalesced'] += 1
+        return 'duplicate'
+
+    user_limit = USER_LIMITS.get(klass)
+    global_limit = GLOBAL_LIMITS.get(klass)
+    user_bucket = global_bucket = None
+    if user_limit:
+        user_bucket = state['buckets'].get(klass)
+        if user_bucket is None:
+            user_bucket = state['buckets'][klass] = [float(user_limit[0]), now]
+        if _refill(user_bucket, user_limit, now)[0] < 1:
+            _metrics['throttled'][klass] += 1
+            return 'throttled'
+    if global_limit:
+        global_bucket = _global_buckets.get(klass)
+        if global_bucket is None:
+            global_bucket = _global_buckets[klass] = [float(global_limit[0]), now]
+        if _refill(global_bucket, global_limit, now)[0] < 1:
+            _metrics['global_throttled'] += 1
+            return 'busy'
+
+    # Токены списываем, только когда прошли оба лимита
+    for bucket in (user_bucket, global_bucket):
+        if bucket is not None:
+            bucket[0] -= 1
+    state['last'] = (action, now)
+    _metrics['allowed'] += 1
+    return 'ok'
+
+def _prune(now: float):
+    """Забывает пользователей, которые давно ничего не нажимали"""
+    for user_id in [uid for uid, state in _users.items() if now - state['seen'] > IDLE_USER_SECONDS]:
+        del _users[user_id]
+
+def _retry_after(user_id: int, klass: str) -> int:
+    limit = USER_LIMITS.get(klass)
+    bucket = _users.get(user_id, {}).get('buckets', {}).get(klass)
+    if not limit or not bucket:
+        return 1
+    return max(1, round((1 - bucket[0]) / limit[1]))
+
+async def flood_guard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """TypeHandler в группе -1: лишние обновления не доходят до обработчиков.
+
+    Повтор того же нажатия молча отбрасывается, при превышении лимита
+    пользователь получает короткий ответ - не чаще раза в FLOOD_NOTICE_INTERVAL.
+    """
+    user = update.effective_user
+    if not FLOOD_CONTROL or user is None or user.id in ADMIN_IDS:
+        return
+    if not (update.callback_query or (update.message and update.message.text)):
+        return
+
+    try:
+        klass, action = classify(update, context.user_data)
+        verdict = check(user.id, klass, action)
+    except Exception as e:
+        logger.error(f"Ошибка ограничения частоты: {e}")
+        return
+    if verdict == 'ok':
+        return
+
+    if verdict == 'duplicate':
+        notice = None
+    elif verdict == 'busy':
+        notice = "⏳ Бот сейчас перегружен, попробуйте через несколько секунд"
+    else:
+        notice = f"⏳ Слишком часто. Повторите через {_retry_after(user.id, klass)} сек."
+
+    try:
+        if update.callback_query:
+            # Ответ на нажатие кнопки обязателен, иначе у пользователя крутятся часики
+            await update.callback_query.answer(notice)
+        elif notice:
+            state = _users[user.id]
+            now = time.monotonic()
+            if now - state['notice'] >= FLOOD_NOTICE_INTERVAL:
+                state['notice'] = now
+                await update.message.reply_text(notice)
+    except Exception as e:
+        logger.debug(f"Не удалось ответить на ограниченный запрос: {e}")
+
+    logger.debug(f"Обновление пользователя {user.id} отклонено: {verdict} ({klass}, {action[:40]})")
+    raise ApplicationHandlerStop
+
+def get_flood_stats() -> dict:
+    """Для админ-команд"""
+    return {
+        'enabled': FLOOD_CONTROL,
+        'users': len(_users),
+        'allowed': _metrics['allowed'],
+        'coalesced': _metrics['coalesced'],
+        'throttled': dict(_metrics['throttled']),
+        'global_throttled': _metrics['global_throttled'],
+    }
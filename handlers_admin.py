@@ -1,15 +1,21 @@
+import html
 import logging
+import re
 import psutil
+from functools import partial
 import platform
 from datetime import datetime
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
-from config import logger, ADMIN_IDS, BOT_VERSION, BOT_LAST_UPDATE
+from config import logger, ADMIN_IDS, BOT_VERSION, BOT_LAST_UPDATE, LOG_FILE, LOG_SEARCH_MAX_BYTES
 from utils import log_user_action, create_main_reply_keyboard, create_admin_functions_keyboard
 from db import update_user_info, get_user_actions_stats, get_user_detailed_stats, get_user_info
 
 # 🔄 ДОБАВЛЯЕМ ИМПОРТ ДЛЯ КЭШИРОВАНИЯ
 from cache import get_cache_stats, force_refresh_cache, clear_cache
+from log_reader import search_logs, parse_log_query
+from logging_setup import rotate_log_file
+from workers import run_io
 
 # 🔄 ДОБАВЛЯЕМ ФУНКЦИЮ ДЛЯ КЛАВИАТУРЫ СТАТИСТИКИ
 def create_user_stats_keyboard():
@@ -54,32 +60,93 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         bot_info += f"• Уведомлений: {len(alerts)}\n"
         bot_info += f"• Администраторов: {len(ADMIN_IDS)}\n\n"
 
-        # Статус сервисов
+        # Статус сервисов - из снимка фоновой проверки, без запросов из обработчика
+        from health_probe import get_health_snapshot, format_service_line
+        health = get_health_snapshot()
         services_info = f"🔧 <b>Статус сервисов</b>\n"
+        for name, info in health['services'].items():
+            services_info += format_service_line(name, info) + "\n"
+        if health['last_round_age'] is not None:
+            services_info += (
+                f"<i>Проверка {health['last_round_age']} сек. назад за {health['round_ms']} мс, "
+                f"раундов: {health['rounds']}</i>\n"
+            )
 
-        # Проверка ЦБ РФ
-        try:
-            from api_currency import get_currency_rates_for_date
-            rates, _ = get_currency_rates_for_date(datetime.now().strftime('%d/%m/%Y'))
-            services_info += "• ЦБ РФ: ✅ Работает\n"
-        except:
-            services_info += "• ЦБ РФ: ❌ Ошибка\n"
+        # 🔌 СОСТОЯНИЕ РАЗМЫКАТЕЛЕЙ ЦЕПИ ПО ИСТОЧНИКАМ
+        from circuit_breaker import get_breakers_status, STATE_LABELS, STATE_OPEN
+        from http_client import source_label
+        breakers = get_breakers_status()
+        if breakers:
+            services_info += f"\n🔌 <b>Защита источников</b>\n"
+            for source, info in breakers.items():
+                services_info += (
+                    f"• {source_label(source)}: {STATE_LABELS[info['state']]}, "
+                    f"ошибок {info['failure_rate']:.0f}% из {info['calls_in_window']}"
+                )
+                if info['state'] == STATE_OPEN:
+                    services_info += f", повтор через {info['retry_in']} сек."
+                services_info += "\n"
+
+        # ⚙️ ПУЛЫ ИСПОЛНИТЕЛЕЙ: ОЖИДАНИЕ В ОЧЕРЕДИ И ВЫПОЛНЕНИЕ
+        from workers import get_workers_stats, POOL_LABELS
+        services_info += f"\n⚙️ <b>Пулы исполнителей</b>\n"
+        for name, pool in get_workers_stats().items():
+            services_info += (
+                f"• {POOL_LABELS[name]}: {pool['running']}/{pool['max_workers']} заняты, "
+                f"в очереди {pool['waiting']}/{pool['queue_limit']}\n"
+            )
+            for stage, metrics in sorted(pool['stages'].items()):
+                services_info += (
+                    f"   {stage}: {metrics['completed']} шт., ожидание {metrics['avg_wait_ms']} мс, "
+                    f"выполнение {metrics['avg_exec_ms']} мс"
+                )
+                if metrics['timeouts'] or metrics['rejected']:
+                    services_info += f", таймаутов {metrics['timeouts']}, отклонено {metrics['rejected']}"
+                services_info += "\n"
+
+        # 🤖 ОЧЕРЕДЬ ЗАПРОСОВ К ИИ
+        from ai_scheduler import get_scheduler_stats
+        ai_queue = get_scheduler_stats()
+        services_info += f"\n🤖 <b>Запросы к ИИ</b>\n"
+        services_info += (
+            f"• Выполняется: {ai_queue['running']}/{ai_queue['max_concurrent']}, "
+            f"в очереди: {ai_queue['queued']} (макс. {ai_queue['max_queue']}, всего ждали {ai_queue['queued_total']}), ждут своей очереди: {ai_queue['pending']}\n"
+            f"• Выполнено: {ai_queue['completed']}, ошибок: {ai_queue['failed']}, отменено: {ai_queue['cancelled']}, "
+            f"заменено новыми: {ai_queue['superseded']}\n"
+            f"• Среднее ожидание: {ai_queue['avg_wait_ms']} мс\n"
+        )
 
-        # Проверка CoinGecko
-        try:
-            from api_crypto import get_crypto_rates
-            crypto_data = get_crypto_rates()
-            services_info += "• CoinGecko: ✅ Работает\n" if crypto_data else "• CoinGecko: ❌ Ошибка\n"
-        except:
-            services_info += "• CoinGecko: ❌ Ошибка\n"
+        # 🚦 ОГРАНИЧЕНИЕ ЧАСТОТЫ ЗАПРОСОВ
+        from flood_control import get_flood_stats, CLASS_LABELS
+        flood = get_flood_stats()
+        services_info += f"\n🚦 <b>Ограничение частоты</b>{'' if flood['enabled'] else ' (выключено)'}\n"
+        services_info += (
+            f"• Пропущено: {flood['allowed']}, склеено повторов: {flood['coalesced']}, "
+            f"упор в общий лимит: {flood['global_throttled']}\n"
+            f"• Отклонено: " + ", ".join(f"{CLASS_LABELS[k]} {v}" for k, v in flood['throttled'].items()) +
+            f" (пользователей в учете: {flood['users']})\n"
+        )
 
-        # Проверка DeepSeek
-        from config import DEEPSEEK_API_KEY
-        services_info += f"• DeepSeek AI: {'✅ Доступен' if DEEPSEEK_API_KEY else '❌ Не настроен'}\n"
+        # 🤖 КЭШ ОТВЕТОВ ИИ: ПОПАДАНИЯ И СЭКОНОМЛЕННЫЕ ТОКЕНЫ
+        from ai_cache import get_ai_cache_stats
+        ai_cache = get_ai_cache_stats()
+        services_info += f"\n🗃 <b>Кэш ответов ИИ</b>\n"
+        services_info += (
+            f"• Записей: {ai_cache['entries']}/{ai_cache['max_entries']}"
+            f"{' (+ PostgreSQL)' if ai_cache['persist'] else ''}\n"
+            f"• Попаданий: {ai_cache['hits']} ({ai_cache['hit_rate']:.0f}%), из БД {ai_cache['db_hits']}, "
+            f"промахов: {ai_cache['misses']}\n"
+            f"• Сэкономлено токенов: {ai_cache['tokens_saved']:,}\n"
+        )
 
-        # Проверка погоды
-        from config import WEATHER_API_KEY
-        services_info += f"• Погода: {'✅ Настроена' if WEATHER_API_KEY and WEATHER_API_KEY != 'demo_key_12345' else '⚠️ Демо-данные'}\n"
+        # 📝 ОЧЕРЕДЬ ЛОГОВ
+        from logging_setup import get_logging_stats
+        log_stats = get_logging_stats()
+        services_info += (
+            f"\n📝 <b>Логи</b>\n"
+            f"• В очереди на запись: {log_stats['queued']}, потеряно при переполнении: {log_stats['dropped']}, "
+            f"пропущено сэмплированием: {log_stats['sampled_out']}\n"
+        )
 
         full_message = system_info + bot_info + services_info
         full_message += f"\n💡 <i>Бот работает стабильно</i>"
@@ -106,20 +173,39 @@ async def logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
         log_user_action(update.effective_user.id, "view_logs")
 
-        # Чтение последних логов
+        # 🔄 ХВОСТ И ПОИСК ПО ЛОГАМ: чтение блоками с конца, с учетом ротированных файлов
         try:
-            with open('bot.log', 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                last_lines = lines[-20:]  # Последние 20 строк
-                log_text = ''.join(last_lines)
-        except FileNotFoundError:
+            query = parse_log_query(context.args or [])
+            result = await run_io(
+                partial(search_logs, LOG_FILE, max_scan_bytes=LOG_SEARCH_MAX_BYTES, **query),
+                stage="logs"
+            )
+        except (ValueError, re.error) as e:
+            await update.message.reply_text(
+                f"❌ Неверный запрос: {html.escape(str(e))}\n\n"
+                "Пример: <code>/logs ERROR module=api_crypto user=123 n=50 таймаут</code>",
+                parse_mode='HTML'
+            )
+            return
+
+        if not result['files']:
             log_text = "Файл логов не найден"
+        elif not result['records']:
+            log_text = "Записей не найдено"
+        else:
+            log_text = '\n'.join(result['records'])
 
-        if len(log_text) > 4000:
-            log_text = log_text[-4000:]  # Обрезаем если слишком длинный
+        if len(log_text) > 3500:
+            log_text = log_text[-3500:]  # Обрезаем если слишком длинный
+
+        footer = f"\n\n🔎 Просмотрено {result['scanned_bytes'] / 1024:.0f} КБ"
+        if result['skipped_blocks']:
+            footer += f", пропущено по индексу блоков: {result['skipped_blocks']}"
+        if result['truncated']:
+            footer += "\n⚠️ Достигнут предел просмотра, старые записи не проверены"
 
         await update.message.reply_text(
-            f"📋 <b>Последние логи:</b>\n<code>{log_text}</code>",
+            f"📋 <b>Последние логи:</b>\n<code>{html.escape(log_text)}</code>{footer}",
             parse_mode='HTML',
             reply_markup=create_main_reply_keyboard()
         )
@@ -144,11 +230,12 @@ async def clear_logs_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         log_user_action(update.effective_user.id, "clear_logs")
 
-        # Очистка файла логов
-        open('bot.log', 'w').close()
+        # Ротация вместо обрезки: обработчик сам начинает новый файл
+        if not rotate_log_file():
+            open(LOG_FILE, 'w').close()
 
         await update.message.reply_text(
-            "✅ Логи успешно очищены",
+            "✅ Начат новый файл логов, прежние записи сохранены в ротированных файлах",
             reply_markup=create_main_reply_keyboard()
         )
 
@@ -186,8 +273,58 @@ async def cache_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         else:
             message += "📭 <i>Кэш пуст</i>\n\n"
 
+        # 📈 МЕТРИКИ ДЕКОРАТОРА @cached ПО КЛЮЧАМ
+        if stats.get('metrics'):
+            message += "📈 <b>Метрики загрузок:</b>\n"
+            for key, metrics in stats['metrics'].items():
+                message += (
+                    f"• <b>{key}:</b> попаданий {metrics['hits']}, промахов {metrics['misses']}, "
+                    f"неудач {metrics['failures']} (негативных попаданий {metrics['negative_hits']}, "
+                    f"отдано прошлых значений {metrics['stale_served']}, без изменений {metrics['unchanged']})\n"
+                    f"   ⚡ Hit rate: {metrics['hit_rate']:.0f}%, загрузка в среднем {metrics['avg_load_ms']:.0f} мс\n"
+                )
+            message += "\n"
+
+        # 🌐 УСЛОВНЫЕ ЗАПРОСЫ: СКОЛЬКО ОТВЕТОВ НЕ ИЗМЕНИЛОСЬ И СКОЛЬКО БАЙТ СЭКОНОМЛЕНО
+        from http_client import get_conditional_stats, source_label
+        conditional_stats = get_conditional_stats()
+        if conditional_stats:
+            message += "🌐 <b>Условные запросы:</b>\n"
+            for source, counters in conditional_stats.items():
+                message += (
+                    f"• <b>{source_label(source)}:</b> запросов {counters['requests']}, "
+                    f"304 Not Modified {counters['not_modified']}, тот же ответ {counters['unchanged']}\n"
+                    f"   📦 Получено {counters['bytes_received'] / 1024:.0f} КБ, "
+                    f"сэкономлено {counters['bytes_saved'] / 1024:.0f} КБ\n"
+                )
+            message += "\n"
+
+        from crypto_universe import get_watch_stats, coin_info
+        watch_stats = get_watch_stats()
+        message += "₿ <b>Списки криптовалют:</b>\n"
+        message += (
+            f"• Пользователей со списком: {watch_stats['users']}, уникальных монет: {watch_stats['watched_coins']}\n"
+            f"• Запрашивается монет: {watch_stats['tracked_coins']} за {watch_stats['batches']} запрос(а) к CoinGecko\n"
+        )
+        from crypto_alerts import get_poller_stats
+        poller = get_poller_stats()
+        message += (
+            f"• Уведомлений по криптовалютам: {poller['alerts']} (пар: {poller['pairs']}), "
+            f"опрос раз в {poller['interval']:.0f} сек. ({poller['reason']})\n"
+            f"• Опросов: {poller['polls']}, пропущено по квоте: {poller['skipped']}, сработало: {poller['triggered']}\n"
+            f"• CoinGecko: {poller['minute_calls']} запрос(ов) за минуту, {poller['month_calls']} за месяц\n"
+        )
+        from rolling import get_windows_stats
+        windows = get_windows_stats()
+        if windows:
+            message += f"• Скользящих окон уведомлений: {len(windows)} ({sum(windows.values())} точек)\n"
+        if watch_stats['top']:
+            top = ", ".join(f"{coin_info(coin_id)['symbol']} ({count})" for coin_id, count in watch_stats['top'])
+            message += f"• Популярные: {top}\n"
+        message += "\n"
+
         message += "💡 <b>График обновления:</b>\n"
-        message += "• 💱 Курсы валют: каждый час\n"
+        message += "• 💱 Курсы валют: по календарю публикаций ЦБ РФ\n"
         message += "• 💎 Ключевая ставка: раз в 24 часа\n"
         message += "• 📊 RUONIA: раз в 24 часа\n"
         message += "• ₿ Криптовалюты: каждые 30 минут\n"
@@ -353,6 +490,17 @@ async def cache_schedule_command(update: Update, context: ContextTypes.DEFAULT_T
         message = "⏰ <b>РАСПИСАНИЕ ОБНОВЛЕНИЯ КЭША</b>\n\n"
         message += "<i>Текущее расписание (Московское время):</i>\n\n"
 
+        # 📅 КУРСЫ ВАЛЮТ - ПО КАЛЕНДАРЮ ПУБЛИКАЦИЙ ЦБ РФ
+        from cache import has_deadline_provider, get_next_schedule_time
+        if has_deadline_provider('currency_rates'):
+            from cbr_calendar import describe_today
+            message += "💱 <b>Курсы валют:</b>\n"
+            message += f"   📅 По календарю ЦБ РФ: {describe_today()}\n"
+            message += f"   🕒 Следующая проверка: {get_next_schedule_time('currency_rates')}\n"
+            if schedule.get('currency_rates'):
+                message += f"   ➕ Дополнительно: {', '.join(schedule.pop('currency_rates'))} МСК\n"
+            message += "\n"
+
         for key, times in schedule.items():
             emoji = {
                 'currency_rates': '💱',
@@ -1,10 +1,192 @@
+import asyncio
+import html
 import logging
+import time
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ContextTypes
-from config import logger, DEEPSEEK_API_KEY
-from utils import log_user_action, create_ai_keyboard, create_main_reply_keyboard, split_long_message
+from config import logger, DEEPSEEK_API_KEY, AI_STREAMING, AI_STREAM_EDIT_INTERVAL
+from utils import (
+    log_user_action, create_ai_keyboard, create_main_reply_keyboard, split_long_message, find_split_position
+)
 # Обновляем импорт
-from api_ai import ask_deepseek
+from api_ai import ask_deepseek, stream_deepseek
+from ai_scheduler import submit, STATE_QUEUED, STATE_WAITING
+from ai_memory import get_memory
+
+AI_ANSWER_HEADER = "🤖 <b>ИИ Ассистент:</b>\n\n"
+TELEGRAM_MESSAGE_LIMIT = 4096
+STREAM_CURSOR = " ▌"
+
+def _telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram (в единицах UTF-16)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def _fitting_length(text: str, budget: int) -> int:
+    """Сколько символов text помещается в budget единиц UTF-16"""
+    used = 0
+    for index, char in enumerate(text):
+        used += 2 if ord(char) > 0xFFFF else 1
+        if used > budget:
+            return index
+    return len(text)
+
+class StreamingReply:
+    """Ответ ИИ, который дописывается в сообщение по мере генерации.
+
+    Правки - не чаще AI_STREAM_EDIT_INTERVAL (лимиты Telegram на редактирование).
+    Когда текст упирается в 4096 символов, часть закрывается по границе строки
+    или предложения, и ответ продолжается новым сообщением.
+    """
+
+    def __init__(self, message, reply_markup):
+        self._message = message          # вопрос пользователя - на него отвечаем
+        self._reply_markup = reply_markup
+        self._sent = None                # редактируемое сообщение бота
+        self._prefix = AI_ANSWER_HEADER  # заголовок только у первой части
+        self._text = ''
+        self._shown = None
+        self._next_edit = 0.0
+        self.parts = 0
+        self.edits = 0
+
+    def _budget(self) -> int:
+        visible_prefix = self._prefix.replace('<b>', '').replace('</b>', '')
+        return TELEGRAM_MESSAGE_LIMIT - _telegram_length(visible_prefix + STREAM_CURSOR)
+
+    async def feed(self, delta: str):
+        self._text += delta
+        while _telegram_length(self._text) > self._budget():
+            split = find_split_position(self._text, _fitting_length(self._text, self._budget()))
+            head, self._text = self._text[:split], self._text[split:]
+            await self._show(head, final=True)
+            self._sent = None
+            self._prefix = ''
+            self._shown = None
+        if self._text and (self._sent is None or time.monotonic() >= self._next_edit):
+            await self._show(self._text, final=False)
+
+    async def finish(self):
+        """Финальная правка - весь текст без курсора"""
+        if self._text.strip() or self._sent is not None:
+            await self._show(self._text, final=True)
+        elif not self.parts:
+            await self._show("❌ ИИ вернул пустой ответ. Попробуйте переформулировать вопрос.", final=True)
+
+    async def stop(self):
+        """Ответ отменен (выход из режима ИИ): убираем курсор и помечаем обрыв"""
+        if self._sent is not None:
+            self._text += "\n\n⏹ Ответ остановлен"
+            await self._show(self._text, final=True)
+
+    async def _show(self, text: str, final: bool):
+        rendered = self._prefix + html.escape(text, quote=False) + ('' if final else STREAM_CURSOR)
+        if rendered == self._shown:
+            return
+        if self._sent is None:
+            self._sent = await self._message.reply_text(
+                rendered, parse_mode='HTML', reply_markup=self._reply_markup if not self.parts else None
+            )
+            self.parts += 1
+        else:
+            try:
+                await self._sent.edit_text(rendered, parse_mode='HTML')
+            except RetryAfter as e:
+                if not final:
+                    # Промежуточную правку пропускаем - следующая принесет весь текст
+                    self._next_edit = time.monotonic() + e.retry_after
+                    return
+                await asyncio.sleep(e.retry_after)
+                await self._sent.edit_text(rendered, parse_mode='HTML')
+            except BadRequest as e:
+                if 'not modified' not in str(e).lower():
+                    raise
+            self.edits += 1
+        self._shown = rendered
+        self._next_edit = time.monotonic() + AI_STREAM_EDIT_INTERVAL
+
+async def _stream_ai_answer(update: Update, user_message: str, reply_markup, history: list, outcome: dict):
+    """Потоковый ответ: первое сообщение - с первым фрагментом, дальше правки"""
+    reply = StreamingReply(update.message, reply_markup)
+    started = time.monotonic()
+    first_token = None
+    try:
+        async for delta in stream_deepseek(user_message, history=history, outcome=outcome):
+            if first_token is None:
+                first_token = time.monotonic() - started
+            await reply.feed(delta)
+    except asyncio.CancelledError:
+        try:
+            await reply.stop()
+        except Exception as e:
+            logger.debug(f"Не удалось пометить остановленный ответ ИИ: {e}")
+        raise
+    await reply.finish()
+    logger.info(
+        f"🤖 Потоковый ответ ИИ: первый фрагмент через {first_token or 0:.2f} сек., "
+        f"всего {time.monotonic() - started:.1f} сек., сообщений {reply.parts}, правок {reply.edits}"
+    )
+
+async def _answer_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE, user_message: str) -> None:
+    """Запрос к DeepSeek и ответ пользователю - выполняется планировщиком ai_scheduler"""
+    try:
+        # Показываем индикатор набора сообщения
+        await update.message.chat.send_action(action="typing")
+        
+        keyboard = [
+            [KeyboardButton("🔄 Новый вопрос")],
+            [KeyboardButton("🔙 Главное меню")]
+        ]
+        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        
+        # 🧠 ИСТОРИЯ РАЗГОВОРА В ПРЕДЕЛАХ БЮДЖЕТА ТОКЕНОВ
+        memory = get_memory(context.user_data)
+        history = memory.history_for(user_message)
+        outcome = {}
+        
+        # 🔄 ПОТОКОВЫЙ РЕЖИМ: текст появляется по мере генерации
+        if AI_STREAMING:
+            await _stream_ai_answer(update, user_message, reply_markup, history, outcome)
+            if 'answer' in outcome:
+                memory.add_turn(user_message, outcome['answer'])
+            return
+        
+        # Отправляем запрос к DeepSeek
+        ai_response = await ask_deepseek(user_message, context, history=history, outcome=outcome)
+        if 'answer' in outcome:
+            memory.add_turn(user_message, outcome['answer'])
+        
+        # Разбиваем длинные сообщения на части
+        message_parts = await split_long_message(ai_response)
+        
+        # Отправляем первую часть с клавиатурой
+        first_part = message_parts[0]
+        if len(message_parts) > 1:
+            first_part += f"\n\n📄 <i>Часть 1 из {len(message_parts)}</i>"
+        
+        await update.message.reply_text(
+            f"{AI_ANSWER_HEADER}{first_part}",
+            parse_mode='HTML',
+            reply_markup=reply_markup
+        )
+        
+        # Отправляем остальные части
+        for i, part in enumerate(message_parts[1:], 2):
+            part_text = part
+            if i < len(message_parts):
+                part_text += f"\n\n📄 <i>Часть {i} из {len(message_parts)}</i>"
+            
+            await update.message.reply_text(
+                part_text,
+                parse_mode='HTML'
+            )
+        
+    except Exception as e:
+        logger.error(f"Ошибка при ответе ИИ: {e}")
+        await update.message.reply_text(
+            "❌ Произошла ошибка при обработке вашего запроса.",
+            reply_markup=create_main_reply_keyboard()
+        )
 
 async def show_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Показывает интерфейс чата с ИИ"""
@@ -16,8 +198,9 @@ async def show_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             await update.message.reply_text(error_msg, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
             return
         
-        # Активируем режим ИИ для пользователя
+        # Активируем режим ИИ для пользователя; каждый вход - новый разговор
         context.user_data['ai_mode'] = True
+        context.user_data.pop('ai_memory', None)
         
         welcome_message = (
             "🤖 <b>УНИВЕРСАЛЬНЫЙ ИИ ПОМОЩНИК</b>\n\n"
@@ -42,6 +225,12 @@ async def show_ai_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         logger.error(f"Ошибка при показе чата с ИИ: {e}")
         await update.message.reply_text("❌ Ошибка при запуске ИИ помощника.", reply_markup=create_main_reply_keyboard())
 
+def _queue_notice(position: int) -> str:
+    return (
+        f"⏳ <b>Сейчас много вопросов к ИИ.</b>\n"
+        f"Ваш вопрос в очереди: <b>{position}-й</b>. Ответ начнет появляться автоматически."
+    )
+
 async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает текстовые сообщения для ИИ"""
     try:
@@ -59,42 +248,48 @@ async def handle_ai_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Логируем запрос к ИИ
         log_user_action(user_id, "ai_request", {"message_length": len(user_message)})
         
-        # Показываем индикатор набора сообщения
-        await update.message.chat.send_action(action="typing")
-        
-        # Отправляем запрос к DeepSeek
-        ai_response = await ask_deepseek(user_message, context)
-        
-        # Разбиваем длинные сообщения на части
-        message_parts = await split_long_message(ai_response)
-        
-        # Отправляем первую часть с клавиатурой
-        first_part = message_parts[0]
-        if len(message_parts) > 1:
-            first_part += f"\n\n📄 <i>Часть 1 из {len(message_parts)}</i>"
-        
-        keyboard = [
-            [KeyboardButton("🔄 Новый вопрос")],
-            [KeyboardButton("🔙 Главное меню")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        
-        await update.message.reply_text(
-            f"🤖 <b>ИИ Ассистент:</b>\n\n{first_part}",
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
-        
-        # Отправляем остальные части
-        for i, part in enumerate(message_parts[1:], 2):
-            part_text = part
-            if i < len(message_parts):
-                part_text += f"\n\n📄 <i>Часть {i} из {len(message_parts)}</i>"
-            
-            await update.message.reply_text(
-                part_text,
-                parse_mode='HTML'
+        # 🔄 ОЧЕРЕДЬ ЗАПРОСОВ: один вопрос пользователя за раз, общий лимит на весь бот.
+        # Ответ выполняется фоновой задачей - обработчик не держит остальные обновления
+        notice = asyncio.get_running_loop().create_future()
+
+        async def runner():
+            queued_message = await notice
+            if queued_message is not None:
+                try:
+                    await queued_message.delete()
+                except Exception:
+                    pass
+            await _answer_ai_message(update, context, user_message)
+
+        async def on_queued(position: int):
+            # Предыдущий вопрос отвечен, а бот занят - меняем уведомление на место в очереди
+            queued_message = await notice
+            if queued_message is not None:
+                await queued_message.edit_text(_queue_notice(position), parse_mode='HTML')
+
+        async def on_dropped():
+            # Вопрос вытеснен следующим или отменен выходом из режима ИИ - «принят» больше не верно
+            queued_message = await notice
+            if queued_message is not None:
+                await queued_message.delete()
+
+        result = submit(user_id, runner, on_queued, on_dropped)
+        notice_text = None
+        if result['state'] == STATE_QUEUED:
+            notice_text = _queue_notice(result['position'])
+        elif result['state'] == STATE_WAITING:
+            notice_text = (
+                "⏭ Заменил этим вопросом предыдущий ожидающий - отвечу, как только закончу с текущим."
+                if result['superseded'] else
+                "📝 Вопрос принят - отвечу, как только закончу с предыдущим."
             )
+
+        queued_message = None
+        try:
+            if notice_text:
+                queued_message = await update.message.reply_text(notice_text, parse_mode='HTML')
+        finally:
+            notice.set_result(queued_message)
         
     except Exception as e:
         logger.error(f"Ошибка в обработчике ИИ сообщений: {e}")
@@ -6,6 +6,12 @@ from utils import log_user_action, create_alerts_keyboard, create_currency_selec
 from db import get_user_alerts, clear_user_alerts, add_alert, get_user_settings, update_weather_notifications, get_users_with_weather_notifications
 # Обновляем импорт
 from api_currency import get_currency_rates_with_tomorrow
+from crypto_universe import resolve_coin, coin_info, is_coin
+from crypto_alerts import invalidate_crypto_alerts, get_alert_price
+from cache import get_cache
+from alert_index import CHANGE_DIRECTIONS
+from rolling import parse_window, format_window, window_stats, change_percents
+from notifications import CHANGE_LABELS
 
 # handlers_alerts.py - обновляем show_alerts_menu
 async def show_alerts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -33,7 +39,7 @@ async def show_alerts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             "⏰ <b>Расписание рассылок:</b>\n"
             "• Погода: ежедневно в 10:00 МСК\n"
             "• Курсы валют: ежедневно в 15:00 МСК\n"
-            "• Проверка алертов: каждые 30 минут"
+            "• Проверка алертов: курсы ЦБ РФ - каждые 30 минут, криптовалюты - ежеминутно (/alert BTC USD ...)"
         )
 
         reply_markup = create_alerts_keyboard()
@@ -273,6 +279,29 @@ async def myalerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             threshold = alert['threshold']
             direction = alert['direction']
 
+            if direction in CHANGE_DIRECTIONS:
+                name = coin_info(from_curr)['symbol'] if is_coin(from_curr) else from_curr
+                seconds = alert.get('window_seconds')
+                stats = window_stats(f"{from_curr}/{to_curr}", seconds) if seconds else None
+                current = f"{change_percents(stats)[direction]:.2f}%" if stats and stats['count'] > 1 else "N/A"
+                message += (
+                    f"🟢 <b>{i}. {name} → {to_curr}</b>\n"
+                    f"   📊 Условие: {CHANGE_LABELS[direction]} на <b>{threshold}%</b> за {format_window(seconds or 0)}\n"
+                    f"   📐 Сейчас за окно: <b>{current}</b>\n\n"
+                )
+                continue
+
+            if is_coin(from_curr):
+                symbol = coin_info(from_curr)['symbol']
+                unit = "$" if to_curr == 'USD' else "руб."
+                message += (
+                    f"🟢 <b>{i}. {symbol} → {to_curr}</b>\n"
+                    f"   🎯 Порог: <b>{float(threshold):,.2f} {unit}</b>\n"
+                    f"   📊 Условие: цена <b>{'выше' if direction == 'above' else 'ниже'}</b> порога\n"
+                    f"   ₿ Текущая цена: <b>{_format_crypto_price(_crypto_price(from_curr, to_curr), to_curr)}</b>\n\n"
+                )
+                continue
+
             # Получаем текущий курс для сравнения
             rates_today, _, _, _ = get_currency_rates_with_tomorrow()
             current_rate = "N/A"
@@ -290,7 +319,7 @@ async def myalerts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             )
 
         message += (
-            "⏰ <i>Уведомления проверяются каждые 30 минут автоматически</i>\n"
+            "⏰ <i>Курсы ЦБ РФ проверяются каждые 30 минут, криптовалюты - примерно раз в минуту</i>\n"
             "💡 <i>При срабатывании уведомление автоматически удаляется</i>"
         )
 
@@ -315,7 +344,11 @@ async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
                 "💡 <b>Примеры:</b>\n"
                 "• <code>/alert USD RUB 80 above</code> - уведомить когда USD выше 80 руб.\n"
                 "• <code>/alert EUR RUB 90 below</code> - уведомить когда EUR ниже 90 руб.\n"
-                "• <code>/alert AED RUB 22 above</code> - уведомить когда AED выше 22 руб.",
+                "• <code>/alert AED RUB 22 above</code> - уведомить когда AED выше 22 руб.\n"
+                "• <code>/alert BTC USD 70000 below</code> - уведомить когда BTC ниже 70 000 $\n"
+                "• <code>/alert USD RUB 2% 1d</code> - когда USD изменится больше чем на 2% за день\n"
+                "• <code>/alert BTC USD -5% 1h</code> - когда BTC упадет на 5% за час\n\n"
+                "₿ Уведомления по криптовалютам проверяются ежеминутно (по квоте CoinGecko).",
                 parse_mode='HTML',
                 reply_markup=create_main_reply_keyboard()
             )
@@ -323,6 +356,12 @@ async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
         from_curr, to_curr = args[0].upper(), args[1].upper()
 
+        # ₿ КРИПТОВАЛЮТА - ТА ЖЕ ТАБЛИЦА УВЕДОМЛЕНИЙ, ПАРА МОНЕТА/USD ИЛИ МОНЕТА/RUB
+        coin_id = resolve_coin(args[0])
+        if coin_id:
+            await _create_crypto_alert(update, coin_id, to_curr, args[2], args[3].lower())
+            return
+
         # Проверяем поддерживаемые валюты
         supported_currencies = ['USD', 'EUR', 'GBP', 'JPY', 'CNY', 'CHF', 'CAD', 'AUD', 'TRY', 'KZT', 'AED']
         if from_curr not in supported_currencies:
@@ -344,6 +383,11 @@ async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             )
             return
 
+        # 📐 ИЗМЕНЕНИЕ В ПРОЦЕНТАХ ЗА ОКНО: /alert USD RUB 2% 1d
+        if args[2].endswith('%'):
+            await _create_change_alert(update, from_curr, to_curr, args[2], args[3])
+            return
+
         try:
             threshold = float(args[2])
             if threshold <= 0:
@@ -398,6 +442,114 @@ async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             reply_markup=create_main_reply_keyboard()
         )
 
+def _crypto_price(coin_id: str, quote: str):
+    """Текущая цена монеты: из опроса уведомлений или из общего кэша курсов"""
+    price = get_alert_price(f"{coin_id}/{quote}")
+    if price is None:
+        crypto_rates = get_cache("crypto_rates") or {}
+        info = crypto_rates.get(coin_id)
+        if isinstance(info, dict):
+            price = info.get('price_usd' if quote == 'USD' else 'price_rub')
+    return price
+
+def _format_crypto_price(price, quote: str) -> str:
+    if price is None:
+        return "N/A"
+    unit = "$" if quote == 'USD' else "руб."
+    return f"{price:,.2f} {unit}" if price >= 1 else f"{price:.6f} {unit}"
+
+CHANGE_USAGE = (
+    "❌ <b>Неверный формат уведомления об изменении.</b>\n\n"
+    "📝 <code>/alert &lt;из&gt; &lt;в&gt; &lt;±процент%&gt; &lt;окно&gt;</code>\n"
+    "• <code>2%</code> - изменение в любую сторону, <code>+2%</code> - рост, <code>-2%</code> - падение\n"
+    "• Окно: от 5m до 7d (m - минуты, h - часы, d - дни)\n\n"
+    "💡 <code>/alert USD RUB 2% 1d</code>, <code>/alert BTC USD -5% 1h</code>"
+)
+
+def parse_change_threshold(text: str):
+    """'+2%' -> ('rise', 2.0), '-5%' -> ('drop', 5.0), '2%' -> ('move', 2.0); None - неверно"""
+    text = text.strip().rstrip('%').replace(',', '.')
+    direction = {'+': 'rise', '-': 'drop'}.get(text[:1], 'move')
+    try:
+        percent = float(text.lstrip('+-'))
+    except ValueError:
+        return None
+    if not 0 < percent <= 100:
+        return None
+    return direction, percent
+
+async def _create_change_alert(update: Update, base: str, quote: str, percent_text: str, window_text: str):
+    """Создает уведомление об изменении в процентах за скользящее окно"""
+    parsed = parse_change_threshold(percent_text)
+    seconds = parse_window(window_text)
+    if not parsed or not seconds:
+        await update.message.reply_text(CHANGE_USAGE, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
+        return
+    direction, percent = parsed
+
+    await add_alert(update.effective_user.id, base, quote, percent, direction, seconds)
+    crypto = is_coin(base)
+    if crypto:
+        invalidate_crypto_alerts()
+
+    name = coin_info(base)['symbol'] if crypto else base
+    await update.message.reply_text(
+        f"✅ <b>УВЕДОМЛЕНИЕ УСТАНОВЛЕНО!</b>\n\n"
+        f"💱 <b>Пара:</b> {name}/{quote}\n"
+        f"📊 <b>Условие:</b> {'цена' if crypto else 'курс'} {CHANGE_LABELS[direction]} "
+        f"на <b>{percent:g}%</b> за {format_window(seconds)}\n\n"
+        f"📐 <i>Рост считается от минимума окна, падение - от максимума</i>\n"
+        f"💡 {'Цена проверяется примерно раз в минуту' if crypto else 'Курсы ЦБ РФ проверяются каждые 30 минут'}",
+        parse_mode='HTML',
+        reply_markup=create_main_reply_keyboard()
+    )
+
+async def _create_crypto_alert(update: Update, coin_id: str, quote: str, threshold_text: str, direction: str):
+    """Создает уведомление по криптовалюте (/alert BTC USD 70000 above)"""
+    if quote not in ('USD', 'RUB'):
+        await update.message.reply_text(
+            "❌ Для криптовалют доступны пары с USD и RUB.\n"
+            "💡 Используйте: <code>/alert BTC USD 70000 above</code>",
+            parse_mode='HTML',
+            reply_markup=create_main_reply_keyboard()
+        )
+        return
+
+    if threshold_text.endswith('%'):
+        await _create_change_alert(update, coin_id, quote, threshold_text, direction)
+        return
+
+    try:
+        threshold = float(threshold_text.replace(',', '.'))
+        if threshold <= 0:
+            raise ValueError("Порог должен быть положительным числом")
+    except ValueError:
+        await update.message.reply_text("❌ Порог должен быть положительным числом.",
+                                        reply_markup=create_main_reply_keyboard())
+        return
+
+    if direction not in ['above', 'below']:
+        await update.message.reply_text("❌ Направление должно быть 'above' или 'below'.",
+                                        reply_markup=create_main_reply_keyboard())
+        return
+
+    await add_alert(update.effective_user.id, coin_id, quote, threshold, direction)
+    invalidate_crypto_alerts()
+
+    symbol = coin_info(coin_id)['symbol']
+    unit = "$" if quote == 'USD' else "руб."
+    await update.message.reply_text(
+        f"✅ <b>УВЕДОМЛЕНИЕ УСТАНОВЛЕНО!</b>\n\n"
+        f"₿ <b>Пара:</b> {symbol}/{quote}\n"
+        f"🎯 <b>Порог:</b> {threshold:,.2f} {unit}\n"
+        f"📊 <b>Условие:</b> цена <b>{'выше' if direction == 'above' else 'ниже'}</b> {threshold:,.2f} {unit}\n"
+        f"💹 <b>Текущая цена:</b> {_format_crypto_price(_crypto_price(coin_id, quote), quote)}\n\n"
+        f"💡 Цена проверяется примерно раз в минуту\n"
+        f"🔔 При срабатывании вы получите сообщение",
+        parse_mode='HTML',
+        reply_markup=create_main_reply_keyboard()
+    )
+
 async def handle_alerts_back_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает навигацию назад в процессе создания уведомления"""
     try:
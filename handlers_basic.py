@@ -15,6 +15,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
         log_user_action(user.id, "start_bot")
 
+        # /start - заново с главного меню: выходим из режима ИИ и незаконченных диалогов
+        from handlers_text import clear_user_context
+        clear_user_context(context, user.id)
+
         greeting = f"Привет, {user.first_name}!" if user.first_name else "Привет!"
 
         start_message = (
@@ -30,17 +34,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             '👇 <b>Выберите действие в меню ниже:</b>'
         )
 
-        # Проверяем доступность ИИ
+        # Проверяем доступность ИИ по снимку фоновой проверки - без запроса к API
         from config import DEEPSEEK_API_KEY
-        if DEEPSEEK_API_KEY:
-            try:
-                from api_ai import ask_deepseek
-                test_ai = await ask_deepseek("test", context, fast_check=True)
-                ai_available = not (test_ai.startswith("❌") or test_ai.startswith("⏰"))
-                if not ai_available:
-                    start_message += "\n\n⚠️ <i>ИИ помощник временно недоступен</i>"
-            except:
-                start_message += "\n\n⚠️ <i>ИИ помощник временно недоступен</i>"
+        from health_probe import is_service_up
+        if DEEPSEEK_API_KEY and not is_service_up('deepseek'):
+            start_message += "\n\n⚠️ <i>ИИ помощник временно недоступен</i>"
 
         reply_markup = create_main_reply_keyboard()
         await update.message.reply_text(start_message, parse_mode='HTML', reply_markup=reply_markup)
@@ -57,6 +55,9 @@ async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
         log_user_action(user.id, "stop_command")
 
+        from handlers_text import clear_user_context
+        clear_user_context(context, user.id)
+
         stop_message = (
             f"👋 До свидания, {user_name}!\n\n"
             f"Бот завершил работу для вас.\n"
@@ -82,7 +83,10 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "/start - Главное меню\n"
         "/stop - Завершить работу с ботом\n"
         "/rates - Курсы валют ЦБ РФ\n"
+        "/convert - Конвертер валют (/convert 100 USD EUR)\n"
         "/crypto - Курсы криптовалют\n"
+        "/watch - Мой список криптовалют (/watch BTC TON)\n"
+        "/unwatch - Убрать монету из списка\n"
         "/keyrate - Ключевая ставка ЦБ РФ и RUONIA\n"
         "/ruonia - Ставка RUONIA\n"
         "/ruonia_history - История ставки RUONIA\n"
@@ -98,8 +102,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     if update.effective_user.id in ADMIN_IDS:
         help_text += (
             "\n👑 <b>Команды администратора:</b>\n"
-            "/logs - Показать логи бота\n"
-            "/clearlogs - Очистить логи\n"
+            "/logs [уровень] [module=...] [user=...] [текст] - Логи бота с фильтрами\n"
+            "/clearlogs - Начать новый файл логов\n"
         )
 
     help_text += (
@@ -406,7 +410,7 @@ async def show_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
         # Погода
         from config import WEATHER_API_KEY
-        weather_status = "✅ Настроена" if WEATHER_API_KEY and WEATHER_API_KEY != 'demo_key_12345' else '⚠️ Демо-данные'
+        weather_status = "✅ Настроена" if WEATHER_API_KEY and WEATHER_API_KEY != 'demo_key_12345' else '❌ Не настроена'
         system_info += f"• Погода: {weather_status}\n\n"
 
         # 🔄 ИНФОРМАЦИЯ О КЭШЕ (без загрузки данных)
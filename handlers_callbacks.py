@@ -7,6 +7,7 @@ from handlers_finance import show_currency_rates, show_crypto_rates, show_key_ra
 from handlers_alerts import myalerts_command, show_alerts_menu
 from handlers_ai import show_ai_chat
 from db import clear_user_alerts
+from crypto_alerts import invalidate_crypto_alerts
 from utils import create_main_reply_keyboard
 
 
@@ -21,7 +22,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         if data == 'help':
             await help_command(update, context)
         elif data == 'back_to_main':
-            context.user_data['ai_mode'] = False
+            from handlers_text import clear_user_context
+            clear_user_context(context, update.effective_user.id)
             await show_main_menu(update, context)
         elif data == 'currency_rates':
             await show_currency_rates(update, context)
@@ -47,6 +49,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         elif data == 'clear_all_alerts':
             user_id = update.effective_user.id
             await clear_user_alerts(user_id)
+            invalidate_crypto_alerts()
             await query.edit_message_text(
                 "✅ Все уведомления очищены",
                 reply_markup=create_main_reply_keyboard()
@@ -1,12 +1,21 @@
 # handlers_finance.py - убедимся, что все функции есть
+import asyncio
 import logging
+from functools import partial
 from telegram import Update
 from telegram.ext import ContextTypes
-from config import logger
+from config import logger, CRYPTO_WATCHLIST_LIMIT
+from workers import run_io
+from cache import render_cached, get_cache, force_refresh_cache
 from utils import log_user_action, create_main_reply_keyboard
-from api_currency import get_currency_rates_with_history, format_currency_rates_message
+from api_currency import (
+    get_currency_rates_with_history, format_currency_rates_message,
+    get_conversion_table, parse_conversion_args, format_conversion_message
+)
 from api_keyrate import get_key_rate, format_key_rate_message, format_combined_rates_message
-from api_crypto import get_crypto_rates, get_crypto_rates_fallback, format_crypto_rates_message
+from api_crypto import get_crypto_rates, format_crypto_rates_message
+from crypto_universe import get_watchlist, watch_coins, unwatch_coins, resolve_coin, coin_info, UNIVERSE
+from db import update_user_info
 from api_weather import get_weather_moscow, format_weather_message
 from api_ruonia import get_ruonia_rate, format_ruonia_message, get_ruonia_historical, format_ruonia_historical_message
 
@@ -16,7 +25,9 @@ async def show_currency_rates(update: Update, context: ContextTypes.DEFAULT_TYPE
         log_user_action(update.effective_user.id, "view_currency_rates")
 
         # Используем новую функцию с историей
-        rates_today, date_today, rates_yesterday, changes_yesterday, rates_tomorrow, changes_tomorrow = get_currency_rates_with_history()
+        rates_today, date_today, rates_yesterday, changes_yesterday, rates_tomorrow, changes_tomorrow = await run_io(
+            get_currency_rates_with_history, stage="currency_rates"
+        )
 
         if not rates_today:
             await update.message.reply_text(
@@ -25,9 +36,11 @@ async def show_currency_rates(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
             return
 
-        message = format_currency_rates_message(
+        message = await run_io(
+            render_cached, "currency_rates", format_currency_rates_message,
             rates_today, date_today, rates_yesterday, changes_yesterday,
-            rates_tomorrow, changes_tomorrow
+            rates_tomorrow, changes_tomorrow,
+            stage="render"
         )
         await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
@@ -44,9 +57,11 @@ async def show_key_rate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         loading_message = "🔄 <b>Загружаем данные о ставках...</b>"
         await update.message.reply_text(loading_message, parse_mode='HTML')
 
-        # Получаем обе ставки
-        key_rate_data = get_key_rate()
-        ruonia_data = get_ruonia_rate()
+        # Получаем обе ставки параллельно
+        key_rate_data, ruonia_data = await asyncio.gather(
+            run_io(get_key_rate, stage="key_rate"),
+            run_io(get_ruonia_rate, stage="ruonia_rate")
+        )
 
         if not key_rate_data:
             await update.message.reply_text(
@@ -56,7 +71,8 @@ async def show_key_rate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             return
 
         # Используем комбинированное сообщение
-        message = format_combined_rates_message(key_rate_data, ruonia_data)
+        message = await run_io(render_cached, "key_rate", format_combined_rates_message,
+                               key_rate_data, ruonia_data, stage="render")
         await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
     except Exception as e:
@@ -74,14 +90,24 @@ async def show_crypto_rates(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text(loading_message, parse_mode='HTML')
 
         # Получаем данные
-        crypto_rates = get_crypto_rates()
+        crypto_rates = await run_io(get_crypto_rates, stage="crypto_rates")
 
         if not crypto_rates:
             error_msg = "❌ <b>Не удалось получить курсы криптовалют.</b>"
             await update.message.reply_text(error_msg, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
             return
 
-        message_text = format_crypto_rates_message(crypto_rates)
+        # Свой список - своя отрисовка поверх общего кэша; frozenset меняется только при правке списка.
+        # Ключ - сам список, а не пользователь: одинаковые списки делят одну отрисовку,
+        # поэтому список передается в render, а не аргументом, сравниваемым по идентичности
+        watchlist = get_watchlist(update.effective_user.id)
+        if watchlist:
+            message_text = await run_io(render_cached, f"crypto_rates:{','.join(sorted(watchlist))}",
+                                        partial(format_crypto_rates_message, watchlist=watchlist),
+                                        crypto_rates, stage="render")
+        else:
+            message_text = await run_io(render_cached, "crypto_rates", format_crypto_rates_message,
+                                        crypto_rates, stage="render")
 
         await update.message.reply_text(message_text, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
@@ -99,8 +125,8 @@ async def show_weather(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text(loading_message, parse_mode='HTML')
 
         # Получаем данные о погоде
-        weather_data = get_weather_moscow()
-        message = format_weather_message(weather_data)
+        weather_data = await run_io(get_weather_moscow, stage="weather")
+        message = await run_io(render_cached, "weather", format_weather_message, weather_data, stage="render")
 
         await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
@@ -120,7 +146,7 @@ async def show_ruonia_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         loading_message = "🔄 <b>Загружаем данные о ставке RUONIA...</b>"
         await update.message.reply_text(loading_message, parse_mode='HTML')
 
-        ruonia_data = get_ruonia_rate()
+        ruonia_data = await run_io(get_ruonia_rate, stage="ruonia_rate")
 
         if not ruonia_data:
             await update.message.reply_text(
@@ -129,7 +155,7 @@ async def show_ruonia_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
             return
 
-        message = format_ruonia_message(ruonia_data)
+        message = await run_io(render_cached, "ruonia_rate", format_ruonia_message, ruonia_data, stage="render")
         await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
     except Exception as e:
@@ -146,7 +172,7 @@ async def show_ruonia_history(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(loading_message, parse_mode='HTML')
 
         # Получаем исторические данные (последние 30 дней)
-        historical_data = get_ruonia_historical(days=30)
+        historical_data = await run_io(get_ruonia_historical, days=30, stage="ruonia_historical")
 
         if not historical_data:
             await update.message.reply_text(
@@ -155,9 +181,123 @@ async def show_ruonia_history(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
             return
 
-        message = format_ruonia_historical_message(historical_data)
+        message = await run_io(format_ruonia_historical_message, historical_data, stage="render")
         await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
 
     except Exception as e:
         logger.error(f"Ошибка при показе истории RUONIA: {e}")
-        await update.message.reply_text("❌ Ошибка при получении данных.", reply_markup=create_main_reply_keyboard())
\ No newline at end of file
+        await update.message.reply_text("❌ Ошибка при получении данных.", reply_markup=create_main_reply_keyboard())
+
+CONVERT_USAGE = (
+    "💱 <b>Конвертер валют по курсу ЦБ РФ</b>\n\n"
+    "Использование: <code>/convert 100 USD EUR</code>\n"
+    "Сумма может быть с запятой: <code>/convert 2500,50 RUB CNY</code>"
+)
+
+async def convert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пересчитывает сумму между любыми валютами справочника ЦБ РФ"""
+    try:
+        log_user_action(update.effective_user.id, "convert_currency")
+
+        parsed = parse_conversion_args(context.args or [])
+        if not parsed:
+            await update.message.reply_text(CONVERT_USAGE, parse_mode='HTML')
+            return
+
+        # Матрица уже в памяти - ответ без похода к ЦБ РФ; загрузка только при холодном старте
+        table = get_conversion_table(load_missing=False)
+        if table is None:
+            table = await run_io(get_conversion_table, stage="convert")
+        if table is None:
+            await update.message.reply_text(
+                "❌ Не удалось получить курсы валют ЦБ РФ.",
+                reply_markup=create_main_reply_keyboard()
+            )
+            return
+
+        message = format_conversion_message(table, *parsed)
+        await update.message.reply_text(message, parse_mode='HTML', reply_markup=create_main_reply_keyboard())
+
+    except Exception as e:
+        logger.error(f"Ошибка в команде /convert: {e}")
+        await update.message.reply_text("❌ Ошибка при конвертации.", reply_markup=create_main_reply_keyboard())
+
+def _format_coins(coin_ids) -> str:
+    return ", ".join(coin_info(coin_id)['symbol'] for coin_id in UNIVERSE if coin_id in coin_ids)
+
+def _watchlist_message(watchlist: frozenset) -> str:
+    message = "⭐ <b>Мои криптовалюты:</b> "
+    message += _format_coins(watchlist) if watchlist else "<i>список пуст</i>"
+    message += f"\n\n<b>Доступные монеты:</b> {_format_coins(UNIVERSE)}\n\n"
+    message += "Добавить: <code>/watch BTC TON</code>\nУбрать: <code>/unwatch TON</code>"
+    return message
+
+def _resolve_coins(args: list):
+    """(id монет, нераспознанные аргументы)"""
+    coins, unknown = [], []
+    for arg in args:
+        for item in arg.split(','):
+            if not item.strip():
+                continue
+            coin_id = resolve_coin(item)
+            if coin_id:
+                coins.append(coin_id)
+            else:
+                unknown.append(item.strip())
+    return coins, unknown
+
+async def watch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Добавляет монеты в список отслеживания пользователя"""
+    try:
+        user = update.effective_user
+        log_user_action(user.id, "crypto_watch")
+
+        coins, unknown = _resolve_coins(context.args or [])
+        if unknown:
+            await update.message.reply_text(
+                f"❌ Неизвестные монеты: {', '.join(unknown)}\n\n" + _watchlist_message(get_watchlist(user.id)),
+                parse_mode='HTML'
+            )
+            return
+        if not coins:
+            await update.message.reply_text(_watchlist_message(get_watchlist(user.id)), parse_mode='HTML')
+            return
+
+        await update_user_info(user.id, user.first_name, user.username)
+        result = await watch_coins(user.id, coins)
+        if result is None:
+            await update.message.reply_text(f"❌ В списке может быть не больше {CRYPTO_WATCHLIST_LIMIT} монет.")
+            return
+        added, watchlist = result
+
+        # Монеты, которых еще нет в общем кэше, подтянутся одним обновлением на всех
+        cached_rates = get_cache("crypto_rates")
+        if added and (not cached_rates or any(coin_id not in cached_rates for coin_id in added)):
+            force_refresh_cache("crypto_rates")
+
+        message = f"✅ Добавлено: {_format_coins(added)}\n\n" if added else "ℹ️ Эти монеты уже в списке.\n\n"
+        await update.message.reply_text(message + _watchlist_message(watchlist), parse_mode='HTML')
+
+    except Exception as e:
+        logger.error(f"Ошибка в команде /watch: {e}")
+        await update.message.reply_text("❌ Ошибка при изменении списка.", reply_markup=create_main_reply_keyboard())
+
+async def unwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Убирает монеты из списка отслеживания пользователя"""
+    try:
+        user = update.effective_user
+        log_user_action(user.id, "crypto_unwatch")
+
+        coins, unknown = _resolve_coins(context.args or [])
+        if not coins:
+            prefix = f"❌ Неизвестные монеты: {', '.join(unknown)}\n\n" if unknown else ""
+            await update.message.reply_text(prefix + _watchlist_message(get_watchlist(user.id)), parse_mode='HTML')
+            return
+
+        removed, watchlist = await unwatch_coins(user.id, coins)
+        message = f"🗑 Убрано: {_format_coins(removed)}\n\n" if removed else "ℹ️ Этих монет нет в списке.\n\n"
+        await update.message.reply_text(message + _watchlist_message(watchlist), parse_mode='HTML')
+
+    except Exception as e:
+        logger.error(f"Ошибка в команде /unwatch: {e}")
+        await update.message.reply_text("❌ Ошибка при изменении списка.", reply_markup=create_main_reply_keyboard())
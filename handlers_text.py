@@ -3,8 +3,12 @@ import logging
 from telegram import Update, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
 from config import logger, ADMIN_IDS
-from utils import log_user_action, create_main_reply_keyboard, create_alerts_keyboard
+from utils import (
+    log_user_action, create_main_reply_keyboard, create_alerts_keyboard,
+    menu_button_labels, ai_keyboard_labels
+)
 from db import clear_user_alerts
+from crypto_alerts import invalidate_crypto_alerts
 
 async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик текстовых сообщений для reply-меню"""
@@ -17,6 +21,11 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
 
         logger.info(f"Получено сообщение: '{user_message}' от пользователя {user_id}")
 
+        # Кнопка меню вне клавиатуры ИИ - выход из режима ИИ: его вопросы отменяем
+        if (context.user_data.get('ai_mode') and user_message in menu_button_labels()
+                and user_message not in ai_keyboard_labels()):
+            clear_user_context(context, user_id)
+
         # Обработка административных функций
         if user_message == "👑 Админ-панель" and user_id in ADMIN_IDS:
             from handlers_basic import show_admin_panel
@@ -80,6 +89,7 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
             logger.info(f"Пользователь {user_id} нажал кнопку Очистить все уведомления")
             user_id = update.effective_user.id
             await clear_user_alerts(user_id)
+            invalidate_crypto_alerts()
             await update.message.reply_text(
                 "✅ Все уведомления очищены",
                 reply_markup=create_alerts_keyboard()
@@ -88,7 +98,7 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
 
         elif user_message == "🔙 Главное меню":
             logger.info(f"Пользователь {user_id} нажал кнопку Главное меню")
-            clear_user_context(context)
+            clear_user_context(context, user_id)
             await show_main_menu(update, context)
             return
 
@@ -320,12 +330,19 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
             reply_markup=create_main_reply_keyboard()
         )
 
-def clear_user_context(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Очищает контекст пользователя для быстрого возврата в меню"""
+def clear_user_context(context: ContextTypes.DEFAULT_TYPE, user_id: int = None) -> None:
+    """Очищает контекст пользователя для быстрого возврата в меню.
+
+    С user_id также отменяет его вопросы к ИИ - выполняющийся и ожидающие.
+    """
+    if user_id is not None and context.user_data.get('ai_mode'):
+        from ai_scheduler import cancel_user_requests
+        cancel_user_requests(user_id)
+
     keys_to_clear = [
         'ai_mode', 'creating_alert', 'alert_stage',
         'alert_currency', 'alert_direction', 'alert_direction_display',
-        'waiting_for_ai', 'last_ai_response'
+        'waiting_for_ai', 'last_ai_response', 'ai_memory'
     ]
     for key in keys_to_clear:
         context.user_data.pop(key, None)
@@ -4,29 +4,41 @@ Health check endpoints for Railway deployment
 from aiohttp import web
 import logging
 import os
-import asyncpg
 
 logger = logging.getLogger(__name__)
 
 async def health_check(request):
-    """Basic health check endpoint"""
+    """Basic health check endpoint - reads the background prober snapshot, no I/O per request"""
     try:
-        # Проверка подключения к базе данных
-        database_url = os.getenv('DATABASE_URL')
-        if database_url:
-            conn = await asyncpg.connect(database_url)
-            await conn.close()
+        from health_probe import get_health_snapshot
+
+        snapshot = get_health_snapshot()
+        database = snapshot['services']['database']
+        if not database['checked']:
+            db_status = "⏳ Not checked yet"
+        elif database['ok']:
             db_status = "✅ Connected"
         else:
-            db_status = "⚠️ Not configured"
+            db_status = f"❌ {database['error']}"
         
         return web.json_response({
-            "status": "healthy",
+            "status": "healthy" if snapshot['healthy'] else "unhealthy",
             "service": "telegram-finance-bot",
             "database": db_status,
+            "upstreams": {
+                name: {
+                    "ok": info['ok'],
+                    "latency_ms": info.get('latency_ms'),
+                    "p50_ms": info.get('p50_ms'),
+                    "uptime": info.get('uptime'),
+                    "age_seconds": info.get('age_seconds'),
+                    "error": info.get('error'),
+                }
+                for name, info in snapshot['services'].items()
+            },
             "timestamp": __import__('datetime').datetime.now().isoformat(),
             "version": "1.0.0"
-        })
+        }, status=200 if snapshot['healthy'] else 503)
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return web.json_response({
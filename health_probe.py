@@ -0,0 +1,187 @@
+# health_probe.py - фоновая проверка внешних сервисов и снимок их состояния
+import asyncio
+import time
+from collections import deque
+import aiohttp
+import asyncpg
+from config import (
+    logger, DEEPSEEK_API_BASE, DEEPSEEK_API_KEY, CBR_MIRRORS, COINGECKO_API_BASE, COINGECKO_API_KEY,
+    OPENWEATHER_API_BASE, WEATHER_API_KEY, HEALTH_PROBE_SECONDS, HEALTH_PROBE_TIMEOUT, HEALTH_HISTORY_SIZE
+)
+
+SERVICE_LABELS = {
+    'telegram': 'Telegram',
+    'database': 'PostgreSQL',
+    'cbr': 'ЦБ РФ',
+    'coingecko': 'CoinGecko',
+    'openweather': 'Погода',
+    'deepseek': 'DeepSeek AI',
+}
+
+# Сбой этих сервисов делает бота неработоспособным (HTTP /health отвечает 503)
+CRITICAL_SERVICES = ('telegram', 'database')
+
+# 🔄 СНИМОК СОСТОЯНИЯ: name -> {'ok', 'latency_ms', 'checked_at', 'error', 'passive', 'history': [(ok, мс)]}
+# ok: True - доступен, False - ошибка, None - не настроен (нет ключа)
+# Обработчики только читают снимок - сами запросы идут в фоновой задаче
+_status = {}
+_rounds = {'count': 0, 'last_at': 0.0, 'duration_ms': 0}
+
+def _record(name: str, ok, latency_ms, error: str = None, passive: bool = False):
+    entry = _status.get(name)
+    if entry is None:
+        entry = _status[name] = {'ok': None, 'history': deque(maxlen=HEALTH_HISTORY_SIZE)}
+    previous = entry['ok']
+    entry.update({
+        'ok': ok,
+        'latency_ms': latency_ms,
+        'checked_at': time.time(),
+        'error': error,
+        'passive': passive,
+    })
+    if ok is not None:
+        entry['history'].append((ok, latency_ms))
+
+    if previous is True and ok is False:
+        logger.warning(f"🩺 {SERVICE_LABELS[name]} недоступен: {error}")
+    elif previous is False and ok is True:
+        logger.info(f"🩺 {SERVICE_LABELS[name]} снова доступен ({latency_ms} мс)")
+
+async def _http_probe(session, url: str, headers: dict = None):
+    async with session.get(url, headers=headers) as response:
+        await response.read()
+        return response.status == 200, None if response.status == 200 else f"HTTP {response.status}"
+
+async def _probe_telegram(session, bot):
+    if bot is None:
+        return None, None
+    await bot.get_me()
+    return True, None
+
+async def _probe_database(session, bot):
+    from db import DATABASE_URL
+
+    conn = await asyncpg.connect(DATABASE_URL, timeout=HEALTH_PROBE_TIMEOUT)
+    try:
+        return await conn.fetchval('SELECT 1') == 1, None
+    finally:
+        await conn.close()
+
+async def _probe_cbr(session, bot):
+    return await _http_probe(session, f"{CBR_MIRRORS[0]}scripts/XML_daily.asp")
+
+async def _probe_coingecko(session, bot):
+    from api_crypto import get_quota_usage, note_quota_call
+
+    # Опрос цен и так ходит в CoinGecko - недавний успешный запрос заменяет проверку,
+    # чтобы не тратить месячную квоту Demo-ключа
+    if time.time() - get_quota_usage()['last_ok'] < HEALTH_PROBE_SECONDS:
+        return 'passive', None
+    headers = {'x-cg-demo-api-key': COINGECKO_API_KEY} if COINGECKO_API_KEY else None
+    async with session.get(f"{COINGECKO_API_BASE}/ping", headers=headers) as response:
+        await response.read()
+        note_quota_call(response.status)
+        return response.status == 200, None if response.status == 200 else f"HTTP {response.status}"
+
+async def _probe_openweather(session, bot):
+    if not WEATHER_API_KEY or WEATHER_API_KEY == 'demo_key_12345':
+        return None, None
+    return await _http_probe(session, f"{OPENWEATHER_API_BASE}weather?q=Moscow&appid={WEATHER_API_KEY}")
+
+async def _probe_deepseek(session, bot):
+    if not DEEPSEEK_API_KEY:
+        return None, None
+    return await _http_probe(session, f"{DEEPSEEK_API_BASE}models", {'Authorization': f'Bearer {DEEPSEEK_API_KEY}'})
+
+_PROBES = {
+    'telegram': _probe_telegram,
+    'database': _probe_database,
+    'cbr': _probe_cbr,
+    'coingecko': _probe_coingecko,
+    'openweather': _probe_openweather,
+    'deepseek': _probe_deepseek,
+}
+
+async def _run_probe(name: str, probe, session, bot):
+    started = time.monotonic()
+    try:
+        ok, error = await asyncio.wait_for(probe(session, bot), HEALTH_PROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        ok, error = False, f"нет ответа за {HEALTH_PROBE_TIMEOUT:g} сек."
+    except Exception as e:
+        ok, error = False, str(e) or type(e).__name__
+    latency_ms = int((time.monotonic() - started) * 1000)
+    if ok == 'passive':
+        _record(name, True, None, passive=True)
+    else:
+        _record(name, ok, latency_ms if ok is not None else None, error)
+
+async def probe_all(bot=None):
+    """Один раунд проверок: все сервисы параллельно"""
+    started = time.monotonic()
+    timeout = aiohttp.ClientTimeout(total=HEALTH_PROBE_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(_run_probe(name, probe, session, bot) for name, probe in _PROBES.items()))
+    _rounds['count'] += 1
+    _rounds['last_at'] = time.time()
+    _rounds['duration_ms'] = int((time.monotonic() - started) * 1000)
+
+async def probe_services_job(context):
+    """Задача JobQueue: раунд проверок по интервалу HEALTH_PROBE_SECONDS"""
+    try:
+        await probe_all(context.bot)
+    except Exception as e:
+        logger.error(f"❌ Ошибка фоновой проверки сервисов: {e}")
+
+def is_service_up(name: str) -> bool:
+    """Доступен ли сервис по последней проверке; до первой проверки - считаем доступным"""
+    entry = _status.get(name)
+    return entry is None or entry['ok'] is not False
+
+def get_health_snapshot() -> dict:
+    """Состояние сервисов с историей задержек - без сетевых запросов"""
+    now = time.time()
+    services = {}
+    for name in _PROBES:
+        entry = _status.get(name)
+        if entry is None:
+            services[name] = {'ok': None, 'checked': False}
+            continue
+        history = entry['history']
+        latencies = sorted(latency for ok, latency in history if ok and latency is not None)
+        services[name] = {
+            'ok': entry['ok'],
+            'checked': True,
+            'latency_ms': entry['latency_ms'],
+            'age_seconds': int(now - entry['checked_at']),
+            'error': entry['error'],
+            'passive': entry['passive'],
+            'p50_ms': latencies[(len(latencies) - 1) // 2] if latencies else None,
+            'max_ms': latencies[-1] if latencies else None,
+            'uptime': (sum(1 for ok, _ in history if ok) / len(history) * 100) if history else None,
+            'checks': len(history),
+        }
+    return {
+        'services': services,
+        'rounds': _rounds['count'],
+        'last_round_age': int(now - _rounds['last_at']) if _rounds['last_at'] else None,
+        'round_ms': _rounds['duration_ms'],
+        'healthy': all(services[name]['ok'] is not False for name in CRITICAL_SERVICES),
+    }
+
+def format_service_line(name: str, info: dict) -> str:
+    """Строка для /status"""
+    label = SERVICE_LABELS[name]
+    if not info['checked']:
+        return f"• {label}: ⏳ еще не проверялся"
+    if info['ok'] is None:
+        return f"• {label}: ⚪ не настроен"
+    if info['ok'] is False:
+        return f"• {label}: ❌ {info['error']} ({info['age_seconds']} сек. назад)"
+    if info['passive']:
+        line = f"• {label}: ✅ по рабочим запросам"
+    else:
+        line = f"• {label}: ✅ {info['latency_ms']} мс"
+    if info['p50_ms'] is not None and info['checks'] > 1:
+        line += f" (медиана {info['p50_ms']}, макс. {info['max_ms']} мс, доступность {info['uptime']:.0f}%)"
+    return line
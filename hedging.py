@@ -0,0 +1,62 @@
+# hedging.py - параллельные (hedged) запросы к нескольким путям получения данных
+from concurrent.futures import wait, FIRST_COMPLETED
+from config import logger, HEDGE_DELAY_SECONDS
+from workers import fanout_executor
+
+# Общий пул для запасных запросов; requests блокирующий, поэтому потоки
+HEDGE_WORKERS = 8
+
+def hedged_call(attempts: list, delay: float = HEDGE_DELAY_SECONDS, validate=None, name: str = "запрос"):
+    """Выполняет попытки с подстраховкой и возвращает первый валидный результат.
+
+    attempts - список (метка, функция без аргументов) в порядке приоритета.
+    Первая попытка стартует сразу; следующая - через delay секунд без ответа
+    или сразу после ошибки/невалидного результата предыдущей.
+    Невыполненные попытки отменяются, уже идущие HTTP-запросы дорабатывают
+    в фоне (их ограничивает таймаут requests), а их результат отбрасывается.
+    Возвращает None, если ни одна попытка не дала валидного результата.
+    """
+    if validate is None:
+        validate = lambda result: result is not None
+
+    pending = {}
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        label, func = attempts[next_index]
+        next_index += 1
+        pending[fanout_executor('hedge', HEDGE_WORKERS).submit(func)] = label
+        if next_index > 1:
+            logger.info(f"🏁 {name}: запускаем запасной путь {label}")
+
+    launch()
+    while pending:
+        timeout = delay if next_index < len(attempts) else None
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            # Основной путь отвечает слишком долго - подстраховываемся
+            launch()
+            continue
+
+        for future in done:
+            label = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"❌ {name}: путь {label} завершился ошибкой: {e}")
+                result = None
+
+            if result is not None and validate(result):
+                for other in pending:
+                    other.cancel()
+                logger.debug(f"✅ {name}: первым ответил путь {label}")
+                return result
+
+        # Ответившие пути неудачны - не ждем задержку, пробуем следующий
+        if next_index < len(attempts):
+            launch()
+
+    logger.error(f"❌ {name}: все пути получения данных неудачны")
+    return None
@@ -0,0 +1,149 @@
+# http_client.py - общий HTTP-клиент для внешних источников данных
+import hashlib
+import threading
+import requests
+from collections import OrderedDict
+from urllib.parse import urlparse
+from config import logger
+from circuit_breaker import get_breaker
+
+# Источники данных (имена размыкателей)
+SOURCE_CBR = 'cbr'
+SOURCE_COINGECKO = 'coingecko'
+SOURCE_OPENWEATHER = 'openweather'
+
+SOURCE_LABELS = {
+    SOURCE_CBR: 'ЦБ РФ',
+    SOURCE_COINGECKO: 'CoinGecko',
+    SOURCE_OPENWEATHER: 'OpenWeatherMap',
+}
+
+def mirror_breaker(source: str, base_url: str) -> str:
+    """Имя размыкателя для конкретного зеркала источника: 'cbr:cbr.ru'"""
+    return f"{source}:{urlparse(base_url).netloc}"
+
+def source_label(name: str) -> str:
+    """Человекочитаемое имя источника или его зеркала"""
+    source, _, host = name.partition(':')
+    label = SOURCE_LABELS.get(source, source)
+    return f"{label} ({host})" if host else label
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Источник помечен недоступным - запрос не отправлялся"""
+
+# 🔄 УСЛОВНЫЕ ЗАПРОСЫ: (url, params) -> {'etag', 'last_modified', 'hash', 'body'}
+MAX_VALIDATORS = 256
+_validators = OrderedDict()
+_conditional_stats = {}   # source -> счетчики условных запросов
+_validators_lock = threading.Lock()
+
+def _validator_key(url: str, params) -> tuple:
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    return url, params
+
+def _stats_for(source: str) -> dict:
+    stats = _conditional_stats.get(source)
+    if stats is None:
+        stats = _conditional_stats[source] = {
+            'requests': 0, 'not_modified': 0, 'unchanged': 0,
+            'bytes_received': 0, 'bytes_saved': 0,
+        }
+    return stats
+
+def _prepare_conditional(key: tuple, kwargs: dict):
+    """Добавляет If-None-Match / If-Modified-Since, если ответ уже видели"""
+    with _validators_lock:
+        entry = _validators.get(key)
+    if not entry:
+        return None
+    headers = dict(kwargs.get('headers') or {})
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    kwargs['headers'] = headers
+    return entry
+
+def _apply_conditional(source: str, key: tuple, entry, response: requests.Response):
+    """Отмечает response.unchanged: 304 или тело с тем же хэшем, что в прошлый раз.
+
+    На 304 подставляем сохраненное тело, чтобы вызывающий код не отличал этот случай.
+    """
+    stats = _stats_for(source)
+    stats['requests'] += 1
+    response.unchanged = False
+
+    if response.status_code == 304 and entry:
+        response._content = entry['body']
+        response.status_code = 200
+        response.unchanged = True
+        stats['not_modified'] += 1
+        stats['bytes_saved'] += len(entry['body'])
+        return
+
+    if response.status_code != 200:
+        return
+
+    body = response.content
+    digest = hashlib.sha256(body).digest()
+    stats['bytes_received'] += len(body)
+    if entry and entry['hash'] == digest:
+        response.unchanged = True
+        stats['unchanged'] += 1
+
+    with _validators_lock:
+        _validators[key] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'hash': digest,
+            'body': body,
+        }
+        _validators.move_to_end(key)
+        while len(_validators) > MAX_VALIDATORS:
+            _validators.popitem(last=False)
+
+def get_conditional_stats() -> dict:
+    """Счетчики условных запросов по источникам для админ-команд"""
+    return {source: dict(stats) for source, stats in _conditional_stats.items()}
+
+def _is_failure_status(status_code: int) -> bool:
+    """Ошибки, говорящие о недоступности источника (а не о нашем запросе)"""
+    return status_code == 429 or status_code >= 500
+
+def http_get(source: str, url: str, breaker_name: str = None, conditional: bool = False,
+             **kwargs) -> requests.Response:
+    """GET-запрос через размыкатель цепи источника.
+
+    breaker_name позволяет вести отдельный размыкатель для зеркала (см. mirror_breaker).
+    При разомкнутой цепи сразу бросает CircuitOpenError вместо ожидания таймаута.
+    Сетевые ошибки, 429 и 5xx учитываются как отказы источника.
+
+    conditional=True - условный запрос по сохраненным ETag/Last-Modified;
+    response.unchanged показывает, что данные не изменились (304 или тот же хэш тела).
+    """
+    breaker = get_breaker(breaker_name or source)
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"источник {breaker.name} временно недоступен")
+
+    entry = None
+    if conditional:
+        key = _validator_key(url, kwargs.get('params'))
+        entry = _prepare_conditional(key, kwargs)
+
+    try:
+        response = requests.get(url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        breaker.record_failure(type(e).__name__)
+        raise
+
+    if _is_failure_status(response.status_code):
+        breaker.record_failure(f"HTTP {response.status_code}")
+    else:
+        breaker.record_success()
+
+    if conditional:
+        _apply_conditional(source, key, entry, response)
+
+    logger.debug(f"🌐 {source}: {url} -> {response.status_code}")
+    return response
@@ -1,9 +1,58 @@
 import logging
+import asyncio
+import time
 from telegram.ext import ContextTypes
 from datetime import datetime
 from config import logger
 # Обновляем импорты
 from notifications import check_alerts, send_daily_rates, send_daily_weather
+from cache import pop_due_keys, get_next_deadline, get_refresher
+from snapshots import flush_snapshots
+from timeseries import flush_timeseries
+from workers import run_io
+from crypto_alerts import poll_crypto_alerts
+from health_probe import probe_services_job
+from config import HEALTH_PROBE_SECONDS
+
+# Границы таймера проактивного обновления кэша (секунды)
+CACHE_TIMER_MIN_DELAY = 1
+CACHE_TIMER_MAX_DELAY = 300
+
+async def refresh_expired_cache(context: ContextTypes.DEFAULT_TYPE):
+    """Обновляет истекшие записи кэша и взводит таймер на следующий дедлайн"""
+    try:
+        for key in pop_due_keys():
+            refresher = get_refresher(key)
+            if not refresher:
+                continue
+            try:
+                # Фетчеры синхронные - выполняем их в пуле вне event loop
+                await run_io(refresher, stage=f"refresh:{key}")
+                logger.info(f"⏰ Кэш {key} обновлен по дедлайну")
+            except Exception as e:
+                logger.error(f"❌ Ошибка проактивного обновления {key}: {e}")
+    finally:
+        schedule_cache_timer(context.job_queue)
+
+async def flush_snapshots_job(context: ContextTypes.DEFAULT_TYPE):
+    """Сохраняет накопленные снимки данных и точки временных рядов в БД"""
+    try:
+        await flush_snapshots()
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения снимков данных: {e}")
+    try:
+        await flush_timeseries()
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения временных рядов: {e}")
+
+def schedule_cache_timer(job_queue):
+    """Ставит одноразовый таймер на ближайший дедлайн кэша"""
+    next_deadline = get_next_deadline()
+    if next_deadline is None:
+        delay = CACHE_TIMER_MAX_DELAY
+    else:
+        delay = min(max(next_deadline - time.time(), CACHE_TIMER_MIN_DELAY), CACHE_TIMER_MAX_DELAY)
+    job_queue.run_once(refresh_expired_cache, when=delay, name="cache_refresh_timer")
 
 def setup_jobs(application):
     """Настройка фоновых задач"""
@@ -32,10 +81,26 @@ def setup_jobs(application):
             # Проверка уведомлений каждые 30 минут
             job_queue.run_repeating(check_alerts, interval=1800, first=10, name="check_alerts")
 
+            # Опрос цен для уведомлений по криптовалютам: интервал подстраивается под квоту CoinGecko
+            job_queue.run_once(poll_crypto_alerts, when=30, name="crypto_alert_poller")
+
+            # Таймер проактивного обновления кэша по куче дедлайнов
+            job_queue.run_once(refresh_expired_cache, when=60, name="cache_refresh_timer")
+
+            # Сохранение снимков и временных рядов в БД каждые 5 минут
+            job_queue.run_repeating(flush_snapshots_job, interval=300, first=120, name="flush_snapshots")
+
+            # Фоновая проверка внешних сервисов: первый раунд сразу после запуска
+            job_queue.run_repeating(probe_services_job, interval=HEALTH_PROBE_SECONDS, first=1, name="health_probe")
+
             logger.info("✅ Фоновые задачи настроены")
             logger.info("   📅 Ежедневная рассылка курсов: 15:00 МСК (12:00 UTC)")
             logger.info("   🌤️ Ежедневная рассылка погоды: 10:00 МСК (07:00 UTC)")
             logger.info("   🔔 Проверка уведомлений: каждые 30 минут")
+            logger.info("   ₿ Уведомления по криптовалютам: опрос от 1 минуты по квоте CoinGecko")
+            logger.info("   ⏰ Проактивное обновление кэша: по дедлайнам записей")
+            logger.info("   💾 Сохранение снимков данных и временных рядов: каждые 5 минут")
+            logger.info(f"   🩺 Проверка внешних сервисов: каждые {HEALTH_PROBE_SECONDS} сек.")
 
         else:
             logger.warning("❌ JobQueue не доступен - фоновые задачи отключены")
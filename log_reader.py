@@ -0,0 +1,236 @@
+# log_reader.py - хвост и поиск по логам без чтения файлов целиком
+import json
+import logging
+import os
+import re
+import threading
+
+BLOCK_SIZE = 64 * 1024
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+# 🔄 РАЗБОР СТРОК
+# Текстовый формат из logging_setup.TEXT_FORMAT; [модуль] в старых строках отсутствует
+TEXT_LINE = re.compile(r'^\d{4}-\d\d-\d\d [\d:,]+ - (\S+) - ([A-Z]+) - (?:\[(\w+)\] )?')
+
+def parse_line(line: str):
+    """(уровень, модуль) для первой строки записи или None для продолжения (traceback)"""
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+            return entry.get('level', ''), entry.get('module') or entry.get('logger', '')
+        except ValueError:
+            return None
+    match = TEXT_LINE.match(line)
+    if not match:
+        return None
+    name, level, module = match.groups()
+    return level, module or name
+
+def log_files(log_file: str) -> list:
+    """Текущий файл и ротированные копии (bot.log, bot.log.1, ...) - от новых к старым"""
+    files = []
+    if os.path.exists(log_file):
+        files.append(log_file)
+    index = 1
+    while os.path.exists(f"{log_file}.{index}"):
+        files.append(f"{log_file}.{index}")
+        index += 1
+    return files
+
+# 🔄 РАЗРЕЖЕННЫЙ ИНДЕКС
+# Для каждого прочитанного блока файла запоминаем максимальный уровень и
+# модули записей, которые в нем начинаются. Поиск с фильтром по уровню или
+# модулю пропускает блоки, где заведомо нечего искать, не читая их.
+# Файл логов только дописывается, а при ротации переименовывается с тем же
+# inode - поэтому ключ (устройство, inode) переживает ротацию.
+_index = {}            # (st_dev, st_ino) -> {'size': ..., 'blocks': {номер блока: (макс. уровень, модули)}}
+_index_lock = threading.Lock()
+
+def _file_index(stat) -> dict:
+    """Блоки файла; если файл обрезали на месте, старый индекс недействителен"""
+    with _index_lock:
+        entry = _index.get((stat.st_dev, stat.st_ino))
+        if entry is None or stat.st_size < entry['size']:
+            entry = _index[(stat.st_dev, stat.st_ino)] = {'size': 0, 'blocks': {}}
+        entry['size'] = stat.st_size
+        return entry['blocks']
+
+def forget_missing(files: list):
+    """Убирает индексы удаленных файлов"""
+    alive = set()
+    for path in files:
+        try:
+            stat = os.stat(path)
+            alive.add((stat.st_dev, stat.st_ino))
+        except OSError:
+            continue
+    with _index_lock:
+        for key in list(_index):
+            if key not in alive:
+                del _index[key]
+
+def _block_may_match(summary, min_level: int, module: str) -> bool:
+    max_level, modules = summary
+    if max_level < min_level:
+        return False
+    return not module or module in modules
+
+def _read_record_tail(f, offset: int, limit: int = 1024 * 1024) -> bytes:
+    """Конец записи, начавшейся до offset: хвост строки и строки traceback за ним"""
+    f.seek(offset)
+    tail = f.readline(limit)
+    while len(tail) < limit:
+        position = f.tell()
+        line = f.readline(limit)
+        if not line or parse_line(line.decode('utf-8', errors='replace')) is not None:
+            f.seek(position)
+            break
+        tail += line
+    return tail.rstrip(b'\n')
+
+def iter_records_reverse(path: str, min_level: int = 0, module: str = None,
+                         block_size: int = BLOCK_SIZE, stats: dict = None):
+    """Записи файла от конца к началу: блоки фиксированного размера читаются
+    с конца через seek, многострочные записи собираются вместе с traceback.
+    """
+    stat = os.stat(path)
+    index = _file_index(stat)
+    size = stat.st_size
+    if stats is None:
+        stats = {}
+    stats.setdefault('scanned_bytes', 0)
+    stats.setdefault('skipped_blocks', 0)
+
+    with open(path, 'rb') as f:
+        carry = b''            # начало строки, уже прочитанное из следующего блока
+        skipped = False
+        block = (size - 1) // block_size if size else -1
+        while block >= 0:
+            start = block * block_size
+            complete = start + block_size <= size
+            summary = index.get(block)
+            if summary is not None and not _block_may_match(summary, min_level, module):
+                stats['skipped_blocks'] += 1
+                carry = b''
+                skipped = True
+                block -= 1
+                continue
+            if skipped:
+                # Последняя строка этого блока продолжается в пропущенном
+                carry = _read_record_tail(f, start + block_size)
+                skipped = False
+
+            f.seek(start)
+            data = f.read(min(block_size, size - start)) + carry
+            stats['scanned_bytes'] += len(data) - len(carry)
+            lines = data.split(b'\n')
+            # Первый кусок начинается в предыдущем блоке - дочитаем его там
+            carry = lines[0] if start > 0 else b''
+            first = 1 if start > 0 else 0
+
+            max_level = 0
+            modules = set()
+            pending = []       # строки продолжения (traceback) над заголовком
+            records = []
+            for raw in reversed(lines[first:]):
+                line = raw.decode('utf-8', errors='replace').rstrip('\r')
+                if not line:
+                    continue
+                parsed = parse_line(line)
+                if parsed is None:
+                    pending.append(line)
+                    continue
+                level, record_module = parsed
+                levelno = logging.getLevelName(level)
+                levelno = levelno if isinstance(levelno, int) else 0
+                max_level = max(max_level, levelno)
+                modules.add(record_module)
+                text = '\n'.join([line] + pending[::-1])
+                pending = []
+                records.append((levelno, record_module, text))
+            if pending and start == 0:
+                records.append((0, '', '\n'.join(pending[::-1])))
+            elif pending:
+                # Продолжение записи из предыдущего блока - вернем его в carry
+                carry = carry + b'\n' + '\n'.join(pending[::-1]).encode('utf-8')
+
+            if complete and block not in index:
+                index[block] = (max_level, frozenset(modules))
+            for record in records:
+                yield record
+            block -= 1
+
+def search_logs(log_file: str, limit: int = 20, level: str = None, module: str = None,
+                user_id: int = None, pattern: str = None, max_scan_bytes: int = 64 * 1024 * 1024,
+                block_size: int = BLOCK_SIZE) -> dict:
+    """Последние limit записей, подходящих под фильтры, по всем ротированным файлам.
+
+    Без фильтров читается столько блоков с конца, сколько нужно на limit
+    записей. С фильтрами просмотр ограничен max_scan_bytes, поэтому цена
+    запроса не растет с объемом логов.
+    """
+    min_level = logging.getLevelName(level.upper()) if level else 0
+    if not isinstance(min_level, int):
+        raise ValueError(f"Неизвестный уровень: {level}")
+    regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+    user_regex = re.compile(rf'(?<!\d){int(user_id)}(?!\d)') if user_id else None
+
+    files = log_files(log_file)
+    forget_missing(files)
+    stats = {'scanned_bytes': 0, 'skipped_blocks': 0}
+    found = []
+    truncated = False
+    for path in files:
+        for levelno, record_module, text in iter_records_reverse(path, min_level, module, block_size, stats):
+            # Предел проверяется до фильтров: запрос без совпадений тоже не читает логи до конца
+            if stats['scanned_bytes'] > max_scan_bytes:
+                truncated = True
+                break
+            if levelno < min_level or (module and record_module != module):
+                continue
+            if user_regex and not user_regex.search(text):
+                continue
+            if regex and not regex.search(text):
+                continue
+            found.append(text)
+            if len(found) >= limit:
+                break
+        if len(found) >= limit or truncated:
+            break
+
+    found.reverse()
+    return {
+        'records': found,
+        'files': len(files),
+        'scanned_bytes': stats['scanned_bytes'],
+        'skipped_blocks': stats['skipped_blocks'],
+        'truncated': truncated,
+    }
+
+def parse_log_query(args: list) -> dict:
+    """Аргументы /logs: 'ERROR module=api_crypto user=123 n=50 таймаут'
+
+    Слово-уровень задает минимальный уровень, key=value - фильтры
+    (level, module, user, n), остальное - регулярное выражение.
+    """
+    query = {'limit': 20, 'level': None, 'module': None, 'user_id': None, 'pattern': None}
+    words = []
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        key = key.lower()
+        if sep and key in ('level', 'module', 'user', 'n'):
+            if key == 'level':
+                query['level'] = value.upper()
+            elif key == 'module':
+                query['module'] = value
+            elif key == 'user':
+                query['user_id'] = int(value)
+            else:
+                query['limit'] = max(1, min(int(value), 100))
+        elif arg.upper() in LEVELS and query['level'] is None:
+            query['level'] = arg.upper()
+        else:
+            words.append(arg)
+    if words:
+        query['pattern'] = ' '.join(words)
+    return query
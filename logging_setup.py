@@ -0,0 +1,193 @@
+# logging_setup.py - неблокирующее логирование: очередь, ротация, JSON, уровни по модулям, сэмплирование
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# [модуль] нужен для фильтра /logs: модули бота пишут в общий логгер config
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(module)s] %(message)s'
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON: удобно для сборщиков логов и поиска"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def parse_levels(spec: str) -> dict:
+    """'httpx=WARNING,notifications=DEBUG' -> {'httpx': 30, 'notifications': 10}"""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+class ModuleLevelFilter(logging.Filter):
+    """Уровень по модулю-источнику записи.
+
+    Модули бота пишут в общий логгер из config, поэтому кроме имени логгера
+    смотрим и на имя файла (record.module): 'api_crypto=WARNING'. Остальные
+    записи отсекаются по общему уровню - логгеры пропускают и более низкие,
+    если какой-то модуль включен подробнее (handlers_ai=DEBUG).
+    """
+
+    def __init__(self, levels: dict, default: int = logging.INFO):
+        super().__init__()
+        self.levels = levels
+        self.default = default
+
+    def level_for(self, record: logging.LogRecord) -> int:
+        level = self.levels.get(record.module)
+        if level is not None:
+            return level
+        name = record.name
+        while name:
+            level = self.levels.get(name)
+            if level is not None:
+                return level
+            name = name.rpartition('.')[0]
+        return self.default
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level_for(record)
+
+class SamplingFilter(logging.Filter):
+    """Ограничивает частые сообщения ниже WARNING: не больше burst записей
+    с одной строки кода за window секунд. О пропущенных сообщает первая
+    запись следующего окна.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}       # (модуль, строка) -> [начало окна, записей, пропущено]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0 or record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                dropped = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.getMessage()} (+{dropped} похожих за {self.window:g} сек. пропущено)"
+                    record.args = None
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            self.suppressed += 1
+            return False
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Если очередь переполнена (диск не успевает), запись теряется, а не блокирует вызывающий код"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+_state = {'listener': None, 'handler': None, 'sampler': None, 'queue': None, 'file_handler': None}
+
+def setup_logging(log_file: str, level: str = 'INFO', fmt: str = 'text', levels: str = '',
+                  max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3,
+                  sample_burst: int = 20, sample_window: float = 60.0, queue_size: int = 10000,
+                  app_logger: str = 'config'):
+    """Записи уходят в очередь в вызывающем потоке, а stdout и файл с ротацией
+    пишет отдельный поток QueueListener - event loop не ждет диска.
+    """
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    for handler in (stream_handler, file_handler):
+        handler.setFormatter(formatter)
+
+    module_levels = parse_levels(levels)
+    default_level = logging.getLevelName(level.upper())
+    if not isinstance(default_level, int):
+        default_level = logging.INFO
+    # Логгеры не должны отбрасывать записи раньше фильтра: порог - самый низкий из уровней
+    lowest_level = min([default_level, *module_levels.values()])
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    sampler = SamplingFilter(sample_burst, sample_window)
+    queue_handler.addFilter(ModuleLevelFilter(module_levels, default_level))
+    queue_handler.addFilter(sampler)
+
+    if _state['listener'] is not None:
+        stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(lowest_level)
+    logging.getLogger(app_logger).setLevel(lowest_level)
+    # Имена логгеров библиотек (httpx, apscheduler) настраиваем и напрямую;
+    # общий логгер модулей бота оставляем на нижнем пороге
+    for name, module_level in module_levels.items():
+        if name != app_logger:
+            logging.getLogger(name).setLevel(module_level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+    _state.update(listener=listener, handler=queue_handler, sampler=sampler, queue=log_queue,
+                  file_handler=file_handler)
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток записи"""
+    listener = _state['listener']
+    if listener is not None:
+        _state['listener'] = None
+        listener.stop()
+
+def rotate_log_file() -> bool:
+    """Начинает новый файл логов через ротацию вместо обрезки под работающим обработчиком"""
+    file_handler = _state['file_handler']
+    if file_handler is None:
+        return False
+    # Тот же замок, что берет emit() в потоке записи
+    file_handler.acquire()
+    try:
+        file_handler.doRollover()
+    finally:
+        file_handler.release()
+    return True
+
+def get_logging_stats() -> dict:
+    """Для админ-команд"""
+    log_queue = _state['queue']
+    sampler = _state['sampler']
+    return {
+        'queued': log_queue.qsize() if log_queue else 0,
+        'dropped': DroppingQueueHandler.dropped,
+        'sampled_out': sampler.suppressed if sampler else 0,
+    }
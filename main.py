@@ -3,7 +3,8 @@ import logging
 import asyncio
 import sys
 import os
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
+from telegram import Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters
 from telegram.error import Conflict
 from config import TOKEN, logger
 from db import init_db
@@ -16,7 +17,8 @@ from handlers_basic import (
 )
 from handlers_finance import (
     show_currency_rates, show_key_rate, show_crypto_rates, show_weather,
-    show_ruonia_command, show_ruonia_history
+    show_ruonia_command, show_ruonia_history, convert_command,
+    watch_command, unwatch_command
 )
 from handlers_alerts import (
     alert_command, myalerts_command, show_alerts_menu
@@ -31,6 +33,7 @@ from handlers_admin import (
 from handlers_text import handle_text_messages
 from handlers_callbacks import button_handler
 from jobs import setup_jobs
+from flood_control import flood_guard
 
 async def post_init(application):
     """Инициализация после запуска бота"""
@@ -42,6 +45,18 @@ async def post_init(application):
         init_cache()
         logger.info("✅ База данных и кэш инициализированы")
 
+        # 💾 ВОССТАНАВЛИВАЕМ ПОСЛЕДНИЕ УСПЕШНЫЕ ДАННЫЕ ДО ПЕРВЫХ ЗАПРОСОВ
+        from snapshots import load_snapshots
+        await load_snapshots()
+
+        # 📈 ПОДНИМАЕМ В ПАМЯТЬ ПОСЛЕДНИЕ ТОЧКИ ВРЕМЕННЫХ РЯДОВ
+        from timeseries import load_timeseries
+        await load_timeseries()
+
+        # ₿ СПИСКИ ОТСЛЕЖИВАНИЯ - ДО ПЕРВОГО ЗАПРОСА КРИПТОВАЛЮТ
+        from crypto_universe import load_watchlists
+        await load_watchlists()
+
         # 🔄 ПРЕДВАРИТЕЛЬНО ЗАГРУЖАЕМ ДАННЫЕ В КЭШ ПРИ ЗАПУСКЕ
         from handlers_admin import preload_cache_data
         await preload_cache_data()
@@ -50,14 +65,23 @@ async def post_init(application):
         logger.error(f"❌ Ошибка инициализации кэша: {e}")
         logger.info("✅ База данных инициализирована (кэш отключен)")
 
-    # Логируем информацию о здоровье системы
-    try:
-        from health_check import check_bot_health
-        bot_health = check_bot_health()
-        logger.info(f"Health check - Bot: {'✅' if bot_health else '❌'}")
-        logger.info("Database health check skipped during startup")
-    except Exception as e:
-        logger.warning(f"Health check failed: {e}")
+    # 🩺 HTTP /health ДЛЯ RAILWAY: отвечает из снимка фоновой проверки сервисов
+    # (первый раунд проверки запускает JobQueue, см. jobs.setup_jobs)
+    if os.getenv('PORT'):
+        try:
+            from health import start_health_server
+            application.bot_data['health_runner'] = await start_health_server()
+        except Exception as e:
+            logger.warning(f"Health check server failed to start: {e}")
+
+async def post_shutdown(application):
+    """Остановка фоновых исполнителей при завершении бота"""
+    from workers import shutdown_workers
+    shutdown_workers()
+
+    health_runner = application.bot_data.get('health_runner')
+    if health_runner is not None:
+        await health_runner.cleanup()
 
 def error_handler(update, context):
     """Обработчик ошибок"""
@@ -78,11 +102,14 @@ def main():
             sys.exit(1)
 
         # Создаем приложение
-        application = Application.builder().token(TOKEN).post_init(post_init).build()
+        application = Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
 
         # Добавляем обработчик ошибок
         application.add_error_handler(error_handler)
 
+        # 🚦 ОГРАНИЧЕНИЕ ЧАСТОТЫ: группа -1 проверяется раньше всех обработчиков
+        application.add_handler(TypeHandler(Update, flood_guard), group=-1)
+
         # Регистрация обработчиков команд
         # Основные команды
         application.add_handler(CommandHandler("start", start))
@@ -98,6 +125,9 @@ def main():
         application.add_handler(CommandHandler("weather", show_weather))
         application.add_handler(CommandHandler("ruonia", show_ruonia_command))
         application.add_handler(CommandHandler("ruonia_history", show_ruonia_history))
+        application.add_handler(CommandHandler("convert", convert_command))
+        application.add_handler(CommandHandler("watch", watch_command))
+        application.add_handler(CommandHandler("unwatch", unwatch_command))
 
         # Команды уведомлений
         application.add_handler(CommandHandler("alert", alert_command))
@@ -7,50 +7,126 @@ from api_currency import get_currency_rates_with_tomorrow, get_currency_rates_wi
 from api_keyrate import get_key_rate
 from api_weather import get_weather_moscow, format_weather_message
 from api_ruonia import get_ruonia_rate  # Добавляем импорт RUONIA
+from workers import run_io, run_cpu
+from alert_index import match_alerts, alert_pair, CHANGE_DIRECTIONS
+from rolling import window_values, window_stats, sync_windows, format_window
+from crypto_universe import is_coin, coin_info
+
+CHANGE_LABELS = {'rise': 'вырос', 'drop': 'упал', 'move': 'изменился'}
+
+def _format_change_alert(alert, percent: float, pair: str, unit: str, subject: str) -> str:
+    """Сообщение об изменении за окно: процент и цены окна"""
+    direction = alert['direction']
+    window = format_window(alert['window_seconds'])
+    message = (
+        f"🔔 <b>УВЕДОМЛЕНИЕ СРАБОТАЛО!</b>\n\n"
+        f"💱 <b>Пара:</b> {pair}\n"
+        f"📊 <b>Условие:</b> {subject} {CHANGE_LABELS[direction]} на {alert['threshold']}% за {window}\n"
+        f"{'📈' if direction == 'rise' else '📉' if direction == 'drop' else '↕️'} "
+        f"<b>Изменение:</b> {percent:.2f}%\n"
+    )
+    stats = window_stats(alert_pair(alert), alert['window_seconds'])
+    if stats:
+        digits = 2 if stats['min'] >= 1 else 6
+        message += (
+            f"💹 <b>Сейчас:</b> {stats['current']:,.{digits}f} {unit}\n"
+            f"   <i>за {window}: мин. {stats['min']:,.{digits}f}, макс. {stats['max']:,.{digits}f}, "
+            f"среднее {stats['avg']:,.{digits}f} {unit}</i>\n"
+        )
+    return message + "\n✅ <i>Уведомление выполнено и удалено.</i>"
+
+def format_triggered_alert(alert, current_rate: float) -> str:
+    """Сообщение о сработавшем уведомлении (валюты ЦБ РФ и криптовалюты)"""
+    from_curr = alert['from_currency']
+    to_curr = alert['to_currency']
+    threshold = alert['threshold']
+    direction = alert['direction']
+
+    if is_coin(from_curr):
+        pair = f"{coin_info(from_curr)['symbol']}/{to_curr}"
+        unit = "$" if to_curr == 'USD' else "руб."
+        subject = "цена"
+        current = f"{current_rate:,.2f} {unit}" if current_rate >= 1 else f"{current_rate:.6f} {unit}"
+    else:
+        pair = f"{from_curr}/RUB"
+        unit = "руб."
+        subject = "курс"
+        current = f"{current_rate:.2f} {unit}"
+
+    if direction in CHANGE_DIRECTIONS:
+        return _format_change_alert(alert, current_rate, pair, unit, subject)
+
+    return (
+        f"🔔 <b>УВЕДОМЛЕНИЕ СРАБОТАЛО!</b>\n\n"
+        f"💱 <b>Пара:</b> {pair}\n"
+        f"🎯 <b>Порог:</b> {threshold} {unit}\n"
+        f"💹 <b>Текущий {subject}:</b> {current}\n"
+        f"📊 <b>Условие:</b> {subject} <b>{'выше' if direction == 'above' else 'ниже'}</b> {threshold} {unit}\n\n"
+        f"✅ <i>Уведомление выполнено и удалено.</i>"
+    )
+
+async def deliver_triggered_alerts(context: ContextTypes.DEFAULT_TYPE, triggered: list) -> list:
+    """Отправляет сработавшие уведомления и деактивирует их; возвращает ID обработанных"""
+    delivered = []
+    for alert, current_rate in triggered:
+        try:
+            await context.bot.send_message(
+                chat_id=alert['user_id'],
+                text=format_triggered_alert(alert, current_rate),
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            logger.error(f"Ошибка отправки уведомления {alert['id']} пользователю {alert['user_id']}: {e}")
+        # Деактивируем и при ошибке отправки - иначе будем слать на каждой проверке
+        await deactivate_alert(alert['id'])
+        delivered.append(alert['id'])
+    return delivered
+
+def alert_to_dict(alert) -> dict:
+    """Записи asyncpg не сериализуются - в пул и индексы передаем словари"""
+    result = {key: alert[key] for key in ('id', 'user_id', 'from_currency', 'to_currency', 'threshold', 'direction')}
+    result['window_seconds'] = alert.get('window_seconds')
+    return result
+
+# Курсы, по которым уже проверены уведомления, и ID проверенных уведомлений
+_alerts_checked = {'rates': None, 'ids': frozenset()}
 
 async def check_alerts(context: ContextTypes.DEFAULT_TYPE):
-    """Проверяет активные уведомления и отправляет уведомления при срабатывании"""
+    """Проверяет активные уведомления по курсам ЦБ РФ и отправляет уведомления при срабатывании.
+
+    Уведомления по криптовалютам проверяет свой частый опрос (crypto_alerts.py).
+    """
     try:
-        alerts = await get_all_active_alerts()
+        alerts = [alert for alert in await get_all_active_alerts() if not is_coin(alert['from_currency'])]
         if not alerts:
             return
 
-        rates_today, _, _, _ = get_currency_rates_with_tomorrow()
+        rates_today, _, _, _ = await run_io(get_currency_rates_with_tomorrow, stage="currency_rates")
         if not rates_today:
             return
 
-        for alert in alerts:
-            user_id = alert['user_id']
-            from_curr = alert['from_currency']
-            threshold = alert['threshold']
-            direction = alert['direction']
-            alert_id = alert['id']
-
-            if from_curr in rates_today:
-                current_rate = rates_today[from_curr]['value']
-                triggered = False
-
-                if direction == 'above' and current_rate >= threshold:
-                    triggered = True
-                elif direction == 'below' and current_rate <= threshold:
-                    triggered = True
-
-                if triggered:
-                    message = (
-                        f"🔔 <b>УВЕДОМЛЕНИЕ СРАБОТАЛО!</b>\n\n"
-                        f"💱 <b>Пара:</b> {from_curr}/RUB\n"
-                        f"🎯 <b>Порог:</b> {threshold} руб.\n"
-                        f"💹 <b>Текущий курс:</b> {current_rate:.2f} руб.\n"
-                        f"📊 <b>Условие:</b> курс <b>{'выше' if direction == 'above' else 'ниже'}</b> {threshold} руб.\n\n"
-                        f"✅ <i>Уведомление выполнено и удалено.</i>"
-                    )
-
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=message,
-                        parse_mode='HTML'
-                    )
-                    await deactivate_alert(alert_id)
+        # Окна изменений - по всем активным уведомлениям, до фильтра ниже
+        alerts = [alert_to_dict(alert) for alert in alerts]
+        windows = {(alert_pair(alert), alert['window_seconds']) for alert in alerts
+                   if alert['direction'] in CHANGE_DIRECTIONS and alert['window_seconds']}
+        sync_windows(windows, crypto=False)
+
+        # Курсы не изменились (@cached вернул тот же объект) - проверяем только новые уведомления.
+        # Уведомления об изменении проверяем всегда: окно сдвигается и без новых курсов
+        all_ids = frozenset(alert['id'] for alert in alerts)
+        if rates_today is _alerts_checked['rates']:
+            alerts = [alert for alert in alerts
+                      if alert['id'] not in _alerts_checked['ids'] or alert['direction'] in CHANGE_DIRECTIONS]
+        _alerts_checked['rates'] = rates_today
+        _alerts_checked['ids'] = all_ids
+        if not alerts:
+            logger.debug("🔔 Курсы не изменились, новых уведомлений нет - проверка пропущена")
+            return
+
+        prices = {f"{code}/RUB": rate['value'] for code, rate in rates_today.items()}
+        prices.update(window_values(windows))
+        triggered = await run_cpu(match_alerts, alerts, prices, stage="match_alerts")
+        await deliver_triggered_alerts(context, triggered)
 
     except Exception as e:
         logger.error(f"Ошибка при проверке уведомлений: {e}")
@@ -69,13 +145,15 @@ async def send_daily_rates(context: ContextTypes.DEFAULT_TYPE):
 
         # Формируем сводное сообщение
         logger.info("💱 [РАССЫЛКА КУРСОВ] Получаем данные о курсах валют...")
-        rates_today, date_today, _, _, rates_tomorrow, changes_tomorrow = get_currency_rates_with_history()
+        rates_today, date_today, _, _, rates_tomorrow, changes_tomorrow = await run_io(
+            get_currency_rates_with_history, stage="currency_rates"
+        )
 
         logger.info("💎 [РАССЫЛКА КУРСОВ] Получаем ключевую ставку...")
-        key_rate_data = get_key_rate()
+        key_rate_data = await run_io(get_key_rate, stage="key_rate")
 
         logger.info("📊 [РАССЫЛКА КУРСОВ] Получаем ставку RUONIA...")
-        ruonia_data = get_ruonia_rate()  # Теперь функция доступна
+        ruonia_data = await run_io(get_ruonia_rate, stage="ruonia_rate")
 
         message = "🌅 <b>ЕЖЕДНЕВНАЯ ФИНАНСОВАЯ СВОДКА</b>\n\n"
 
@@ -153,7 +231,7 @@ async def send_daily_rates(context: ContextTypes.DEFAULT_TYPE):
                     parse_mode='HTML'
                 )
                 success_count += 1
-                logger.info(f"✅ [РАССЫЛКА КУРСОВ] Отправлено пользователю {user['user_id']}")
+                logger.debug(f"✅ [РАССЫЛКА КУРСОВ] Отправлено пользователю {user['user_id']}")
             except Exception as e:
                 logger.error(f"❌ [РАССЫЛКА КУРСОВ] Ошибка отправки пользователю {user['user_id']}: {e}")
 
@@ -177,7 +255,10 @@ async def send_daily_weather(context: ContextTypes.DEFAULT_TYPE):
 
         # Получаем погоду
         logger.info("🌤️ [РАССЫЛКА ПОГОДЫ] Получаем данные о погоде...")
-        weather_data = get_weather_moscow()
+        weather_data = await run_io(get_weather_moscow, stage="weather")
+        if not weather_data:
+            logger.warning("⚠️ [РАССЫЛКА ПОГОДЫ] Нет данных о погоде, рассылка пропущена")
+            return
         message = format_weather_message(weather_data)
 
         # Добавляем заголовок для рассылки
@@ -195,7 +276,7 @@ async def send_daily_weather(context: ContextTypes.DEFAULT_TYPE):
                     parse_mode='HTML'
                 )
                 success_count += 1
-                logger.info(f"✅ [РАССЫЛКА ПОГОДЫ] Отправлено пользователю {user_id}")
+                logger.debug(f"✅ [РАССЫЛКА ПОГОДЫ] Отправлено пользователю {user_id}")
             except Exception as e:
                 logger.error(f"❌ [РАССЫЛКА ПОГОДЫ] Ошибка отправки пользователю {user_id}: {e}")
 
@@ -0,0 +1,100 @@
+# parsers.py - быстрый разбор страниц и XML ЦБ РФ (lxml, заранее скомпилированные XPath)
+import threading
+from datetime import date
+from lxml import etree
+
+# Строки таблицы данных; если класс у таблицы сменится - любая таблица страницы
+_DATA_ROWS = etree.XPath("//table[contains(concat(' ', normalize-space(@class), ' '), ' data ')]//tr[td]")
+_ANY_ROWS = etree.XPath("//table//tr[td]")
+
+# Поля узлов Valute в XML_daily.asp - столбцами строк: без объекта lxml на каждый узел
+_VALUTE_FIELDS = tuple(
+    etree.XPath(f"/ValCurs/Valute/{field}/text()", smart_strings=False)
+    for field in ('CharCode', 'Nominal', 'Value', 'Name')
+)
+
+# Парсер lxml нельзя делить между потоками - держим свой в каждом
+_local = threading.local()
+
+def _html_parser() -> etree.HTMLParser:
+    parser = getattr(_local, 'html_parser', None)
+    if parser is None:
+        parser = _local.html_parser = etree.HTMLParser(remove_comments=True, no_network=True)
+    return parser
+
+def parse_cbr_date(date_text: str):
+    """Дата 'дд.мм.гггг' без strptime - на длинных таблицах он заметно дороже разбора"""
+    text = date_text.strip()
+    if len(text) != 10 or text[2] != '.' or text[5] != '.':
+        raise ValueError(f"Неверный формат даты: {date_text!r}")
+    return date(int(text[6:10]), int(text[3:5]), int(text[0:2]))
+
+def parse_number(text: str) -> float:
+    """Число ЦБ РФ с десятичной запятой"""
+    return float(text.strip().replace(',', '.'))
+
+def _cell_text(cell) -> str:
+    # В таблицах ЦБ РФ значение обычно прямо в ячейке - itertext только для вложенной разметки
+    text = cell.text
+    if text is None or len(cell):
+        return "".join(cell.itertext())
+    return text
+
+def parse_rate_table(content: bytes, min_rate: float = None, max_rate: float = None, until=None) -> list:
+    """Таблица «дата - ставка» со страниц hd_base ЦБ РФ: [(дата, ставка)] от старых к новым.
+
+    Разбираются только строки таблицы данных; строки с датой позже until
+    и ставкой вне [min_rate, max_rate] отбрасываются.
+    """
+    if not content:
+        return []
+    document = etree.fromstring(content, _html_parser())
+    if document is None:
+        return []
+    rows = _DATA_ROWS(document) or _ANY_ROWS(document)
+
+    result = []
+    for row in rows:
+        cells = list(row.iterchildren("td"))
+        if len(cells) < 2:
+            continue
+        try:
+            day = parse_cbr_date(_cell_text(cells[0]))
+            rate = parse_number(_cell_text(cells[1]))
+        except ValueError:
+            continue
+        if until is not None and day > until:
+            continue
+        if (min_rate is not None and rate < min_rate) or (max_rate is not None and rate > max_rate):
+            continue
+        result.append((day, rate))
+    result.sort()
+    return result
+
+def parse_daily_xml(content: bytes):
+    """XML_daily.asp: (дата документа, {код: {'value', 'nominal', 'name'}}).
+
+    Разбирается весь справочник (ключ - CharCode). Каждое поле читается одним
+    XPath сразу для всех валют: обход дочерних узлов создавал по объекту lxml
+    на каждое поле и был вдвое медленнее разбора самого документа.
+    value - курс за 1 единицу валюты.
+    """
+    root = etree.fromstring(content)
+    doc_date = parse_cbr_date(root.get('Date', ''))
+    columns = [field(root) for field in _VALUTE_FIELDS]
+    if len({len(column) for column in columns}) != 1:
+        # Столбцы сопоставляются по порядку - узел без поля сдвинул бы все следующие
+        raise ValueError("В XML_daily.asp есть валюта без кода, номинала, курса или названия")
+
+    rates = {}
+    for code, nominal, value, name in zip(*columns):
+        nominal = int(nominal)
+        value = parse_number(value)
+        if value <= 0 or nominal <= 0:
+            continue
+        rates[code] = {
+            'value': value / nominal if nominal > 1 else value,
+            'nominal': nominal,
+            'name': name,
+        }
+    return doc_date, rates
@@ -0,0 +1,190 @@
+# rolling.py - скользящие окна по рядам цен для уведомлений об изменении в процентах
+import threading
+import time
+from collections import deque
+from config import logger
+from timeseries import range_query, subscribe, unsubscribe, fx_series, crypto_series
+from crypto_universe import is_coin
+
+# Границы окна уведомления
+MIN_WINDOW_SECONDS = 5 * 60
+MAX_WINDOW_SECONDS = 7 * 24 * 3600
+
+# Сколько истории берем при создании окна: для дневных рядов ЦБ РФ в окно
+# должен попасть курс, действовавший на начало окна (через выходные)
+SEED_LOOKBACK_SECONDS = 7 * 24 * 3600
+
+_WINDOW_UNITS = {
+    'm': 60, 'мин': 60, 'м': 60,
+    'h': 3600, 'ч': 3600,
+    'd': 86400, 'д': 86400, 'дн': 86400,
+}
+
+def parse_window(text: str):
+    """'30m', '1h', '24ч', '1d' -> секунды; None - неверный формат или вне границ"""
+    text = text.strip().lower()
+    for unit in sorted(_WINDOW_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            number = text[:-len(unit)]
+            break
+    else:
+        return None
+    try:
+        seconds = int(float(number.replace(',', '.')) * _WINDOW_UNITS[unit])
+    except ValueError:
+        return None
+    if not MIN_WINDOW_SECONDS <= seconds <= MAX_WINDOW_SECONDS:
+        return None
+    return seconds
+
+def format_window(seconds: int) -> str:
+    if seconds % 86400 == 0:
+        return f"{seconds // 86400} д"
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600} ч"
+    return f"{seconds // 60} мин"
+
+class RollingWindow:
+    """Точки ряда за последние seconds плюс одна точка до начала окна (курс на его начало).
+
+    min/max - монотонные деки, среднее - бегущая сумма: добавление и вытеснение
+    амортизированно O(1), статистика окна - O(1) без прохода по истории.
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self._points = deque()     # (ts, value) по возрастанию ts
+        self._min = deque()        # значения по неубыванию
+        self._max = deque()        # значения по невозрастанию
+        self._sum = 0.0
+
+    def push(self, ts: float, value: float):
+        if self._points and ts <= self._points[-1][0]:
+            # Точка из прошлого или повтор времени (догрузка) - редкость, пересобираем
+            points = [point for point in self._points if point[0] != ts] + [(ts, value)]
+            self._rebuild(sorted(points))
+            return
+        self._points.append((ts, value))
+        self._sum += value
+        while self._min and self._min[-1][1] > value:
+            self._min.pop()
+        self._min.append((ts, value))
+        while self._max and self._max[-1][1] < value:
+            self._max.pop()
+        self._max.append((ts, value))
+
+    def _rebuild(self, points):
+        self._points.clear()
+        self._min.clear()
+        self._max.clear()
+        self._sum = 0.0
+        for ts, value in points:
+            self.push(ts, value)
+
+    def _evict(self, now: float):
+        if not self._points:
+            return
+        start = now - self.seconds
+        # Оставляем последнюю точку не позже начала окна - это курс на начало окна
+        while len(self._points) > 1 and self._points[1][0] <= start:
+            ts, value = self._points.popleft()
+            self._sum -= value
+        oldest = self._points[0][0] if self._points else None
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def stats(self, now: float = None):
+        """{'current', 'min', 'max', 'avg', 'count'} или None для пустого окна"""
+        self._evict(now or time.time())
+        if not self._points:
+            return None
+        count = len(self._points)
+        return {
+            'current': self._points[-1][1],
+            'min': self._min[0][1],
+            'max': self._max[0][1],
+            'avg': self._sum / count,
+            'count': count,
+        }
+
+def change_percents(stats: dict) -> dict:
+    """Рост от минимума окна, падение от максимума и наибольшее из двух движение (%)"""
+    current = stats['current']
+    rise = (current - stats['min']) / stats['min'] * 100 if stats['min'] > 0 else 0.0
+    drop = (stats['max'] - current) / stats['max'] * 100 if stats['max'] > 0 else 0.0
+    return {'rise': rise, 'drop': drop, 'move': max(rise, drop)}
+
+def pair_series(pair: str) -> str:
+    """'USD/RUB' -> ряд курса ЦБ РФ, 'bitcoin/USD' -> ряд цены CoinGecko"""
+    base, quote = pair.split('/')
+    if is_coin(base):
+        return crypto_series(base, quote.lower())
+    return fx_series(base)
+
+# 🔄 РЕЕСТР ОКОН: (пара, секунды) -> окно; одно окно на всех пользователей с такой парой и длиной
+_windows = {}
+_callbacks = {}
+_lock = threading.Lock()
+
+def _ensure_window(pair: str, seconds: int) -> RollingWindow:
+    key = (pair, seconds)
+    window = _windows.get(key)
+    if window is not None:
+        return window
+
+    series = pair_series(pair)
+    window = RollingWindow(seconds)
+    now = time.time()
+    for ts, value in range_query(series, now - seconds - SEED_LOOKBACK_SECONDS, now + 2 * 86400):
+        window.push(ts, value)
+
+    def on_point(ts, value, window=window):
+        with _lock:
+            window.push(ts, value)
+
+    _windows[key] = window
+    _callbacks[key] = (series, on_point)
+    subscribe(series, on_point)
+    logger.debug(f"📐 Скользящее окно {pair} за {format_window(seconds)}: {len(window._points)} точек")
+    return window
+
+def sync_windows(required: set, crypto: bool):
+    """Оставляет только окна, нужные активным уведомлениям: {(пара, секунды)}.
+
+    Уведомления по валютам ЦБ РФ и по криптовалютам проверяются разными
+    задачами - каждая чистит только свои окна.
+    """
+    with _lock:
+        for key in list(_windows):
+            if is_coin(key[0].split('/')[0]) == crypto and key not in required:
+                series, callback = _callbacks.pop(key)
+                unsubscribe(series, callback)
+                del _windows[key]
+
+def window_values(required: set, now: float = None) -> dict:
+    """Значения для индекса порогов: {'пара:rise:секунды': %, ...} по каждому окну.
+
+    Одно вычисление на окно за тик, сколько бы уведомлений на него ни было.
+    """
+    values = {}
+    with _lock:
+        for pair, seconds in required:
+            stats = _ensure_window(pair, seconds).stats(now)
+            if not stats or stats['count'] < 2:
+                continue
+            for direction, percent in change_percents(stats).items():
+                values[f"{pair}:{direction}:{seconds}"] = percent
+    return values
+
+def window_stats(pair: str, seconds: int):
+    """Статистика окна для текста уведомления"""
+    with _lock:
+        window = _windows.get((pair, seconds))
+        return window.stats() if window else None
+
+def get_windows_stats() -> dict:
+    """Для админ-команд"""
+    with _lock:
+        return {f"{pair} / {format_window(seconds)}": len(window._points) for (pair, seconds), window in _windows.items()}
@@ -19,7 +19,6 @@ from api_keyrate import (
 
 from api_crypto import (
     get_crypto_rates,
-    get_crypto_rates_fallback,
     format_crypto_rates_message
 )
 
@@ -66,7 +65,6 @@ __all__ = [
 
     # Crypto API
     'get_crypto_rates',
-    'get_crypto_rates_fallback',
     'format_crypto_rates_message',
 
     # AI API
@@ -0,0 +1,149 @@
+# snapshots.py - последние успешно полученные данные (last-known-good)
+import json
+import threading
+import time
+from datetime import date, datetime
+import pytz
+from config import logger
+from http_client import source_label
+
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# key -> {'data': ..., 'fetched_at': epoch, 'source': str | None}
+_snapshots = {}
+_dirty = set()            # Ключи, еще не сохраненные в БД
+_serving_stale = set()    # Ключи, по которым сейчас отдается снимок вместо свежих данных
+_lock = threading.Lock()
+
+# 🔄 СЕРИАЛИЗАЦИЯ В JSON
+# Снимки читаются из БД при старте, поэтому только данные, без pickle. Кортежи
+# (результаты курсов валют) и даты помечаются, чтобы вернуться теми же типами
+def _encode(value):
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(item) for item in value]}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    return value
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        if '__tuple__' in obj:
+            return tuple(obj['__tuple__'])
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+    return obj
+
+def dump_payload(data) -> bytes:
+    return json.dumps(_encode(data), ensure_ascii=False).encode('utf-8')
+
+def load_payload(payload: bytes):
+    return json.loads(payload, object_hook=_decode)
+
+def save_snapshot(key: str, data, source: str = None):
+    """Запоминает успешный результат фетчера как последний хороший"""
+    with _lock:
+        _snapshots[key] = {'data': data, 'fetched_at': time.time(), 'source': source}
+        _dirty.add(key)
+        _serving_stale.discard(key)
+
+def confirm_snapshot(key: str):
+    """Источник подтвердил, что данные не изменились: снимок снова свежий, без записи в БД"""
+    with _lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is not None:
+            snapshot['fetched_at'] = time.time()
+        _serving_stale.discard(key)
+
+def get_snapshot(key: str):
+    """Возвращает снимок {'data', 'fetched_at', 'source'} или None"""
+    return _snapshots.get(key)
+
+def serve_snapshot(key: str):
+    """Отдает данные снимка при недоступности источника и помечает ключ устаревшим"""
+    snapshot = _snapshots.get(key)
+    if snapshot is None:
+        return None
+    _serving_stale.add(key)
+    return snapshot['data']
+
+def get_stale_keys() -> frozenset:
+    return frozenset(_serving_stale)
+
+def get_stale_notice(*keys, prefix: str = None) -> str:
+    """Пометка для format_*: пусто, если все ключи (или ключи с префиксом) свежие"""
+    if prefix:
+        keys = keys + tuple(key for key in _serving_stale if key.startswith(prefix))
+    stale = [_snapshots[key] for key in keys if key in _serving_stale and key in _snapshots]
+    if not stale:
+        return ""
+
+    oldest = min(stale, key=lambda snapshot: snapshot['fetched_at'])
+    fetched = datetime.fromtimestamp(oldest['fetched_at'], MOSCOW_TZ).strftime('%d.%m.%Y %H:%M')
+    source = source_label(oldest['source']) if oldest['source'] else 'источник'
+    return (
+        f"\n\n⚠️ <b>Устаревшие данные:</b> {source} временно недоступен.\n"
+        f"<i>Показаны последние полученные данные от {fetched} МСК</i>"
+    )
+
+async def flush_snapshots():
+    """Сохраняет измененные снимки в БД"""
+    from db import save_data_snapshots
+
+    with _lock:
+        if not _dirty:
+            return 0
+        rows = []
+        for key in _dirty:
+            snapshot = _snapshots[key]
+            try:
+                payload = dump_payload(snapshot['data'])
+            except (TypeError, ValueError) as e:
+                logger.error(f"❌ Снимок {key} не сериализуется в JSON: {e}")
+                continue
+            rows.append((
+                key,
+                payload,
+                snapshot['source'],
+                datetime.fromtimestamp(snapshot['fetched_at'])
+            ))
+        _dirty.clear()
+
+    if await save_data_snapshots(rows):
+        logger.info(f"💾 Сохранено снимков данных: {len(rows)}")
+        return len(rows)
+
+    # Не удалось сохранить - повторим при следующем запуске
+    with _lock:
+        _dirty.update(row[0] for row in rows)
+    return 0
+
+async def load_snapshots():
+    """Загружает снимки из БД при старте, чтобы переживать перезапуски"""
+    from db import get_data_snapshots
+
+    rows = await get_data_snapshots()
+    loaded = 0
+    with _lock:
+        for row in rows:
+            if row['key'] in _snapshots:
+                continue
+            try:
+                _snapshots[row['key']] = {
+                    'data': load_payload(row['payload']),
+                    'fetched_at': row['fetched_at'].timestamp(),
+                    'source': row['source']
+                }
+                loaded += 1
+            except Exception as e:
+                logger.error(f"❌ Не удалось восстановить снимок {row['key']}: {e}")
+
+    logger.info(f"✅ Загружено снимков данных: {loaded}")
+    return loaded
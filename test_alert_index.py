@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Проверки индекса порогов: границы above/below и уведомления об изменении за окно
+"""
+from alert_index import ThresholdIndex
+
+def _alert(alert_id, direction, threshold, pair='USD/RUB', window_seconds=None):
+    base, quote = pair.split('/')
+    return {
+        'id': alert_id, 'from_currency': base, 'to_currency': quote,
+        'direction': direction, 'threshold': threshold, 'window_seconds': window_seconds,
+    }
+
+def _ids(matches):
+    return sorted(alert['id'] for alert, _ in matches)
+
+def test_above_matches_thresholds_up_to_price_inclusive():
+    index = ThresholdIndex([_alert(1, 'above', 90), _alert(2, 'above', 100), _alert(3, 'above', 110)])
+    assert _ids(index.match({'USD/RUB': 100})) == [1, 2]
+    assert _ids(index.match({'USD/RUB': 99.99})) == [1]
+    assert _ids(index.match({'USD/RUB': 80})) == []
+
+def test_below_matches_thresholds_from_price_inclusive():
+    index = ThresholdIndex([_alert(1, 'below', 90), _alert(2, 'below', 100), _alert(3, 'below', 110)])
+    assert _ids(index.match({'USD/RUB': 100})) == [2, 3]
+    assert _ids(index.match({'USD/RUB': 100.01})) == [3]
+    assert _ids(index.match({'USD/RUB': 120})) == []
+
+def test_pairs_are_indexed_separately():
+    index = ThresholdIndex([_alert(1, 'above', 90), _alert(2, 'above', 90, pair='EUR/RUB')])
+    assert _ids(index.match({'EUR/RUB': 95})) == [2]
+    assert index.pairs() == {'USD/RUB', 'EUR/RUB'}
+
+def test_change_alert_matches_window_percent():
+    alerts = [_alert(1, 'rise', 5, pair='bitcoin/USD', window_seconds=3600), _alert(2, 'drop', 5, pair='bitcoin/USD')]
+    index = ThresholdIndex(alerts)
+    # Уведомление об изменении без окна пропускается
+    assert len(index) == 1
+    assert index.windows == {('bitcoin/USD', 3600)}
+    assert index.pairs() == {'bitcoin/USD'}
+    assert _ids(index.match({'bitcoin/USD:rise:3600': 5.0})) == [1]
+    assert _ids(index.match({'bitcoin/USD:rise:3600': 4.9})) == []
+
+def test_discard_removes_only_given_alerts():
+    index = ThresholdIndex([_alert(1, 'above', 90), _alert(2, 'above', 100), _alert(3, 'below', 100)])
+    index.discard([2, 3])
+    assert len(index) == 1
+    assert _ids(index.match({'USD/RUB': 100})) == [1]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Проверки кэша: дедлайн записи и порядок кучи дедлайнов
+"""
+import time
+import types
+import pytest
+import cache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемое время cache.py: clock[0] - текущий epoch"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now[0], perf_counter=time.perf_counter))
+    cache.init_cache()
+    yield now
+    cache.init_cache()
+
+def test_entry_expires_at_ttl_deadline(clock):
+    cache.set_cache('test_rates', {'USD': 80.0}, ttl=60)
+    assert cache._cache_deadlines['test_rates'] == clock[0] + 60
+    assert cache._cache_deadline_reasons['test_rates'] == 'ttl'
+
+    clock[0] += 59.9
+    assert cache.get_cache('test_rates') == {'USD': 80.0}
+    clock[0] += 0.1
+    assert cache.get_cache('test_rates') is None
+
+def test_expiry_heap_pops_due_keys_in_deadline_order(clock):
+    start = clock[0]
+    cache.set_cache('slow', 1, ttl=300)
+    cache.set_cache('fast', 2, ttl=100)
+    cache.set_cache('middle', 3, ttl=200)
+
+    assert cache.get_next_deadline() == start + 100
+    assert cache.pop_due_keys(now=start + 99) == []
+    assert cache.pop_due_keys(now=start + 250) == ['fast', 'middle']
+    assert cache.get_next_deadline() == start + 300
+
+def test_rewritten_entry_leaves_stale_heap_entry(clock):
+    start = clock[0]
+    cache.set_cache('item', 1, ttl=100)
+    # Перезапись с новым TTL: старая запись кучи больше не актуальна
+    cache.set_cache('item', 2, ttl=500)
+
+    assert cache.pop_due_keys(now=start + 200) == []
+    assert cache.get_next_deadline() == start + 500
+    assert cache.pop_due_keys(now=start + 500) == ['item']
+
+def test_clear_cache_removes_deadline(clock):
+    cache.set_cache('item', 1, ttl=100)
+    cache.clear_cache('item')
+    assert cache.get_cache('item') is None
+    assert cache.pop_due_keys(now=clock[0] + 1000) == []
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Проверки ограничения частоты: исчерпание и пополнение ведер, склейка повторов
+"""
+import pytest
+import flood_control
+from flood_control import check, parse_limits
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    """Свое состояние и лимиты на каждый тест: 2 запроса данных, +1 в секунду"""
+    monkeypatch.setattr(flood_control, '_users', {})
+    monkeypatch.setattr(flood_control, '_global_buckets', {})
+    monkeypatch.setattr(flood_control, 'USER_LIMITS', {'data': (2, 1.0), 'menu': (1, 0.001)})
+    monkeypatch.setattr(flood_control, 'GLOBAL_LIMITS', {})
+    monkeypatch.setattr(flood_control, 'FLOOD_DUPLICATE_WINDOW', 1.0)
+
+def test_parse_limits():
+    assert parse_limits('menu=20/10, data=5/30,bad,ai=0/5') == {'menu': (20, 2.0), 'data': (5, 5 / 30)}
+
+def test_bucket_exhaustion_and_refill():
+    assert check(1, 'data', 'a', now=100.0) == 'ok'
+    assert check(1, 'data', 'b', now=100.0) == 'ok'
+    assert check(1, 'data', 'c', now=100.0) == 'throttled'
+    # Через секунду пополнился ровно один токен
+    assert check(1, 'data', 'd', now=101.0) == 'ok'
+    assert check(1, 'data', 'e', now=101.0) == 'throttled'
+    # Ведро не наполняется сверх емкости
+    assert check(1, 'data', 'f', now=200.0) == 'ok'
+    assert check(1, 'data', 'g', now=200.0) == 'ok'
+    assert check(1, 'data', 'h', now=200.0) == 'throttled'
+
+def test_users_have_separate_buckets():
+    assert check(1, 'data', 'a', now=100.0) == 'ok'
+    assert check(1, 'data', 'b', now=100.0) == 'ok'
+    assert check(2, 'data', 'a', now=100.0) == 'ok'
+
+def test_duplicate_is_coalesced_without_spending_tokens():
+    assert check(1, 'menu', 'cmd:/start', now=100.0) == 'ok'
+    # Повтор в окне склейки - не «слишком часто», хотя ведро пусто
+    assert check(1, 'menu', 'cmd:/start', now=100.5) == 'duplicate'
+    assert check(1, 'menu', 'cmd:/help', now=100.5) == 'throttled'
+    assert check(1, 'menu', 'cmd:/start', now=101.5) == 'throttled'
+
+def test_global_limit_does_not_spend_user_tokens(monkeypatch):
+    monkeypatch.setattr(flood_control, 'GLOBAL_LIMITS', {'data': (1, 0.001)})
+    assert check(1, 'data', 'a', now=100.0) == 'ok'
+    assert check(2, 'data', 'a', now=100.0) == 'busy'
+    assert flood_control._users[2]['buckets']['data'][0] == 2
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Проверки log_reader: хвост, фильтры и предел просмотра
+"""
+import log_reader
+
+def _write_log(path, count):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            level = 'ERROR' if i == 5 else 'INFO'
+            f.write(f"2026-01-01 10:00:00,000 - config - {level} - [jobs] сообщение {i} пользователя {i % 7}\n")
+            if i == 5:
+                f.write("Traceback (most recent call last):\nValueError: boom\n")
+
+def test_tail_returns_last_records_in_order(tmp_path):
+    path = tmp_path / 'bot.log'
+    _write_log(path, 100)
+    result = log_reader.search_logs(str(path), limit=3, block_size=512)
+    assert [record.rsplit(' ', 3)[1] for record in result['records']] == ['97', '98', '99']
+    assert not result['truncated']
+
+def test_level_filter_keeps_traceback(tmp_path):
+    path = tmp_path / 'bot.log'
+    _write_log(path, 200)
+    result = log_reader.search_logs(str(path), limit=5, level='ERROR', block_size=512)
+    assert len(result['records']) == 1
+    assert result['records'][0].endswith("ValueError: boom")
+
+def test_rotated_files_are_searched(tmp_path):
+    path = tmp_path / 'bot.log'
+    _write_log(tmp_path / 'bot.log.1', 50)
+    _write_log(path, 3)
+    result = log_reader.search_logs(str(path), limit=1, pattern='сообщение 40 ', block_size=512)
+    assert result['files'] == 2
+    assert len(result['records']) == 1
+
+def test_search_without_matches_stops_at_scan_cap(tmp_path):
+    path = tmp_path / 'bot.log'
+    _write_log(path, 20000)
+    size = path.stat().st_size
+    cap = 64 * 1024
+    result = log_reader.search_logs(str(path), pattern='nomatch', max_scan_bytes=cap, block_size=4096)
+    assert result['records'] == []
+    assert result['truncated']
+    assert result['scanned_bytes'] <= cap + 4096 < size
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Проверки скользящего окна: вытеснение точек и статистика после него
+"""
+from rolling import RollingWindow, change_percents, parse_window
+
+def _window(points, seconds=100):
+    window = RollingWindow(seconds)
+    for ts, value in points:
+        window.push(ts, value)
+    return window
+
+def test_eviction_keeps_point_before_window_start():
+    window = _window([(1, 10), (50, 5), (120, 20), (130, 8), (200, 15)])
+    stats = window.stats(now=200)
+    # (1, 10) вытеснена, (50, 5) - курс на начало окна [100, 200]
+    assert stats == {'current': 15, 'min': 5, 'max': 20, 'avg': 12, 'count': 4}
+
+def test_min_max_and_avg_follow_eviction():
+    window = _window([(1, 10), (50, 5), (120, 20), (130, 8), (200, 15)])
+    window.stats(now=200)
+    stats = window.stats(now=260)
+    # Ушли и минимум 5, и максимум 20 - статистика по оставшимся (130, 8), (200, 15)
+    assert stats == {'current': 15, 'min': 8, 'max': 15, 'avg': 11.5, 'count': 2}
+
+def test_single_point_is_never_evicted():
+    window = _window([(10, 7)])
+    assert window.stats(now=10_000)['count'] == 1
+
+def test_out_of_order_point_rebuilds_window():
+    window = _window([(10, 10), (100, 12), (50, 3), (100, 11)], seconds=1000)
+    stats = window.stats(now=100)
+    assert stats['min'] == 3
+    assert stats['current'] == 11
+    assert stats['count'] == 3
+
+def test_change_percents():
+    changes = change_percents({'current': 110, 'min': 100, 'max': 125})
+    assert round(changes['rise'], 6) == 10
+    assert round(changes['drop'], 6) == 12
+    assert changes['move'] == changes['drop']
+
+def test_parse_window_bounds():
+    assert parse_window('30m') == 1800
+    assert parse_window('24ч') == 86400
+    assert parse_window('1m') is None
+    assert parse_window('8d') is None
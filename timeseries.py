@@ -0,0 +1,242 @@
+# timeseries.py - локальное хранилище временных рядов курсов и ставок
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timezone
+from config import logger
+
+# Сколько последних точек каждого ряда держим в памяти (~11 лет дневных данных)
+DEFAULT_CAPACITY = 4096
+
+# Имена рядов
+def fx_series(code: str) -> str:
+    return f"fx:{code}"
+
+def crypto_series(crypto_id: str, quote: str) -> str:
+    return f"crypto:{crypto_id}:{quote}"
+
+SERIES_KEY_RATE = "keyrate"
+SERIES_RUONIA = "ruonia"
+
+def to_ts(moment) -> float:
+    """date/datetime/epoch -> epoch (даты - полночь UTC, чтобы не зависеть от пояса сервера)"""
+    if isinstance(moment, (int, float)):
+        return float(moment)
+    if isinstance(moment, datetime):
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+    if isinstance(moment, date):
+        return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc).timestamp()
+    raise TypeError(f"Неподдерживаемый тип времени: {type(moment)}")
+
+def ts_to_date(ts: float) -> date:
+    """Обратно к to_ts для дневных рядов"""
+    return datetime.fromtimestamp(ts, timezone.utc).date()
+
+class RingBuffer:
+    """Кольцевой буфер точек (ts, value) на двух array('d'), отсортированный по ts.
+
+    Хранится «развернутым»: при переполнении отбрасываем самые старые точки одним срезом
+    (с запасом в 1/8 емкости), поэтому запрос по диапазону - это бинарный поиск
+    по непрерывному массиву без склейки двух половин кольца.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.ts = array('d')
+        self.values = array('d')
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts: float, value: float):
+        if self.ts and ts <= self.ts[-1]:
+            self._insert(ts, value)
+            return
+        self.ts.append(ts)
+        self.values.append(value)
+        self._trim()
+
+    def _insert(self, ts: float, value: float):
+        """Точка из прошлого (догрузка истории): вставка с заменой дубликата"""
+        index = bisect_left(self.ts, ts)
+        if index < len(self.ts) and self.ts[index] == ts:
+            self.values[index] = value
+            return
+        self.ts.insert(index, ts)
+        self.values.insert(index, value)
+        self._trim()
+
+    def _trim(self):
+        overflow = len(self.ts) - self.capacity
+        if overflow > 0:
+            # Срезаем с запасом, чтобы не сдвигать массив на каждой вставке
+            cut = max(overflow, self.capacity // 8)
+            del self.ts[:cut]
+            del self.values[:cut]
+
+    def range(self, start: float, end: float) -> list:
+        lo = bisect_left(self.ts, start)
+        hi = bisect_right(self.ts, end)
+        return list(zip(self.ts[lo:hi], self.values[lo:hi]))
+
+    def last_n(self, n: int) -> list:
+        if n <= 0:
+            return []
+        return list(zip(self.ts[-n:], self.values[-n:]))
+
+    def latest(self):
+        if not self.ts:
+            return None
+        return self.ts[-1], self.values[-1]
+
+# 🔄 РЕЕСТР РЯДОВ И ОЧЕРЕДЬ ЗАПИСИ В БД
+_buffers = {}
+_pending = {}             # series -> [(ts, value)], еще не сохраненные в БД
+_listeners = {}           # series -> [callback(ts, value)]
+_lock = threading.Lock()
+
+def _buffer(series: str) -> RingBuffer:
+    buffer = _buffers.get(series)
+    if buffer is None:
+        buffer = _buffers[series] = RingBuffer()
+    return buffer
+
+def subscribe(series: str, callback):
+    """callback(ts, value) на каждую новую точку ряда (скользящие окна уведомлений)"""
+    with _lock:
+        _listeners.setdefault(series, []).append(callback)
+
+def unsubscribe(series: str, callback):
+    with _lock:
+        callbacks = _listeners.get(series)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+            if not callbacks:
+                del _listeners[series]
+
+def _notify(series: str, points):
+    callbacks = _listeners.get(series)
+    if not callbacks:
+        return
+    for callback in list(callbacks):
+        for ts, value in points:
+            callback(ts, value)
+
+def record(series: str, value: float, moment=None):
+    """Добавляет точку в ряд (moment по умолчанию - сейчас)"""
+    ts = to_ts(moment) if moment is not None else time.time()
+    with _lock:
+        _buffer(series).append(ts, float(value))
+        _pending.setdefault(series, []).append((ts, float(value)))
+    _notify(series, ((ts, float(value)),))
+
+def record_many(series: str, points):
+    """Добавляет пачку точек [(moment, value)]"""
+    prepared = sorted((to_ts(moment), float(value)) for moment, value in points)
+    if not prepared:
+        return
+    with _lock:
+        buffer = _buffer(series)
+        for ts, value in prepared:
+            buffer.append(ts, value)
+        _pending.setdefault(series, []).extend(prepared)
+    _notify(series, prepared)
+
+def latest(series: str):
+    """Последняя точка (ts, value) или None"""
+    buffer = _buffers.get(series)
+    if not buffer:
+        return None
+    with _lock:
+        return buffer.latest()
+
+def last_n(series: str, n: int) -> list:
+    """Последние n точек [(ts, value)] от старых к новым"""
+    buffer = _buffers.get(series)
+    if not buffer:
+        return []
+    with _lock:
+        return buffer.last_n(n)
+
+def range_query(series: str, start, end=None) -> list:
+    """Точки ряда в интервале [start, end] (по умолчанию до текущего момента)"""
+    buffer = _buffers.get(series)
+    if not buffer:
+        return []
+    end_ts = to_ts(end) if end is not None else time.time()
+    with _lock:
+        return buffer.range(to_ts(start), end_ts)
+
+def downsample(series: str, start, end, bucket_seconds: int, agg: str = 'last') -> list:
+    """Прореживание: одна точка на интервал bucket_seconds (agg: last, first, mean, min, max)"""
+    points = range_query(series, start, end)
+    if not points:
+        return []
+
+    result = []
+    bucket_start = None
+    bucket_values = []
+    last_ts = None
+    for ts, value in points:
+        bucket = ts - ts % bucket_seconds
+        if bucket != bucket_start and bucket_values:
+            result.append((last_ts, _aggregate(bucket_values, agg)))
+            bucket_values = []
+        bucket_start = bucket
+        bucket_values.append(value)
+        last_ts = ts
+    result.append((last_ts, _aggregate(bucket_values, agg)))
+    return result
+
+def _aggregate(values: list, agg: str) -> float:
+    if agg == 'last':
+        return values[-1]
+    if agg == 'first':
+        return values[0]
+    if agg == 'mean':
+        return sum(values) / len(values)
+    if agg == 'min':
+        return min(values)
+    if agg == 'max':
+        return max(values)
+    raise ValueError(f"Неизвестная агрегация: {agg}")
+
+async def flush_timeseries():
+    """Сохраняет накопленные точки в БД (append-only)"""
+    from db import save_ts_points
+
+    with _lock:
+        if not _pending:
+            return 0
+        batch = dict(_pending)
+        _pending.clear()
+
+    if await save_ts_points(batch):
+        saved = sum(len(points) for points in batch.values())
+        logger.info(f"📈 Сохранено точек временных рядов: {saved}")
+        return saved
+
+    # Не удалось сохранить - вернем в очередь до следующего запуска
+    with _lock:
+        for series, points in batch.items():
+            _pending.setdefault(series, [])[:0] = points
+    return 0
+
+async def load_timeseries(capacity: int = DEFAULT_CAPACITY):
+    """Загружает последние точки всех рядов из БД при старте"""
+    from db import get_ts_series, get_ts_points
+
+    loaded = 0
+    for series_id, name in await get_ts_series():
+        rows = await get_ts_points(series_id, capacity)
+        with _lock:
+            buffer = _buffer(name)
+            for row in reversed(rows):
+                buffer.append(to_ts(row['ts']), row['value'])
+        loaded += len(rows)
+
+    logger.info(f"✅ Загружено точек временных рядов: {loaded}")
+    return loaded
@@ -6,6 +6,17 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+def find_split_position(text: str, max_length: int) -> int:
+    """Позиция разреза для части не длиннее max_length: перевод строки, точка, пробел"""
+    split_pos = text.rfind('\n', 0, max_length)
+    if split_pos == -1:
+        split_pos = text.rfind('.', 0, max_length)
+    if split_pos == -1:
+        split_pos = text.rfind(' ', 0, max_length)
+    if split_pos == -1:
+        split_pos = max_length - 1
+    return split_pos + 1
+
 async def split_long_message(text: str, max_length: int = 4096) -> list:
     """Разбивает длинное сообщение на части для Telegram"""
     if len(text) <= max_length:
@@ -17,16 +28,9 @@ async def split_long_message(text: str, max_length: int = 4096) -> list:
             parts.append(text)
             break
 
-        split_pos = text.rfind('\n', 0, max_length)
-        if split_pos == -1:
-            split_pos = text.rfind('.', 0, max_length)
-        if split_pos == -1:
-            split_pos = text.rfind(' ', 0, max_length)
-        if split_pos == -1:
-            split_pos = max_length
-
-        parts.append(text[:split_pos + 1])
-        text = text[split_pos + 1:]
+        split_pos = find_split_position(text, max_length)
+        parts.append(text[:split_pos])
+        text = text[split_pos:]
 
     return parts
 
@@ -206,3 +210,20 @@ def create_user_stats_keyboard():
         [KeyboardButton("🔙 Назад к админ-панели")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+def _keyboard_labels(*keyboards) -> frozenset:
+    return frozenset(button.text for keyboard in keyboards for row in keyboard.keyboard for button in row)
+
+_MENU_LABELS = None
+
+def menu_button_labels() -> frozenset:
+    """Подписи кнопок reply-меню: в режиме ИИ это навигация, а не вопрос"""
+    global _MENU_LABELS
+    if _MENU_LABELS is None:
+        _MENU_LABELS = _keyboard_labels(create_main_reply_keyboard(), create_other_functions_keyboard(),
+                                        create_ai_keyboard(), create_alerts_keyboard())
+    return _MENU_LABELS
+
+def ai_keyboard_labels() -> frozenset:
+    """Кнопки клавиатуры режима ИИ - они из режима не выводят"""
+    return _keyboard_labels(create_ai_keyboard())
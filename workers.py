@@ -0,0 +1,209 @@
+# workers.py - пулы исполнителей для тяжелых стадий вне event loop
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import logger, WORKER_THREADS, WORKER_PROCESSES, WORKER_QUEUE_LIMIT, WORKER_TIMEOUT_SECONDS, AI_MAX_CONCURRENT
+
+# Пулы: потоки - для блокирующей сети и lxml (отпускает GIL),
+# процессы - для разбора и сопоставления на чистом Python
+POOL_IO = 'io'
+POOL_CPU = 'cpu'
+POOL_AI = 'ai'       # долгие ответы DeepSeek не занимают потоки загрузки данных
+
+POOL_LABELS = {
+    POOL_IO: 'Потоки (сеть, lxml)',
+    POOL_CPU: 'Процессы (чистый Python)',
+    POOL_AI: 'Потоки ИИ (DeepSeek)',
+}
+
+class WorkerOverloadedError(RuntimeError):
+    """Очередь пула заполнена - задача не принята"""
+
+class WorkerTimeoutError(TimeoutError):
+    """Задача не уложилась в таймаут (вместе с ожиданием в очереди)"""
+
+def _timed_call(func, args, kwargs):
+    """Выполняется в исполнителе: возвращает время старта/конца вместе с результатом.
+
+    time.time(), а не perf_counter - значения сравниваются между процессами.
+    """
+    started = time.time()
+    result = func(*args, **kwargs)
+    return started, result, time.time()
+
+class WorkerPool:
+    """Пул с ограниченной очередью, таймаутами и метриками ожидания и выполнения.
+
+    Одновременно выполняется не больше max_workers задач, ждать своей очереди
+    могут не больше queue_limit - остальные сразу получают WorkerOverloadedError,
+    чтобы один тяжелый разбор не копил за собой обновления других пользователей.
+    """
+
+    def __init__(self, name: str, max_workers: int, use_processes: bool = False,
+                 queue_limit: int = WORKER_QUEUE_LIMIT, timeout: float = WORKER_TIMEOUT_SECONDS):
+        self.name = name
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+        self._admitted = 0      # принятые задачи: ждут слот или выполняются
+        self._running = 0
+        self._stages = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"worker-{self.name}")
+        return self._executor
+
+    def _stage_metrics(self, stage: str) -> dict:
+        metrics = self._stages.get(stage)
+        if metrics is None:
+            metrics = self._stages[stage] = {
+                'completed': 0, 'failures': 0, 'timeouts': 0, 'rejected': 0,
+                'wait_total': 0.0, 'wait_max': 0.0, 'exec_total': 0.0, 'exec_max': 0.0,
+            }
+        return metrics
+
+    def _release(self, _future):
+        self._running -= 1
+        self._admitted -= 1
+        self._slots.release()
+
+    async def run(self, func, *args, stage: str = None, timeout: float = None, **kwargs):
+        """Выполняет func(*args, **kwargs) в пуле и возвращает результат"""
+        stage = stage or getattr(func, '__name__', 'task')
+        metrics = self._stage_metrics(stage)
+        timeout = self.timeout if timeout is None else timeout
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+        # Счетчик ведем сами: семафор еще не видит задачи, которые только встали в очередь
+        if self._admitted >= self.max_workers + self.queue_limit:
+            metrics['rejected'] += 1
+            logger.warning(f"⏳ Пул {self.name} перегружен: задача {stage} отклонена")
+            raise WorkerOverloadedError(f"пул {self.name} перегружен")
+
+        loop = asyncio.get_running_loop()
+        enqueued = time.time()
+        deadline = loop.time() + timeout
+
+        self._admitted += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._admitted -= 1
+            metrics['timeouts'] += 1
+            raise WorkerTimeoutError(f"{stage}: нет свободного исполнителя за {timeout:g} сек.")
+        except BaseException:
+            self._admitted -= 1
+            raise
+
+        try:
+            future = asyncio.wrap_future(self._get_executor().submit(_timed_call, func, args, kwargs))
+        except Exception:
+            self._admitted -= 1
+            self._slots.release()
+            raise
+        # Слот освобождается, только когда задача действительно завершится -
+        # даже если мы перестали ждать ее по таймауту
+        self._running += 1
+        future.add_done_callback(self._release)
+
+        try:
+            started, result, finished = await asyncio.wait_for(asyncio.shield(future),
+                                                               max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            metrics['timeouts'] += 1
+            logger.warning(f"⏱️ Пул {self.name}: задача {stage} не уложилась в {timeout:g} сек.")
+            raise WorkerTimeoutError(f"{stage}: превышен таймаут {timeout:g} сек.")
+        except Exception:
+            metrics['failures'] += 1
+            raise
+
+        wait_time = max(started - enqueued, 0.0)
+        exec_time = finished - started
+        metrics['completed'] += 1
+        metrics['wait_total'] += wait_time
+        metrics['wait_max'] = max(metrics['wait_max'], wait_time)
+        metrics['exec_total'] += exec_time
+        metrics['exec_max'] = max(metrics['exec_max'], exec_time)
+        return result
+
+    def get_stats(self) -> dict:
+        stages = {}
+        for stage, metrics in self._stages.items():
+            completed = metrics['completed']
+            stages[stage] = {
+                **metrics,
+                'avg_wait_ms': round(metrics['wait_total'] / completed * 1000, 1) if completed else 0.0,
+                'avg_exec_ms': round(metrics['exec_total'] / completed * 1000, 1) if completed else 0.0,
+            }
+        return {
+            'kind': 'processes' if self.use_processes else 'threads',
+            'max_workers': self.max_workers,
+            'queue_limit': self.queue_limit,
+            'running': self._running,
+            'waiting': self._admitted - self._running,
+            'stages': stages,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# 🔄 ПУЛЫ ПРИЛОЖЕНИЯ
+# Без WORKER_PROCESSES «процессный» пул работает на потоках: на маленьком
+# контейнере лишние процессы дороже, чем выигрыш от обхода GIL
+_pools = {
+    POOL_IO: WorkerPool(POOL_IO, WORKER_THREADS),
+    POOL_CPU: WorkerPool(POOL_CPU, WORKER_PROCESSES or WORKER_THREADS, use_processes=WORKER_PROCESSES > 0),
+    # Одновременных запросов к ИИ не больше AI_MAX_CONCURRENT (ai_scheduler) - столько и потоков
+    POOL_AI: WorkerPool(POOL_AI, AI_MAX_CONCURRENT, timeout=90),
+}
+
+# 🔄 ПУЛЫ ВЕЕРНЫХ ЗАПРОСОВ
+# hedged_call и параллельная догрузка документов ЦБ РФ запускаются уже внутри
+# потока пула io и блокирующе ждут свои подзадачи. Отдавать подзадачи в тот же
+# io было бы взаимной блокировкой при занятом пуле, поэтому у них отдельные
+# синхронные исполнители - но создаются и останавливаются они здесь
+_fanout = {}
+
+def fanout_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """Синхронный пул для подзадач, которые ждут внутри рабочего потока"""
+    executor = _fanout.get(name)
+    if executor is None:
+        executor = _fanout[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+    return executor
+
+async def run_io(func, *args, stage: str = None, timeout: float = None, **kwargs):
+    """Блокирующая загрузка, разбор lxml или отрисовка - в пуле потоков"""
+    return await _pools[POOL_IO].run(func, *args, stage=stage, timeout=timeout, **kwargs)
+
+async def run_ai(func, *args, stage: str = None, timeout: float = None, **kwargs):
+    """Блокирующий запрос к DeepSeek - в отдельном пуле, чтобы не задерживать курсы и уведомления"""
+    return await _pools[POOL_AI].run(func, *args, stage=stage, timeout=timeout, **kwargs)
+
+async def run_cpu(func, *args, stage: str = None, timeout: float = None, **kwargs):
+    """Вычисления на чистом Python - в пуле процессов (func и аргументы должны сериализоваться)"""
+    return await _pools[POOL_CPU].run(func, *args, stage=stage, timeout=timeout, **kwargs)
+
+def get_workers_stats() -> dict:
+    """Метрики пулов для админ-команд"""
+    return {name: pool.get_stats() for name, pool in _pools.items()}
+
+def shutdown_workers():
+    """Останавливает исполнители при завершении бота"""
+    for pool in _pools.values():
+        pool.shutdown()
+    for executor in _fanout.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _fanout.clear()
+    logger.info("🛑 Пулы исполнителей остановлены")